@@ -0,0 +1,219 @@
+"""Benchmark suite for the campaign agent.
+
+Runs CampaignAgent end to end against the local stub server at several
+concurrency levels and reports throughput, latency percentiles and peak
+memory. It also times the hot local code paths (creative scoring, claim
+verification, validate_campaign, Campaign parsing). Results are written as JSON so runs
+can be compared:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.stub_server import StubConfig, build_campaign, start_stub_server
+
+ROOT = Path(__file__).parent.parent
+
+def _load_brief() -> Dict:
+    with open(ROOT / "examples" / "brief2.json", "r") as f:
+        return json.load(f)
+
+def _write_briefs(path: Path, count: int) -> None:
+    brief = _load_brief()
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps(dict(brief, campaign_id=f"cmp_bench_{i:05d}")) + "\n")
+
+def run_end_to_end(
+    concurrency_levels: List[int],
+    briefs: int,
+    config: StubConfig,
+    fanout: bool = False
+) -> List[Dict]:
+    """Drive CampaignAgent.process_batch through the stub server's HTTP API.
+
+    Peak memory is measured in a second pass over the same briefs, as
+    tracemalloc slows every allocation and would skew the timed pass.
+    """
+    server = start_stub_server(config)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # Every brief must reach the server, so the response cache is off
+    os.environ["LLM_CACHE"] = "false"
+
+    from src.agent import CampaignAgent
+    from src.utils.cache import set_response_cache
+    from src.utils.llm import reset_clients
+
+    set_response_cache(None)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = Path(tmp) / "briefs.jsonl"
+        _write_briefs(input_path, briefs)
+        for concurrency in concurrency_levels:
+            output_path = str(Path(tmp) / f"results_{concurrency}.jsonl")
+            reset_clients()
+            # The briefs differ only in campaign ID, so dedupe would skip them
+            summary = CampaignAgent(fanout=fanout).process_batch(
+                str(input_path), output_path, concurrency, dedupe=False
+            )
+            reset_clients()
+            tracemalloc.start()
+            CampaignAgent(fanout=fanout).process_batch(
+                str(input_path), output_path, concurrency, dedupe=False
+            )
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append({
+                "concurrency": concurrency,
+                "briefs": summary["total"],
+                "failed": summary["failed"],
+                "throughput": summary["throughput"],
+                "latency_p50": summary["latency_p50"],
+                "latency_p95": summary["latency_p95"],
+                "peak_traced_memory_mb": peak / 1e6
+            })
+            print(
+                f"concurrency={concurrency:>3}  {summary['throughput']:7.2f} briefs/s  "
+                f"p50={summary['latency_p50']:.3f}s  p95={summary['latency_p95']:.3f}s  "
+                f"peak={peak / 1e6:.1f}MB  failed={summary['failed']}"
+            )
+    server.shutdown()
+    return results
+
+def _time(func: Callable[[], None], number: int) -> Dict:
+    timings = timeit.repeat(func, number=number, repeat=5)
+    best = min(timings) / number
+    return {"best_us": best * 1e6, "mean_us": sum(timings) / len(timings) / number * 1e6}
+
+def run_micro(creatives_per_ad_group: int, number: int) -> Dict:
+    """Time scoring, validation and parsing on a stub campaign."""
+    from src.models.brief import CampaignBrief
+    from src.models.campaign import Campaign
+    from src.utils.scorer import CreativeScorer
+    from src.validators.checks import validate_campaign
+    from src.validators.claims import ClaimVerifier
+
+    brief_dict = _load_brief()
+    brief = CampaignBrief(**brief_dict)
+    campaign_dict = build_campaign(
+        brief_dict, StubConfig(creatives_per_ad_group=creatives_per_ad_group)
+    )
+    campaign_json = json.dumps(campaign_dict)
+    campaign = Campaign(**campaign_dict)
+    creatives = [c for ag in campaign_dict["ad_groups"] for c in ag["creatives"]]
+    scorer = CreativeScorer(str(ROOT / "kb" / "product_data.json"))
+    product = brief.product.name
+    verifier = ClaimVerifier(scorer.kb)
+
+    results = {
+        "creatives": len(creatives),
+        "score_creative": _time(lambda: scorer.score_creative(creatives[0], product), number),
+        "score_creatives_campaign": _time(lambda: scorer.score_creatives(creatives, product), number),
+        "verify_claims_campaign": _time(lambda: verifier.verify(creatives, brief), number),
+        "validate_campaign": _time(lambda: validate_campaign(campaign, brief), number),
+        "campaign_parse_dict": _time(lambda: Campaign(**campaign_dict), number),
+        "campaign_parse_json": _time(lambda: Campaign.model_validate_json(campaign_json), number)
+    }
+    for name, timing in results.items():
+        if isinstance(timing, dict):
+            print(f"{name:<28} {timing['best_us']:10.1f} us")
+    return results
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """Print relative changes against a previous results file."""
+    print("\nComparison with baseline (negative is faster / smaller):")
+    for name, timing in current["micro"].items():
+        old = baseline.get("micro", {}).get(name)
+        if isinstance(timing, dict) and isinstance(old, dict) and old["best_us"]:
+            change = (timing["best_us"] - old["best_us"]) / old["best_us"] * 100
+            print(f"  {name:<28} {change:+7.1f}%")
+    old_runs = {r["concurrency"]: r for r in baseline.get("end_to_end", [])}
+    for run in current["end_to_end"]:
+        old = old_runs.get(run["concurrency"])
+        if old and old["throughput"]:
+            change = (run["throughput"] - old["throughput"]) / old["throughput"] * 100
+            print(f"  throughput @ concurrency {run['concurrency']:<4} {change:+7.1f}%")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the campaign agent.")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--briefs", type=int, default=64, help="Briefs per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Stub max extra latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub fraction of 429/500s")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="Stub fraction of very slow responses (latency tail)")
+    parser.add_argument("--slow-latency", type=float, default=2.0,
+                        help="Stub extra delay of slow responses in seconds")
+    parser.add_argument("--creatives", type=int, default=3, help="Creatives per ad group")
+    parser.add_argument("--number", type=int, default=200, help="Iterations per microbenchmark")
+    parser.add_argument("--fanout", action="store_true",
+                        help="Use fan-out generation (one call per ad group)")
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    parser.add_argument("--output", default="bench_results.json", help="Results JSON file")
+    parser.add_argument("--compare", help="Previous results JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "stub": {
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "error_rate": args.error_rate,
+                "slow_rate": args.slow_rate,
+                "slow_latency": args.slow_latency,
+                "creatives_per_ad_group": args.creatives
+            },
+            "fanout": args.fanout,
+            "hedge": os.getenv("LLM_HEDGE", "false").lower() == "true"
+        },
+        "micro": run_micro(args.creatives, args.number),
+        "end_to_end": []
+    }
+    if not args.skip_end_to_end:
+        results["end_to_end"] = run_end_to_end(
+            [int(c) for c in args.concurrency.split(",")],
+            args.briefs,
+            StubConfig(
+                latency=args.latency,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+                slow_rate=args.slow_rate,
+                slow_latency=args.slow_latency,
+                creatives_per_ad_group=args.creatives,
+                seed=0
+            ),
+            fanout=args.fanout
+        )
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["meta"]["max_rss_mb"] = max_rss / (1e6 if sys.platform == "darwin" else 1e3)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Local OpenAI-compatible chat completions server for benchmarks.
+
+Answers POST /v1/chat/completions with a campaign that passes
+validate_campaign for the brief embedded in the user prompt (or, for
+fan-out generation, its skeleton or one ad group's creatives), after a
+configurable delay. It can also inject errors, so the agent's whole HTTP
+stack (client pool, retries, streaming) can be exercised without live calls.
+
+    python -m benchmarks.stub_server --port 8900 --latency 0.5 --jitter 0.2
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+class StubConfig:
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        ad_groups_per_channel: int = 1,
+        creatives_per_ad_group: int = 3,
+        seed: Optional[int] = None,
+        stall: float = 0.0
+    ):
+        """Configure the stub's behavior.
+
+        Args:
+            latency: Base response delay in seconds
+            jitter: Maximum extra random delay in seconds
+            error_rate: Fraction of requests answered with a 429 or 500
+            slow_rate: Fraction of requests delayed by slow_latency on top
+                (a heavy latency tail, as seen from real providers)
+            slow_latency: Extra delay of slow requests in seconds
+            ad_groups_per_channel: Ad groups generated per brief channel
+            creatives_per_ad_group: Creatives per ad group (response size)
+            seed: Seed for reproducible delays and errors
+            stall: Seconds a streamed response stalls after its first chunk
+                (a provider hanging mid-stream)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.ad_groups_per_channel = ad_groups_per_channel
+        self.creatives_per_ad_group = creatives_per_ad_group
+        self.random = random.Random(seed)
+        self.stall = stall
+        self.lock = threading.Lock()
+        self.requests = 0
+
+_decoder = json.JSONDecoder()
+
+def _extract_objects(text: str) -> List[Dict]:
+    """Return the JSON objects embedded in a prompt, in order."""
+    objects = []
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            value, end = _decoder.raw_decode(text, pos)
+        except ValueError:
+            end = pos + 1
+        else:
+            objects.append(value)
+        pos = text.find("{", end)
+    return objects
+
+def _user_prompt(messages) -> str:
+    return next((m["content"] for m in messages if m["role"] == "user"), "")
+
+def build_response(prompt: str, config: StubConfig) -> Dict:
+    """Answer a single-call, skeleton or ad group prompt.
+
+    Fan-out prompts embed the brief followed by the ad group to write.
+    """
+    objects = _extract_objects(prompt)
+    brief = objects[0] if objects else {}
+    campaign = build_campaign(brief, config)
+    if prompt.startswith("Please plan the structure"):
+        for ad_group in campaign["ad_groups"]:
+            # build_campaign lists each ad group's channel as its last behavior
+            ad_group["channel"] = ad_group["target"]["behaviors"][-1]
+            ad_group["creatives"] = []
+        return campaign
+    if prompt.startswith("Please write the creatives"):
+        ad_group_id = objects[1].get("id") if len(objects) > 1 else None
+        ad_group = next(
+            (ag for ag in campaign["ad_groups"] if ag["id"] == ad_group_id),
+            campaign["ad_groups"][0]
+        )
+        return {"creatives": ad_group["creatives"]}
+    return campaign
+
+def build_campaign(brief: Dict, config: StubConfig) -> Dict:
+    """Build a campaign consistent with the brief."""
+    channels = brief.get("channels") or ["search"]
+    budget = brief.get("budget", 1000)
+    product = brief.get("product", {})
+    features = product.get("key_features") or ["our product"]
+    hints = brief.get("audience_hints") or ["general audience"]
+
+    share = round(budget / len(channels), 2)
+    breakdown = {channel: share for channel in channels}
+    breakdown[channels[-1]] = round(budget - share * (len(channels) - 1), 2)
+
+    ad_groups = []
+    for channel in channels:
+        for _ in range(config.ad_groups_per_channel):
+            n = len(ad_groups) + 1
+            ad_groups.append({
+                "id": f"ag_{n}",
+                "target": {"age": "25-45", "behaviors": [hints[n % len(hints)], channel]},
+                "creatives": [
+                    {
+                        "id": f"c_{n}{chr(ord('a') + k)}",
+                        "headline": f"{product.get('name', 'Our app')}: {features[k % len(features)]}",
+                        "body": (
+                            f"Discover {features[k % len(features)]} built for "
+                            f"{hints[k % len(hints)]}. {product.get('price', '')}".strip()
+                        ),
+                        "cta": "Start Free Trial",
+                        "justification": f"Leads with {features[k % len(features)]} for {channel} users."
+                    }
+                    for k in range(config.creatives_per_ad_group)
+                ]
+            })
+
+    return {
+        "campaign_id": brief.get("campaign_id", "cmp_stub"),
+        "campaign_name": f"{product.get('name', 'Stub')} campaign",
+        "objective": brief.get("goal", "awareness"),
+        "total_budget": budget,
+        "budget_breakdown": breakdown,
+        "ad_groups": ad_groups,
+        "checks": {"budget_sum_ok": True, "required_fields_present": True}
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = None
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        config = self.config
+        with config.lock:
+            config.requests += 1
+            delay = config.latency + config.random.uniform(0, config.jitter)
+            if config.random.random() < config.slow_rate:
+                delay += config.slow_latency
+            fail = config.random.random() < config.error_rate
+            status = config.random.choice([429, 500])
+        time.sleep(delay)
+        if fail:
+            self._send_json(status, {"error": {"message": "injected failure", "type": "stub"}})
+            return
+
+        content = json.dumps(build_response(_user_prompt(request["messages"]), config))
+        prompt_tokens = sum(len(m["content"]) for m in request["messages"]) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4
+        }
+        if request.get("stream"):
+            self._send_stream(request, content, usage)
+            return
+        self._send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    def _send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, request: Dict, content: str, usage: Dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload: Dict) -> None:
+            data = f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "stub")}
+        for i in range(0, len(content), 40):
+            event({**base, "choices": [{"index": 0, "delta": {"content": content[i:i + 40]},
+                                        "finish_reason": None}]})
+            if i == 0 and self.config.stall:
+                time.sleep(self.config.stall)
+        event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event({**base, "choices": [], "usage": usage})
+        data = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. when a hedged request loses
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def start_stub_server(config: StubConfig, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start the stub server on a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is
+        http://host:server.server_address[1]/v1
+    """
+    handler = type("StubHandler", (_Handler,), {"config": config})
+    server = _StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the OpenAI-compatible stub server.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Max extra random delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429/500 responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of very slow responses")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra delay of slow responses")
+    parser.add_argument("--ad-groups-per-channel", type=int, default=1)
+    parser.add_argument("--creatives", type=int, default=3, help="Creatives per ad group")
+    args = parser.parse_args()
+
+    server = start_stub_server(
+        StubConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            slow_rate=args.slow_rate,
+            slow_latency=args.slow_latency,
+            ad_groups_per_channel=args.ad_groups_per_channel,
+            creatives_per_ad_group=args.creatives
+        ),
+        port=args.port
+    )
+    print(f"Stub server listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
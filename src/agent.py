@@ -1,95 +1,873 @@
+import argparse
+import copy
 import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
 
 from src.models.brief import CampaignBrief
 from src.models.campaign import Campaign
-from src.utils.llm import get_llm_response
-from src.utils.metrics import MetricsLogger
+from src.prompts.system import SYSTEM_PROMPT
+from src.prompts.user import (
+    AD_GROUP_PROMPT_TEMPLATE,
+    AD_GROUP_REPLAN_PROMPT_TEMPLATE,
+    REPAIR_PROMPT_TEMPLATE,
+    SKELETON_PROMPT_TEMPLATE,
+    USER_PROMPT_TEMPLATE
+)
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.utils.dedupe import brief_fingerprint, derive_campaign, get_recent_plans, prune_channels
+from src.utils.export import open_exporter
+from src.utils.llm import cache_response, get_llm_response, stream_llm_response
+from src.utils.metrics import MetricsLogger, start_metrics_server, summarize_latencies
+from src.utils.profiling import BriefProfiler, llm_wait
+from src.utils.replan import ReplanPlan, plan_replan
 from src.utils.scorer import CreativeScorer
-from src.validators.checks import validate_campaign
+from src.utils.stream import IncrementalJSONParser, extract_json
+from src.utils.tokens import brief_size, estimate_tokens, get_max_tokens_planner
+from src.validators.claims import ClaimVerifier
+from src.validators.checks import IncrementalCampaignValidator, validate_campaign
+from src.validators.repair import (
+    fragment_path,
+    get_fragment,
+    repair_campaign
+)
+
+_CREATIVE_FIELDS = ("headline", "body", "cta", "justification")
+
+def _is_streamed_path(path: Tuple[Any, ...]) -> bool:
+    """Select the fragments of a streamed campaign that are acted on early.
+
+    These are the whole document, top-level fields, ad groups, ad group IDs
+    and creatives.
+    """
+    if len(path) <= 1:
+        return True
+    if path[0] != "ad_groups":
+        return False
+    return (
+        len(path) == 2
+        or (len(path) == 3 and path[2] == "id")
+        or (len(path) == 4 and path[2] == "creatives")
+    )
 
 class CampaignAgent:
-    def __init__(self, mock: bool = False, kb_path: Optional[str] = None):
+    def __init__(
+        self,
+        mock: bool = False,
+        kb_path: Optional[str] = None,
+        fanout: Optional[bool] = None
+    ):
         """Initialize the Campaign Agent.
         
         Args:
             mock (bool): Whether to use mock responses for testing
             kb_path (str, optional): Path to the knowledge base file
+            fanout (bool, optional): Generate a skeleton first and then each
+                ad group's creatives in parallel; defaults to LLM_FANOUT
         """
         self.mock = mock
+        if fanout is None:
+            fanout = os.getenv("LLM_FANOUT", "false").lower() == "true"
+        self.fanout = fanout
+        self.repair = os.getenv("CAMPAIGN_REPAIR", "true").lower() == "true"
+        # Rate limiter lane for this agent's LLM calls; process_batch uses "batch"
+        self.priority = "interactive"
+        # Profile every brief (True), none (False) or a PROFILE_SAMPLE_RATE sample
+        self.profile: Optional[bool] = None
+        # Seconds process_brief may take by default; None for no deadline
+        self.deadline = float(os.getenv("CAMPAIGN_DEADLINE", "0")) or None
+        self._deadline: Optional[Deadline] = None
         self.kb_path = kb_path or str(Path(__file__).parent.parent / "kb" / "product_data.json")
         self.metrics = MetricsLogger()
         self.scorer = CreativeScorer(self.kb_path)
+        self.verifier = ClaimVerifier(self.scorer.kb)
         self._load_prompts()
 
     def _load_prompts(self) -> None:
-        """Load system and user prompts from files."""
-        prompts_dir = Path(__file__).parent / "prompts"
+        """Load system and user prompts from the prompt modules."""
+        self.system_prompt = SYSTEM_PROMPT
+        self.user_prompt_template = USER_PROMPT_TEMPLATE
+
+    def clone(self) -> "CampaignAgent":
+        """Return an agent sharing this one's scorer, KB and prompts.
+
+        process_brief keeps per-call state on the agent, so each thread
+        that runs briefs concurrently needs its own clone.
+        """
+        agent = copy.copy(self)
+        agent.metrics = MetricsLogger()
+        return agent
+
+    def _prepare_prompt(self, brief: Dict) -> Tuple[CampaignBrief, str]:
+        """Validate the input brief and render the user prompt for it."""
+        with self.metrics.span("validate_brief"):
+            validated_brief = CampaignBrief(**brief)
+        with self.metrics.span("render_prompt"):
+            user_prompt = self.user_prompt_template.format(
+                brief=json.dumps(validated_brief.model_dump(), indent=2)
+            )
+        return validated_brief, user_prompt
+
+    def _plan_completion(
+        self,
+        validated_brief: CampaignBrief,
+        user_prompt: str
+    ) -> Tuple[int, Optional[int]]:
+        """Estimate prompt tokens and choose max_tokens from the brief's size.
+
+        Returns:
+            Tuple: The brief size in units and the planned max_tokens, or
+            None to use MAX_TOKENS when adaptive sizing is disabled
+        """
+        self.metrics.log_token_count("system_prompt", estimate_tokens(self.system_prompt))
+        self.metrics.log_token_count("user_prompt", estimate_tokens(user_prompt))
+        units = brief_size(validated_brief)
+        if os.getenv("LLM_ADAPTIVE_MAX_TOKENS", "true").lower() != "true":
+            return units, None
+        max_tokens = get_max_tokens_planner().plan(units)
+        self.metrics.log_max_tokens(max_tokens)
+        return units, max_tokens
+
+    def _observe_completion(self, units: int) -> None:
+        """Feed the completion size reported by the API back to the planner."""
+        usage = self.metrics.metrics["usage"]
+        if usage["llm_calls"]:
+            get_max_tokens_planner().observe(
+                units,
+                usage["completion_tokens"] // usage["llm_calls"],
+                truncated=usage["truncated"] > 0
+            )
+
+    def _llm_timeout(self, step: str) -> Optional[float]:
+        """Seconds an LLM call for a step may take under the current deadline.
+
+        Raises:
+            DeadlineExceeded: If the deadline leaves no time for the call
+        """
+        if self._deadline is None:
+            return None
+        return self._deadline.generation_time(step)
+
+    def _generate_fanout(self, validated_brief: CampaignBrief) -> Dict:
+        """Generate a campaign with a skeleton call and parallel ad group calls.
+
+        The skeleton call plans the budget breakdown and ad group targets;
+        each ad group's creatives are then generated concurrently with a
+        smaller max_tokens, so wall-clock time is roughly the skeleton plus
+        the slowest ad group call rather than one long completion.
+
+        Args:
+            validated_brief (CampaignBrief): The input brief
+
+        Returns:
+            Dict: The merged campaign, ready to be parsed and validated
+
+        Raises:
+            DeadlineExceeded: If the deadline comes first; its partial has
+                the skeleton with the ad groups completed by then
+        """
+        brief_json = json.dumps(validated_brief.model_dump(), indent=2)
+        max_tokens = int(os.getenv("LLM_FANOUT_MAX_TOKENS", "800"))
+        skeleton_prompt = SKELETON_PROMPT_TEMPLATE.format(brief=brief_json)
+        self.metrics.log_token_count("system_prompt", estimate_tokens(self.system_prompt))
+        self.metrics.log_token_count("user_prompt", estimate_tokens(skeleton_prompt))
+
+        with self.metrics.span("skeleton"):
+            skeleton = _load_json(get_llm_response(
+                system_prompt=self.system_prompt,
+                user_prompt=skeleton_prompt,
+                mock=self.mock,
+                metrics=self.metrics,
+                max_tokens=max_tokens,
+                priority=self.priority,
+                mock_kind="skeleton",
+                timeout=self._llm_timeout("the campaign skeleton")
+            ))
+        ad_groups = skeleton.get("ad_groups") or []
+        if not ad_groups:
+            raise ValueError("Campaign skeleton has no ad groups")
+
+        def generate_creatives(ad_group: Dict) -> Tuple[list, float]:
+            start = time.perf_counter()
+            response = _load_json(get_llm_response(
+                system_prompt=self.system_prompt,
+                user_prompt=AD_GROUP_PROMPT_TEMPLATE.format(
+                    campaign_name=skeleton.get("campaign_name", ""),
+                    brief=brief_json,
+                    ad_group=json.dumps(ad_group, indent=2),
+                    ad_group_id=ad_group.get("id", "ag")
+                ),
+                mock=self.mock,
+                metrics=self.metrics,
+                max_tokens=max_tokens,
+                priority=self.priority,
+                mock_kind="creatives",
+                timeout=self._llm_timeout("ad group creatives")
+            ))
+            return response.get("creatives", []), time.perf_counter() - start
+
+        # Spans are opened on this thread only; workers just make their call
+        workers = min(len(ad_groups), int(os.getenv("LLM_FANOUT_CONCURRENCY", "8")))
+        timeout = self._llm_timeout("ad group creatives")
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            with self.metrics.span("ad_groups"):
+                futures = [pool.submit(generate_creatives, ad_group) for ad_group in ad_groups]
+                with llm_wait():
+                    wait(futures, timeout=timeout)
+        finally:
+            # Calls still running at the deadline are abandoned, not waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+        results = {}
+        for i, future in enumerate(futures):
+            if future.done() and not future.cancelled():
+                try:
+                    results[i] = future.result()
+                except DeadlineExceeded:
+                    pass
+        self.metrics.log_fanout([call_time for _, call_time in results.values()])
+
+        campaign = {
+            **skeleton,
+            "ad_groups": [
+                {"id": ad_group.get("id"), "target": ad_group.get("target"), "creatives": results[i][0]}
+                for i, ad_group in enumerate(ad_groups)
+                if i in results
+            ]
+        }
+        if len(results) < len(ad_groups):
+            raise DeadlineExceeded(
+                f"Deadline reached with {len(results)} of {len(ad_groups)} ad groups generated",
+                partial=campaign
+            )
+        return campaign
+
+    def _parse_and_validate(self, data: Dict, validated_brief: CampaignBrief) -> Campaign:
+        """Parse and validate a generated campaign, repairing it if that fails.
+
+        Args:
+            data (Dict): The campaign as decoded from the LLM response
+            validated_brief (CampaignBrief): The input brief
+
+        Returns:
+            Campaign: The validated campaign
+
+        Raises:
+            ValueError: If the campaign is invalid and can't be repaired
+        """
+        try:
+            return self._check(data, validated_brief)
+        except ValueError as e:
+            if not self.repair:
+                raise
+            self.metrics.log_validation_error(str(e))
+        with self.metrics.span("repair"):
+            return self._repair(data, validated_brief)
+
+    def _parse_response(self, response: Any, validated_brief: CampaignBrief) -> Campaign:
+        """Parse and validate an LLM response, in a single pass when possible.
+
+        JSON text is validated straight into the Campaign model with
+        model_validate_json, without building an intermediate dict. Only
+        if that fails is it decoded (tolerating code fences and prose
+        around the JSON) for the repair path.
+
+        Args:
+            response: The LLM response: JSON text, or a dict from mocks
+            validated_brief (CampaignBrief): The input brief
+
+        Returns:
+            Campaign: The validated campaign
+        """
+        if isinstance(response, str):
+            try:
+                return self._check(response, validated_brief)
+            except ValueError:
+                pass  # decoded below and repaired
+        return self._parse_and_validate(_load_json(response), validated_brief)
+
+    def _check(self, data: Union[str, Dict], validated_brief: CampaignBrief) -> Campaign:
+        with self.metrics.span("parse"):
+            if isinstance(data, str):
+                campaign = Campaign.model_validate_json(data)
+            else:
+                campaign = Campaign.model_validate(data)
+        with self.metrics.span("validate_campaign"):
+            validate_campaign(campaign, validated_brief)
+        return campaign
+
+    def _repair(self, data: Dict, validated_brief: CampaignBrief) -> Campaign:
+        """Repair an invalid campaign without regenerating it.
+
+        Deterministic problems (campaign ID, total, budget breakdown,
+        duplicate IDs) are fixed locally. If the campaign still doesn't
+        parse, only the failing fragments are sent back to the LLM.
+        """
+        fixes = repair_campaign(data, validated_brief)
+        try:
+            campaign = self._check(data, validated_brief)
+            self.metrics.log_repair("local", fixes)
+            return campaign
+        except ValidationError as e:
+            error = e
+        except ValueError:
+            self.metrics.log_repair("failed", fixes)
+            raise
+
+        try:
+            patched = self._patch_fragments(data, validated_brief, error)
+            fixes += [f"Patched {path}" for path in patched]
+            # A patched fragment may reuse an ID, so fix those again
+            fixes += repair_campaign(data, validated_brief)
+            campaign = self._check(data, validated_brief)
+        except Exception:
+            self.metrics.log_repair("failed", fixes)
+            raise
+        self.metrics.log_repair("llm_patch", fixes)
+        return campaign
+
+    def _patch_fragments(
+        self,
+        data: Dict,
+        validated_brief: CampaignBrief,
+        error: ValidationError
+    ) -> List[str]:
+        """Ask the LLM to correct only the fragments a ValidationError points at.
+
+        Errors are grouped by their innermost ad group or creative; errors
+        in top-level fields patch the campaign without its ad groups.
+
+        Returns:
+            List[str]: The patched fragment paths, e.g. "ad_groups.0.creatives.1"
+
+        Raises:
+            ValidationError: If too many fragments fail for patching to pay off
+        """
+        fragments: Dict[Tuple, List[str]] = {}
+        for item in error.errors():
+            loc = tuple(item["loc"])
+            fragments.setdefault(fragment_path(loc), []).append(
+                f"- {'.'.join(str(key) for key in loc)}: {item['msg']}"
+            )
+        if len(fragments) > int(os.getenv("CAMPAIGN_REPAIR_MAX_PATCHES", "3")):
+            raise error
+
+        brief_json = json.dumps(validated_brief.model_dump(), indent=2)
+        patched = []
+        for path, errors in fragments.items():
+            fragment = get_fragment(data, path)
+            if path == () and isinstance(data.get("ad_groups"), list) and data["ad_groups"]:
+                fragment = {k: v for k, v in data.items() if k != "ad_groups"}
+            with self.metrics.span("llm_patch"):
+                patch = _load_json(get_llm_response(
+                    system_prompt=self.system_prompt,
+                    user_prompt=REPAIR_PROMPT_TEMPLATE.format(
+                        brief=brief_json,
+                        fragment=json.dumps(fragment, indent=2),
+                        errors="\n".join(errors)
+                    ),
+                    mock=self.mock,
+                    metrics=self.metrics,
+                    use_cache=False,
+                    priority=self.priority,
+                    mock_kind="patch",
+                    timeout=self._llm_timeout("repair")
+                ))
+            if not isinstance(patch, dict):
+                raise ValueError(f"LLM patch for {path} is not a JSON object")
+            target = get_fragment(data, path)
+            if isinstance(target, dict):
+                target.update(patch)
+            else:
+                get_fragment(data, path[:-1])[path[-1]] = patch
+            patched.append(".".join(str(key) for key in path) or "campaign")
+        return patched
+
+    def _build_result(
+        self,
+        campaign: Campaign,
+        validated_brief: CampaignBrief,
+        scores: Optional[Dict[Tuple[int, int], float]] = None
+    ) -> Dict:
+        """Dump the campaign, attach creative scores and flag hallucinations.
+
+        The campaign is dumped once and all creatives not already scored
+        are scored in a single batch.
+
+        Args:
+            campaign (Campaign): The validated campaign
+            validated_brief (CampaignBrief): The input brief
+            scores (Dict, optional): Scores already computed while streaming,
+                keyed by (ad group index, creative index)
+
+        Returns:
+            Dict: The campaign plan with a "score" on every creative
+        """
+        with self.metrics.span("result"):
+            return self._build_result_dict(campaign, validated_brief, scores)
+
+    def _build_result_dict(
+        self,
+        campaign: Campaign,
+        validated_brief: CampaignBrief,
+        scores: Optional[Dict[Tuple[int, int], float]]
+    ) -> Dict:
+        with self.metrics.span("dump"):
+            campaign_dict = campaign.model_dump()
+        positions = []
+        creatives = []
+        for i, ad_group in enumerate(campaign_dict["ad_groups"]):
+            for j, creative in enumerate(ad_group["creatives"]):
+                positions.append((i, j))
+                creatives.append(creative)
         
-        with open(prompts_dir / "system.py", "r") as f:
-            self.system_prompt = f.read()
-            
-        with open(prompts_dir / "user.py", "r") as f:
-            self.user_prompt_template = f.read()
+        with self.metrics.span("score"):
+            scores = dict(scores or {})
+            unscored = [k for k, position in enumerate(positions) if position not in scores]
+            if unscored:
+                batch_scores = self.scorer.score_creatives(
+                    [creatives[k] for k in unscored],
+                    validated_brief.product.name
+                )["score"]
+                for k, score in zip(unscored, batch_scores):
+                    scores[positions[k]] = score
+        
+        with self.metrics.span("hallucination_check"):
+            verified = self.verifier.verify(creatives, validated_brief)
+            unsupported = 0
+            for position, creative, claims in zip(positions, creatives, verified):
+                creative["score"] = scores[position]
+                for claim in claims:
+                    if not claim["supported"]:
+                        unsupported += 1
+                        ad_group_id = campaign_dict["ad_groups"][position[0]]["id"]
+                        self.metrics.log_hallucination(
+                            f"Creative {creative['id']} in ad group {ad_group_id} makes an "
+                            f"unsupported {claim['kind']} claim: {claim['text']!r}",
+                            confidence=claim["confidence"],
+                            creative_id=creative["id"],
+                            ad_group_id=ad_group_id
+                        )
+            self.metrics.log_claims(sum(len(claims) for claims in verified), unsupported)
+        
+        return campaign_dict
+
+    def _generate_campaign(self, validated_brief: CampaignBrief, user_prompt: str) -> Campaign:
+        """Generate, parse and validate a campaign for a brief.
+
+        Args:
+            validated_brief (CampaignBrief): The input brief
+            user_prompt (str): The rendered user prompt
+
+        Returns:
+            Campaign: The validated campaign, repaired if needed
+
+        Raises:
+            DeadlineExceeded: If the deadline comes first
+        """
+        if self.fanout:
+            return self._parse_response(self._generate_fanout(validated_brief), validated_brief)
+        
+        units, max_tokens = self._plan_completion(validated_brief, user_prompt)
+        
+        # Get response from LLM
+        with self.metrics.span("llm"):
+            response = get_llm_response(
+                system_prompt=self.system_prompt,
+                user_prompt=user_prompt,
+                mock=self.mock,
+                metrics=self.metrics,
+                max_tokens=max_tokens,
+                priority=self.priority,
+                json_schema=_campaign_schema(),
+                timeout=self._llm_timeout("the campaign"),
+                defer_cache=True
+            )
+        self._observe_completion(units)
+        
+        # Parse and validate response (API responses are JSON text),
+        # repairing it if validation fails
+        campaign = self._parse_response(response, validated_brief)
+        if isinstance(response, str) and "repair" not in self.metrics.metrics:
+            # Only a response that validated as is gets replayed from the cache
+            cache_response(
+                self.system_prompt,
+                user_prompt,
+                response,
+                json_schema=_campaign_schema()
+            )
+        return campaign
+
+    def _regenerate_ad_groups(
+        self,
+        data: Dict,
+        validated_brief: CampaignBrief,
+        plan: ReplanPlan
+    ) -> List[str]:
+        """Regenerate the ad groups an edited brief invalidated, in place.
+
+        Rewritten ad groups keep their ID and target and get new
+        creatives; re-targeted and new ad groups are planned again with
+        the other ad groups' targets as context. The calls run
+        concurrently, as in fan-out generation.
+
+        Args:
+            data (Dict): The campaign derived from the previous plan
+            validated_brief (CampaignBrief): The edited brief
+            plan (ReplanPlan): The ad groups to regenerate
+
+        Returns:
+            List[str]: IDs of the regenerated and added ad groups
+
+        Raises:
+            DeadlineExceeded: If the deadline comes first; its partial is
+                the campaign with the ad groups regenerated by then
+        """
+        ad_groups = data["ad_groups"]
+        ids = {ad_group.get("id") for ad_group in ad_groups}
+        new_ids = []
+        n = len(ad_groups)
+        while len(new_ids) < plan.new_ad_groups:
+            n += 1
+            if f"ag_{n}" not in ids:
+                new_ids.append(f"ag_{n}")
+        
+        brief_json = json.dumps(validated_brief.model_dump(), indent=2)
+        max_tokens = int(os.getenv("LLM_FANOUT_MAX_TOKENS", "800"))
+        campaign_name = data.get("campaign_name", "")
+        other_targets = json.dumps(
+            [ad_group.get("target") for i, ad_group in enumerate(ad_groups) if i not in plan.retarget],
+            indent=2
+        )
+        
+        def rewrite(i: int) -> Dict:
+            ad_group = ad_groups[i]
+            response = _load_json(get_llm_response(
+                system_prompt=self.system_prompt,
+                user_prompt=AD_GROUP_PROMPT_TEMPLATE.format(
+                    campaign_name=campaign_name,
+                    brief=brief_json,
+                    ad_group=json.dumps({"id": ad_group.get("id"), "target": ad_group.get("target")}, indent=2),
+                    ad_group_id=ad_group.get("id", "ag")
+                ),
+                mock=self.mock,
+                metrics=self.metrics,
+                max_tokens=max_tokens,
+                priority=self.priority,
+                mock_kind="creatives",
+                timeout=self._llm_timeout("ad group creatives")
+            ))
+            return {**ad_group, "creatives": response.get("creatives", [])}
+        
+        def replan(ad_group_id: str) -> Dict:
+            response = _load_json(get_llm_response(
+                system_prompt=self.system_prompt,
+                user_prompt=AD_GROUP_REPLAN_PROMPT_TEMPLATE.format(
+                    campaign_name=campaign_name,
+                    brief=brief_json,
+                    other_targets=other_targets,
+                    ad_group_id=ad_group_id
+                ),
+                mock=self.mock,
+                metrics=self.metrics,
+                max_tokens=max_tokens,
+                priority=self.priority,
+                mock_kind="ad_group",
+                timeout=self._llm_timeout("ad group planning")
+            ))
+            return {
+                "id": ad_group_id,
+                "target": response.get("target"),
+                "creatives": response.get("creatives", [])
+            }
+        
+        tasks = [(i, lambda i=i: rewrite(i)) for i in plan.rewrite]
+        tasks += [(i, lambda i=i: replan(ad_groups[i].get("id") or f"ag_{i + 1}")) for i in plan.retarget]
+        tasks += [(None, lambda ad_group_id=ad_group_id: replan(ad_group_id)) for ad_group_id in new_ids]
+        if not tasks:
+            return []
+        
+        # Spans are opened on this thread only; workers just make their call
+        workers = min(len(tasks), int(os.getenv("LLM_FANOUT_CONCURRENCY", "8")))
+        timeout = self._llm_timeout("ad group regeneration")
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            with self.metrics.span("ad_groups"):
+                futures = [pool.submit(task) for _, task in tasks]
+                with llm_wait():
+                    wait(futures, timeout=timeout)
+        finally:
+            # Calls still running at the deadline are abandoned, not waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+        regenerated = []
+        for (i, _), future in zip(tasks, futures):
+            if not future.done() or future.cancelled():
+                continue
+            try:
+                ad_group = future.result()
+            except DeadlineExceeded:
+                continue
+            if i is None:
+                ad_groups.append(ad_group)
+            else:
+                ad_groups[i] = ad_group
+            regenerated.append(ad_group["id"])
+        if len(regenerated) < len(tasks):
+            raise DeadlineExceeded(
+                f"Deadline reached with {len(regenerated)} of {len(tasks)} ad groups regenerated",
+                partial=data
+            )
+        return regenerated
+
+    def _degrade(self, validated_brief: CampaignBrief, error: DeadlineExceeded) -> Campaign:
+        """Fall back to the best campaign available when the deadline is near.
+
+        That is the part generated before the deadline (e.g. the ad groups
+        completed so far) if it validates, or else the plan of a recent
+        similar brief, derived for this one without the ad groups and
+        budget of channels this brief doesn't have. Either is marked in
+        metrics["degraded"].
 
-    def process_brief(self, brief: Dict) -> Dict:
+        Raises:
+            DeadlineExceeded: If there is nothing to fall back to
+        """
+        partial = error.partial
+        if partial and partial.get("ad_groups"):
+            # A stream cut short ends before the checks, which validation sets anyway
+            partial.setdefault("checks", {"budget_sum_ok": False, "required_fields_present": False})
+            try:
+                campaign = self._parse_and_validate(partial, validated_brief)
+                self.metrics.log_degraded(str(error), "partial", ad_groups=len(campaign.ad_groups))
+                return campaign
+            except (ValueError, DeadlineExceeded):
+                pass
+        
+        recent = get_recent_plans().get(validated_brief)
+        if recent is None:
+            raise error
+        source_brief, source_campaign = recent
+        with self.metrics.span("derive"):
+            data = derive_campaign(source_campaign, source_brief, validated_brief)
+            # A plan for the same product may run on channels this brief doesn't
+            dropped = prune_channels(data, validated_brief, ad_groups=True)
+        if not data["ad_groups"]:
+            raise error
+        try:
+            campaign = self._parse_and_validate(data, validated_brief)
+        except (ValueError, DeadlineExceeded):
+            raise error from None
+        details = {"dropped_channels": dropped} if dropped else {}
+        self.metrics.log_degraded(
+            str(error),
+            "recent_plan",
+            ad_groups=len(campaign.ad_groups),
+            derived_from=source_brief.campaign_id,
+            **details
+        )
+        return campaign
+
+    def _start_profile(self, profile: Optional[bool]) -> Optional[BriefProfiler]:
+        """Start profiling this brief if requested or sampled."""
+        return BriefProfiler.start(self.profile if profile is None else profile)
+
+    def _finish_profile(self, profiler: Optional[BriefProfiler], brief: Dict) -> None:
+        """Write the brief's profile and record it in the metrics."""
+        if profiler is not None:
+            report = profiler.finish(brief.get("campaign_id"), self.metrics.metrics["stages"])
+            if report:
+                self.metrics.log_profile(report)
+
+    def process_brief(
+        self,
+        brief: Dict,
+        profile: Optional[bool] = None,
+        deadline: Optional[float] = None
+    ) -> Dict:
         """Process a campaign brief and generate a campaign plan.
         
+        With a deadline, every LLM call is bounded by the time left, and
+        generation stops CAMPAIGN_DEADLINE_MARGIN seconds early so the
+        result can still be validated and scored. If the full plan can't be
+        generated in time, the best partial result is returned instead
+        (see _degrade) and marked in metrics["degraded"].
+        
         Args:
             brief (Dict): The campaign brief in JSON format
+            profile (bool, optional): Capture a CPU and allocation profile of
+                this brief; defaults to the agent's profile setting
+            deadline (float, optional): Seconds the call may take; defaults
+                to the agent's deadline (CAMPAIGN_DEADLINE)
             
         Returns:
             Dict: The generated campaign plan
+            
+        Raises:
+            DeadlineExceeded: If the deadline passed with no result to return
         """
         self.metrics.reset_metrics()
         self.metrics.start_processing()
+        profiler = self._start_profile(profile)
+        self._deadline = Deadline.start(self.deadline if deadline is None else deadline)
         
         try:
-            # Validate input brief
-            validated_brief = CampaignBrief(**brief)
+            # Validate input brief and format user prompt with brief details
+            validated_brief, user_prompt = self._prepare_prompt(brief)
             
-            # Format user prompt with brief details
-            user_prompt = self.user_prompt_template.format(
-                brief=json.dumps(validated_brief.model_dump(), indent=2)
-            )
+            try:
+                campaign = self._generate_campaign(validated_brief, user_prompt)
+            except DeadlineExceeded as e:
+                campaign = self._degrade(validated_brief, e)
             
-            # Get response from LLM
-            response = get_llm_response(
-                system_prompt=self.system_prompt,
-                user_prompt=user_prompt,
-                mock=self.mock
-            )
+            # Score creatives and add scores to response
+            campaign_dict = self._build_result(campaign, validated_brief)
+            if "degraded" not in self.metrics.metrics:
+                get_recent_plans().put(validated_brief, campaign_dict)
             
-            # Parse and validate response
-            campaign = Campaign(**response)
+            self.metrics.end_processing(success=True)
+            self._finish_profile(profiler, brief)
+            campaign_dict["metrics"] = self.metrics.get_metrics()
             
-            # Run consistency checks
-            validate_campaign(campaign, validated_brief)
+            return campaign_dict
             
-            # Score creatives and add scores to response
-            for ad_group in campaign.ad_groups:
-                for creative in ad_group.creatives:
-                    score = self.scorer.score_creative(
-                        creative.model_dump(),
-                        validated_brief.product.name
-                    )
-                    creative_dict = creative.model_dump()
-                    creative_dict["score"] = score
-                    
-                    # Check for potential hallucinations
-                    if any(
-                        feature.lower() not in creative.body.lower() and 
-                        feature.lower() not in creative.headline.lower()
-                        for feature in validated_brief.product.key_features
-                    ):
-                        self.metrics.log_hallucination(
-                            f"Creative {creative.id} may contain hallucinated features",
-                            confidence=0.8
+        except Exception as e:
+            self.metrics.log_validation_error(str(e))
+            self.metrics.end_processing(success=False)
+            self._finish_profile(profiler, brief)
+            raise
+
+    def process_brief_stream(
+        self,
+        brief: Dict,
+        on_event: Optional[Callable[[str, Dict], None]] = None,
+        profile: Optional[bool] = None,
+        deadline: Optional[float] = None
+    ) -> Dict:
+        """Process a campaign brief while streaming the LLM response.
+
+        The completion is parsed incrementally: each ad group and creative
+        is validated (and creatives scored) as soon as its JSON object
+        closes, and reported through ``on_event``. Without repair,
+        generation is aborted as soon as a check fails, e.g. a campaign ID
+        or budget mismatch; with repair (the default) such problems are
+        fixed by repair_campaign once the stream ends, so only a response
+        that can't be parsed stops it early.
+        If the deadline comes first, the stream is closed and the ad groups
+        completed so far are returned as a degraded plan.
+
+        Args:
+            brief (Dict): The campaign brief in JSON format
+            on_event (Callable, optional): Called with ("creative", payload)
+                or ("ad_group", payload) as fragments complete
+            profile (bool, optional): Capture a CPU and allocation profile of
+                this brief; defaults to the agent's profile setting
+            deadline (float, optional): Seconds the call may take, as in
+                process_brief
+
+        Returns:
+            Dict: The generated campaign plan, as returned by process_brief
+        """
+        self.metrics.reset_metrics()
+        self.metrics.start_processing()
+        profiler = self._start_profile(profile)
+        self._deadline = Deadline.start(self.deadline if deadline is None else deadline)
+        parser = IncrementalJSONParser(wants=_is_streamed_path)
+        
+        try:
+            validated_brief, user_prompt = self._prepare_prompt(brief)
+            units, max_tokens = self._plan_completion(validated_brief, user_prompt)
+            validator = IncrementalCampaignValidator(validated_brief, repairable=self.repair)
+            ad_group_ids = {}
+            scores = {}
+            document = None
+            # Top-level fields and ad groups completed so far, kept in case
+            # the deadline cuts the stream short
+            fields = {}
+            ad_groups = []
+            
+            try:
+                chunks = stream_llm_response(
+                    system_prompt=self.system_prompt,
+                    user_prompt=user_prompt,
+                    mock=self.mock,
+                    metrics=self.metrics,
+                    max_tokens=max_tokens,
+                    priority=self.priority,
+                    json_schema=_campaign_schema(),
+                    timeout=self._llm_timeout("the campaign"),
+                    defer_cache=True
+                )
+                with self.metrics.span("llm_stream"):
+                    try:
+                        for chunk in chunks:
+                            for path, value in parser.feed(chunk):
+                                if path == ():
+                                    document = value
+                                elif len(path) == 1:
+                                    validator.check_field(path[0], value)
+                                    fields[path[0]] = value
+                                elif len(path) == 2:
+                                    ad_groups.append(value)
+                                    if on_event:
+                                        on_event("ad_group", {"index": path[1], "ad_group": value})
+                                elif path[2] == "id":
+                                    validator.check_ad_group_id(value)
+                                    ad_group_ids[path[1]] = value
+                                else:
+                                    i, j = path[1], path[3]
+                                    validator.check_creative(i, value, ad_group_ids.get(i))
+                                    if all(k in value for k in _CREATIVE_FIELDS):
+                                        scores[(i, j)] = self.scorer.score_creative(
+                                            value, validated_brief.product.name
+                                        )
+                                    if on_event:
+                                        on_event("creative", {
+                                            "ad_group_index": i,
+                                            "index": j,
+                                            "creative": value,
+                                            "score": scores.get((i, j))
+                                        })
+                    except DeadlineExceeded as e:
+                        raise DeadlineExceeded(str(e), partial={**fields, "ad_groups": ad_groups}) from e
+                    finally:
+                        # Closing the generator cancels the request if we stopped early
+                        chunks.close()
+                        self.metrics.log_stream(
+                            aborted=document is None,
+                            chars_received=len(parser.text)
                         )
+                
+                if document is None:
+                    raise ValueError("LLM response ended before the campaign JSON was complete")
+                self._observe_completion(units)
+                
+                campaign = self._parse_and_validate(document, validated_brief)
+                if not self.mock and "repair" not in self.metrics.metrics:
+                    cache_response(
+                        self.system_prompt,
+                        user_prompt,
+                        parser.text,
+                        json_schema=_campaign_schema()
+                    )
+            except DeadlineExceeded as e:
+                campaign = self._degrade(validated_brief, e)
+                scores = {}
+            if self.metrics.metrics.get("repair", {}).get("path") == "llm_patch":
+                scores = {}  # patched creatives may differ from the streamed ones
+            campaign_dict = self._build_result(campaign, validated_brief, scores)
+            if "degraded" not in self.metrics.metrics:
+                get_recent_plans().put(validated_brief, campaign_dict)
             
             self.metrics.end_processing(success=True)
-            campaign_dict = campaign.model_dump()
+            self._finish_profile(profiler, brief)
             campaign_dict["metrics"] = self.metrics.get_metrics()
             
             return campaign_dict
@@ -97,6 +875,7 @@ class CampaignAgent:
         except Exception as e:
             self.metrics.log_validation_error(str(e))
             self.metrics.end_processing(success=False)
+            self._finish_profile(profiler, brief)
             raise
 
     def process_brief_from_file(self, brief_path: str) -> Dict:
@@ -111,3 +890,474 @@ class CampaignAgent:
         with open(brief_path, "r") as f:
             brief = json.load(f)
         return self.process_brief(brief)
+
+    def process_derived_brief(
+        self,
+        brief: Dict,
+        source_brief: Dict,
+        source_campaign: Dict
+    ) -> Dict:
+        """Build a brief's campaign from one generated for an equivalent brief.
+
+        No LLM call is made: IDs and the budget breakdown are rewritten for
+        the brief, then the campaign is validated (and repaired if needed)
+        and scored as in process_brief.
+
+        Args:
+            brief (Dict): The campaign brief in JSON format
+            source_brief (Dict): Brief with the same fingerprint
+            source_campaign (Dict): Campaign plan generated for source_brief
+
+        Returns:
+            Dict: The campaign plan, as returned by process_brief
+        """
+        self.metrics.reset_metrics()
+        self.metrics.start_processing()
+        self._deadline = None
+        
+        try:
+            with self.metrics.span("validate_brief"):
+                validated_brief = CampaignBrief(**brief)
+            with self.metrics.span("derive"):
+                data = derive_campaign(
+                    source_campaign, CampaignBrief(**source_brief), validated_brief
+                )
+            self.metrics.log_derived(source_brief.get("campaign_id"))
+            campaign = self._parse_and_validate(data, validated_brief)
+            campaign_dict = self._build_result(campaign, validated_brief)
+            
+            self.metrics.end_processing(success=True)
+            campaign_dict["metrics"] = self.metrics.get_metrics()
+            
+            return campaign_dict
+            
+        except Exception as e:
+            self.metrics.log_validation_error(str(e))
+            self.metrics.end_processing(success=False)
+            raise
+
+    def process_brief_incremental(
+        self,
+        brief: Dict,
+        previous_brief: Dict,
+        previous_campaign: Dict,
+        profile: Optional[bool] = None,
+        deadline: Optional[float] = None
+    ) -> Dict:
+        """Update a campaign plan for an edited brief, reusing what still fits.
+
+        The brief is diffed against the one the previous plan was generated
+        for. Budget, campaign ID and channel edits are applied locally
+        (the budget breakdown is rescaled); audience, tone and feature
+        edits regenerate only the ad groups they affect, and the rest of
+        the plan is reused. Other edits, e.g. to the goal or product,
+        generate the plan from scratch as process_brief does. The result is
+        validated (and repaired if needed) and scored as in process_brief;
+        metrics["incremental"] records what was regenerated. A deadline
+        applies as in process_brief; if it comes first, the plan keeps the
+        previous ad groups that weren't regenerated in time.
+
+        Args:
+            brief (Dict): The edited campaign brief in JSON format
+            previous_brief (Dict): Brief the previous plan was generated for
+            previous_campaign (Dict): The previous campaign plan
+            profile (bool, optional): Capture a CPU and allocation profile of
+                this brief; defaults to the agent's profile setting
+            deadline (float, optional): Seconds the call may take, as in
+                process_brief
+
+        Returns:
+            Dict: The campaign plan, as returned by process_brief
+
+        Raises:
+            DeadlineExceeded: If the deadline passed with no result to return
+        """
+        self.metrics.reset_metrics()
+        self.metrics.start_processing()
+        profiler = self._start_profile(profile)
+        self._deadline = Deadline.start(self.deadline if deadline is None else deadline)
+        
+        try:
+            validated_brief, user_prompt = self._prepare_prompt(brief)
+            source_brief = CampaignBrief(**previous_brief)
+            with self.metrics.span("diff"):
+                plan = plan_replan(source_brief, validated_brief, previous_campaign)
+            
+            try:
+                if plan.full:
+                    campaign = self._generate_campaign(validated_brief, user_prompt)
+                    self.metrics.log_incremental(plan.changed, regenerated=None, reused=0)
+                else:
+                    with self.metrics.span("derive"):
+                        data = derive_campaign(previous_campaign, source_brief, validated_brief)
+                        # Channels dropped from the brief give their share to the rest
+                        prune_channels(data, validated_brief)
+                    regenerated = self._regenerate_ad_groups(data, validated_brief, plan)
+                    self.metrics.log_incremental(
+                        plan.changed,
+                        regenerated=regenerated,
+                        reused=len(data["ad_groups"]) - len(regenerated)
+                    )
+                    campaign = self._parse_and_validate(data, validated_brief)
+            except DeadlineExceeded as e:
+                campaign = self._degrade(validated_brief, e)
+            campaign_dict = self._build_result(campaign, validated_brief)
+            if "degraded" not in self.metrics.metrics:
+                get_recent_plans().put(validated_brief, campaign_dict)
+            
+            self.metrics.end_processing(success=True)
+            self._finish_profile(profiler, brief)
+            campaign_dict["metrics"] = self.metrics.get_metrics()
+            
+            return campaign_dict
+            
+        except Exception as e:
+            self.metrics.log_validation_error(str(e))
+            self.metrics.end_processing(success=False)
+            self._finish_profile(profiler, brief)
+            raise
+
+    def process_batch(
+        self,
+        input_path: str,
+        output_path: str,
+        concurrency: int = 4,
+        dedupe: Optional[bool] = None,
+        on_result: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """Process a JSONL file of briefs through a bounded worker pool.
+
+        Each line of the input file is one brief. Results and per-brief
+        errors are appended to the output JSONL file as soon as each brief
+        finishes, so a failing brief never aborts the rest of the batch.
+
+        With dedupe enabled, briefs are grouped by fingerprint (briefs that
+        differ only in campaign ID, budget or list order). Only the first
+        brief of a group is generated; the others wait for it and have
+        their campaigns derived from it locally.
+
+        Args:
+            input_path (str): Path to the JSONL file with one brief per line
+            output_path (str): Path of the JSONL file to write results to
+            concurrency (int): Maximum number of briefs processed at once
+            dedupe (bool, optional): Derive near-duplicate briefs instead of
+                generating them; defaults to BATCH_DEDUPE
+            on_result (Callable, optional): Called on the calling thread with
+                each successful campaign plan, e.g. an exporter's write
+
+        Returns:
+            Dict: Batch summary with counts, throughput, p50/p95 latency and
+            the number of LLM calls avoided by deduplication
+        """
+        concurrency = max(1, concurrency)
+        if dedupe is None:
+            dedupe = os.getenv("BATCH_DEDUPE", "true").lower() == "true"
+        local = threading.local()
+
+        def worker_agent() -> "CampaignAgent":
+            # Each worker thread gets its own agent (and metrics)
+            agent = getattr(local, "agent", None)
+            if agent is None:
+                agent = local.agent = self.clone()
+                # Batch work yields to interactive requests in the rate limiter
+                agent.priority = "batch"
+            return agent
+
+        def run(index: int, line: str, source: Optional[Tuple[Dict, Dict]] = None) -> Dict:
+            start = time.perf_counter()
+            record = {"index": index, "campaign_id": None, "cost": 0.0}
+            agent = None
+            try:
+                brief = json.loads(line)
+                record["campaign_id"] = brief.get("campaign_id")
+                agent = worker_agent()
+                if source is None:
+                    record["result"] = agent.process_brief(brief)
+                else:
+                    record["result"] = agent.process_derived_brief(brief, *source)
+                    record["derived_from"] = source[0].get("campaign_id")
+                record["status"] = "ok"
+            except Exception as e:
+                record["status"] = "error"
+                record["error"] = f"{type(e).__name__}: {e}"
+            if agent is not None:
+                # Failed briefs may still have paid for LLM calls
+                record["cost"] = agent.metrics.metrics["cost"]
+                record["usage"] = dict(agent.metrics.metrics["usage"])
+                if "repair" in agent.metrics.metrics:
+                    record["repair"] = agent.metrics.metrics["repair"]["path"]
+            record["latency"] = time.perf_counter() - start
+            return record
+
+        latencies = []
+        counts = {"ok": 0, "error": 0}
+        totals = {"cost": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        # Briefs saved by each repair path instead of failing
+        repaired = {"local": 0, "llm_patch": 0}
+        deduped = {"derived": 0, "llm_calls_avoided": 0, "cost_avoided": 0.0}
+        # Fingerprint -> {"brief", "source", "waiting"}, bounded so huge
+        # batches of distinct briefs don't keep every generated result
+        groups: "OrderedDict[str, Dict]" = OrderedDict()
+        max_groups = int(os.getenv("BATCH_DEDUPE_GROUPS", "1024"))
+        start = time.perf_counter()
+
+        with open(output_path, "w") as out, \
+                ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = set()
+            leaders = {}
+            members = {}
+            # Members queued behind a group's first brief
+            waiting = 0
+
+            def submit(index: int, line: str, group: Optional[Dict] = None) -> None:
+                if group is not None and group["source"] is not None:
+                    future = pool.submit(run, index, line, group["source"])
+                    members[future] = group
+                else:
+                    future = pool.submit(run, index, line)
+                    if group is not None:
+                        leaders[future] = group
+                pending.add(future)
+
+            def finish_leader(group: Dict, record: Dict) -> None:
+                nonlocal waiting
+                if record["status"] == "ok":
+                    group["source"] = (group["brief"], record["result"])
+                    group["cost"] = record["cost"]
+                    group["llm_calls"] = max(1, record.get("usage", {}).get("llm_calls", 0))
+                    queued, group["waiting"] = group["waiting"], []
+                    waiting -= len(queued)
+                    for index, line in queued:
+                        submit(index, line, group)
+                elif group["waiting"]:
+                    # Promote the next member to generate for the group
+                    index, line = group["waiting"].pop(0)
+                    waiting -= 1
+                    group["brief"] = json.loads(line)
+                    submit(index, line, group)
+                else:
+                    groups.pop(group["fingerprint"], None)
+
+            def drain() -> None:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    record = future.result()
+                    latencies.append(record["latency"])
+                    counts[record["status"]] += 1
+                    totals["cost"] += record["cost"]
+                    if record["status"] == "ok" and record.get("repair") in repaired:
+                        repaired[record["repair"]] += 1
+                    for key in ("prompt_tokens", "completion_tokens"):
+                        totals[key] += record.get("usage", {}).get(key, 0)
+                    if future in leaders:
+                        finish_leader(leaders.pop(future), record)
+                    elif future in members:
+                        group = members.pop(future)
+                        if record["status"] == "ok":
+                            deduped["derived"] += 1
+                            deduped["llm_calls_avoided"] += group["llm_calls"]
+                            deduped["cost_avoided"] += group["cost"]
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    if on_result is not None and record["status"] == "ok":
+                        on_result(record["result"])
+
+            for index, line in _iter_jsonl(input_path):
+                # Keep a bounded number of briefs in flight so huge input
+                # files are never fully materialized in memory.
+                while len(pending) + waiting >= concurrency * 2:
+                    drain()
+                fingerprint = _fingerprint_line(line) if dedupe else None
+                group = groups.get(fingerprint) if fingerprint else None
+                if fingerprint is None:
+                    submit(index, line)
+                elif group is None:
+                    groups[fingerprint] = group = {
+                        "fingerprint": fingerprint,
+                        "brief": json.loads(line),
+                        "source": None,
+                        "waiting": []
+                    }
+                    submit(index, line, group)
+                    _evict_groups(groups, max_groups)
+                elif group["source"] is None:
+                    group["waiting"].append((index, line))
+                    waiting += 1
+                else:
+                    groups.move_to_end(fingerprint)
+                    submit(index, line, group)
+            while pending:
+                drain()
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            "total": len(latencies),
+            "succeeded": counts["ok"],
+            "failed": counts["error"],
+            "elapsed": elapsed,
+            "concurrency": concurrency,
+            **summarize_latencies(latencies, elapsed),
+            **totals,
+            "repaired_local": repaired["local"],
+            "repaired_llm_patch": repaired["llm_patch"],
+            **deduped,
+            "cost_per_brief": totals["cost"] / len(latencies) if latencies else 0.0
+        }
+        self.metrics.logger.info(
+            f"Batch completed: {summary['total']} briefs in {elapsed:.2f}s "
+            f"({summary['throughput']:.2f} briefs/s, "
+            f"p50 {summary['latency_p50']:.2f}s, p95 {summary['latency_p95']:.2f}s, "
+            f"{summary['failed']} failed, ${summary['cost']:.4f} total, "
+            f"{summary['llm_calls_avoided']} LLM calls avoided)",
+            extra={"fields": {"event": "batch_completed", **summary}}
+        )
+        return summary
+
+@lru_cache(maxsize=1)
+def _campaign_schema() -> Dict:
+    """JSON schema of the Campaign model, for schema-constrained output."""
+    return Campaign.model_json_schema()
+
+def _load_json(response: Any) -> Dict:
+    """Decode an LLM response; API responses are JSON text, mocks are dicts.
+
+    JSON wrapped in a code fence or surrounded by prose is extracted
+    rather than failing the brief.
+    """
+    if not isinstance(response, str):
+        return response
+    try:
+        return json.loads(response)
+    except ValueError:
+        return json.loads(extract_json(response))
+
+def _fingerprint_line(line: str) -> Optional[str]:
+    """Fingerprint a JSONL brief, or None if it isn't a valid brief."""
+    try:
+        return brief_fingerprint(CampaignBrief(**json.loads(line)))
+    except (TypeError, ValueError):
+        return None
+
+def _evict_groups(groups: "OrderedDict[str, Dict]", max_groups: int) -> None:
+    """Drop the least recently used finished groups beyond max_groups.
+
+    Groups still generating are kept, since members may be waiting on them.
+    """
+    for fingerprint in list(groups):
+        if len(groups) <= max_groups:
+            break
+        if groups[fingerprint]["source"] is not None:
+            del groups[fingerprint]
+
+def _iter_jsonl(path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (line number, line) for each non-blank line of a JSONL file."""
+    with open(path, "r") as f:
+        for index, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield index, line
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point for single-brief and batch processing."""
+    parser = argparse.ArgumentParser(
+        description="Convert campaign briefs into structured ad campaign plans."
+    )
+    parser.add_argument("brief", nargs="?", help="Path to a JSON brief file")
+    parser.add_argument(
+        "--batch",
+        help="Path to a JSONL file with one brief per line"
+    )
+    parser.add_argument(
+        "--output",
+        default="campaign_results.jsonl",
+        help="JSONL file for batch results (default: campaign_results.jsonl)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("BATCH_CONCURRENCY", "4")),
+        help="Number of briefs processed concurrently in batch mode"
+    )
+    parser.add_argument(
+        "--export",
+        help="Also export batch campaigns to this NDJSON file or Parquet/Arrow directory"
+    )
+    parser.add_argument(
+        "--export-format",
+        choices=["ndjson", "parquet", "arrow"],
+        default="parquet",
+        help="Format for --export (default: parquet)"
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        dest="dedupe",
+        action="store_false",
+        default=None,
+        help="Generate every brief in a batch, even near-duplicates"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve per-stage latency metrics on this port while running"
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        default=os.getenv("MOCK_LLM", "false").lower() == "true",
+        help="Use mock LLM responses"
+    )
+    parser.add_argument(
+        "--fanout",
+        action="store_true",
+        default=None,
+        help="Generate each ad group's creatives in a separate parallel call"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="Seconds each brief may take; a degraded plan is returned if it runs out"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=None,
+        help="Write a CPU and allocation profile of every brief to PROFILE_DIR "
+             "(allocations are traced process-wide; use with --concurrency 1)"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.brief and not args.batch:
+        parser.error("either a brief file or --batch is required")
+    if args.profile and args.batch and args.concurrency > 1:
+        print(
+            f"warning: with --concurrency {args.concurrency}, each profile's allocations "
+            "and peak memory include the briefs running alongside it; "
+            "use --concurrency 1 for per-brief numbers",
+            file=sys.stderr
+        )
+
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+
+    agent = CampaignAgent(mock=args.mock, fanout=args.fanout)
+    agent.profile = args.profile
+    if args.deadline is not None:
+        agent.deadline = args.deadline
+    if args.batch:
+        if args.export:
+            with open_exporter(args.export, args.export_format) as exporter:
+                summary = agent.process_batch(
+                    args.batch, args.output, args.concurrency, args.dedupe, exporter.write
+                )
+        else:
+            summary = agent.process_batch(args.batch, args.output, args.concurrency, args.dedupe)
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["failed"] else 0
+
+    campaign = agent.process_brief_from_file(args.brief)
+    print(json.dumps(campaign, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.agent import CampaignAgent, _iter_jsonl
+from src.models.brief import CampaignBrief
+from src.utils.metrics import start_metrics_server
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+class JobStore:
+    """Durable queue of briefs in SQLite, shared by worker processes.
+
+    Each brief is a job that moves from pending to running to done or
+    failed. A worker claims a job with a lease and renews it while it
+    works; if the worker dies, the lease expires and another worker
+    picks the job up again. Failed attempts are retried after a delay
+    until max_attempts is reached, unless the brief itself is invalid.
+    Completed results are kept in the store, so a restarted batch only
+    runs the unfinished briefs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300,
+        max_attempts: int = 3,
+        retry_delay: float = 5
+    ):
+        """Initialize the store, creating the database if needed.
+
+        Args:
+            path: SQLite file, which may live on a volume shared by hosts
+            lease_seconds: How long a claim lasts without being renewed
+            max_attempts: Attempts (including expired leases) before a job fails
+            retry_delay: Seconds before a failed attempt is retried, per attempt
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; claims use explicit IMMEDIATE transactions so two
+        # processes can never take the same job.
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, batch TEXT NOT NULL, line INTEGER NOT NULL, "
+            "brief TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL DEFAULT 0, "
+            "lease_owner TEXT, lease_expires REAL, record TEXT, error TEXT, "
+            "updated_at REAL NOT NULL, UNIQUE (batch, line))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, available_at, lease_expires)"
+        )
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> "JobStore":
+        """Build a store from environment variables."""
+        return cls(
+            path=path or os.getenv("JOBS_STORE_PATH", "jobs.sqlite"),
+            lease_seconds=float(os.getenv("JOBS_LEASE_SECONDS", "300")),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+            retry_delay=float(os.getenv("JOBS_RETRY_DELAY", "5"))
+        )
+
+    def close(self) -> None:
+        self._db.close()
+
+    def enqueue(self, input_path: str, batch: Optional[str] = None) -> int:
+        """Add every brief of a JSONL file as a pending job.
+
+        Jobs are keyed by batch and line number, so enqueueing the same
+        file again (e.g. after a crash) adds nothing.
+
+        Args:
+            input_path: JSONL file with one brief per line
+            batch: Batch name; defaults to the file's absolute path
+
+        Returns:
+            int: Number of jobs added
+        """
+        batch = batch or os.path.abspath(input_path)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._db.total_changes
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO jobs (batch, line, brief, updated_at) VALUES (?, ?, ?, ?)",
+                    ((batch, index, line, now) for index, line in _iter_jsonl(input_path))
+                )
+                added = self._db.total_changes - before
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Lease the next runnable job to a worker.
+
+        Runnable jobs are pending ones past their retry delay and running
+        ones whose lease expired (their worker is presumed dead). Jobs
+        whose lease expired on their last attempt are failed instead,
+        with an error record so they show up in export().
+
+        Returns:
+            Dict: The job's "id", "batch", "line", "brief" and "attempts",
+            or None if nothing is runnable right now
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._db.execute(
+                    "SELECT id, line, brief, attempts, error FROM jobs "
+                    "WHERE state = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.max_attempts)
+                ).fetchall()
+                for job_id, line, brief, attempts, error in expired:
+                    error = error or "Lease expired"
+                    record = {
+                        "index": line,
+                        "campaign_id": _campaign_id(brief),
+                        "attempts": attempts,
+                        "status": "error",
+                        "error": error
+                    }
+                    self._db.execute(
+                        "UPDATE jobs SET state = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                        "record = ?, error = ?, updated_at = ? WHERE id = ?",
+                        (json.dumps(record), error, now, job_id)
+                    )
+                row = self._db.execute(
+                    "SELECT id, batch, line, brief, attempts FROM jobs "
+                    "WHERE (state = 'pending' AND available_at <= ?) "
+                    "OR (state = 'running' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET state = 'running', attempts = attempts + 1, "
+                        "lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                        (worker, now + self.lease_seconds, now, row[0])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "batch": row[1], "line": row[2], "brief": row[3], "attempts": row[4] + 1}
+
+    def renew(self, worker: str) -> None:
+        """Extend the leases of all jobs a worker is running."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE state = 'running' AND lease_owner = ?",
+                (now + self.lease_seconds, worker)
+            )
+
+    def complete(self, job: Dict, worker: str, record: Dict) -> bool:
+        """Store a job's result record; False if the worker lost its lease."""
+        return self._finish(job, worker, "done", record, None, 0.0)
+
+    def fail(self, job: Dict, worker: str, record: Dict) -> bool:
+        """Record a failed attempt, scheduling a retry if attempts remain.
+
+        Records marked "retryable": False (an invalid brief fails the same
+        way every time) fail the job right away.
+
+        Returns:
+            bool: False if the worker lost its lease meanwhile
+        """
+        if job["attempts"] >= self.max_attempts or not record.get("retryable", True):
+            return self._finish(job, worker, "failed", record, record.get("error"), 0.0)
+        delay = self.retry_delay * job["attempts"]
+        return self._finish(job, worker, "pending", None, record.get("error"), delay)
+
+    def _finish(
+        self,
+        job: Dict,
+        worker: str,
+        state: str,
+        record: Optional[Dict],
+        error: Optional[str],
+        delay: float
+    ) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET state = ?, record = ?, error = ?, available_at = ?, "
+                "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND state = 'running' AND lease_owner = ?",
+                (state, json.dumps(record) if record is not None else None, error,
+                 now + delay, now, job["id"], worker)
+            )
+        return cursor.rowcount == 1
+
+    def counts(self, batch: Optional[str] = None) -> Dict[str, int]:
+        """Number of jobs in each state, optionally for one batch."""
+        query = "SELECT state, COUNT(*) FROM jobs"
+        params: tuple = ()
+        if batch is not None:
+            query += " WHERE batch = ?"
+            params = (batch,)
+        with self._lock:
+            rows = self._db.execute(query + " GROUP BY state", params).fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def unfinished(self) -> int:
+        """Number of jobs still pending or running."""
+        counts = self.counts()
+        return counts["pending"] + counts["running"]
+
+    def retry_failed(self, batch: Optional[str] = None) -> int:
+        """Move failed jobs back to pending with a fresh attempt budget."""
+        query = (
+            "UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0, "
+            "record = NULL, updated_at = ? WHERE state = 'failed'"
+        )
+        params: tuple = (time.time(),)
+        if batch is not None:
+            query += " AND batch = ?"
+            params += (batch,)
+        with self._lock:
+            return self._db.execute(query, params).rowcount
+
+    def export(self, output_path: str, batch: Optional[str] = None) -> int:
+        """Write finished jobs' records as batch results JSONL, in input order.
+
+        The output has the same format as process_batch's, so it can be
+        fed to src.utils.export.
+
+        Returns:
+            int: Number of records written
+        """
+        query = "SELECT record FROM jobs WHERE state IN ('done', 'failed') AND record IS NOT NULL"
+        params: tuple = ()
+        if batch is not None:
+            query += " AND batch = ?"
+            params = (batch,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY batch, line", params).fetchall()
+        with open(output_path, "w") as out:
+            for (record,) in rows:
+                out.write(record + "\n")
+        return len(rows)
+
+def _campaign_id(brief: str) -> Optional[str]:
+    """Campaign ID of a stored brief, or None if it doesn't have one."""
+    try:
+        return json.loads(brief).get("campaign_id")
+    except (ValueError, AttributeError):
+        return None
+
+def run_job(agent: CampaignAgent, job: Dict) -> Dict:
+    """Process one job's brief into a record like process_batch's.
+
+    A brief that isn't valid JSON or doesn't validate gets an error record
+    marked "retryable": False.
+    """
+    start = time.perf_counter()
+    record = {"index": job["line"], "campaign_id": None, "cost": 0.0, "attempts": job["attempts"]}
+    agent.metrics.reset_metrics()
+    retryable = False
+    try:
+        brief = json.loads(job["brief"])
+        record["campaign_id"] = brief.get("campaign_id")
+        CampaignBrief(**brief)
+        retryable = True
+        record["result"] = agent.process_brief(brief)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        if not retryable:
+            record["retryable"] = False
+    record["cost"] = agent.metrics.metrics["cost"]
+    record["usage"] = dict(agent.metrics.metrics["usage"])
+    if "repair" in agent.metrics.metrics:
+        record["repair"] = agent.metrics.metrics["repair"]["path"]
+    record["latency"] = time.perf_counter() - start
+    return record
+
+def run_worker(
+    store_path: str,
+    mock: bool = False,
+    fanout: Optional[bool] = None,
+    threads: int = 1,
+    poll_interval: float = 1.0,
+    wait: bool = False
+) -> Dict[str, int]:
+    """Work through a job store until no jobs are left.
+
+    Runs threads agents (one per thread) in this process. Leases are
+    renewed from a background thread while jobs run.
+
+    Args:
+        store_path: SQLite job store
+        mock: Use mock LLM responses
+        fanout: Use fan-out generation; defaults to LLM_FANOUT
+        threads: Briefs processed concurrently by this process
+        poll_interval: Seconds between claims when no job is runnable
+        wait: Keep polling for new jobs instead of exiting when none are left
+
+    Returns:
+        Dict: Number of jobs this process completed ("done") and failed
+        attempts ("error")
+    """
+    store = JobStore.from_env(store_path)
+    agent = CampaignAgent(mock=mock, fanout=fanout)
+    agent.priority = "batch"
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    counts = {"done": 0, "error": 0}
+    counts_lock = threading.Lock()
+    stop = threading.Event()
+
+    def renew_leases(workers: List[str]) -> None:
+        while not stop.wait(store.lease_seconds / 3):
+            for worker in workers:
+                store.renew(worker)
+
+    def work(worker: str) -> None:
+        thread_agent = agent.clone()
+        while True:
+            job = store.claim(worker)
+            if job is None:
+                # Running jobs may still come back if their worker died
+                if not wait and store.unfinished() == 0:
+                    return
+                time.sleep(poll_interval)
+                continue
+            record = run_job(thread_agent, job)
+            if record["status"] == "ok":
+                store.complete(job, worker, record)
+            else:
+                store.fail(job, worker, record)
+            with counts_lock:
+                counts["done" if record["status"] == "ok" else "error"] += 1
+
+    workers = [f"{worker_prefix}:{i}" for i in range(max(1, threads))]
+    renewer = threading.Thread(target=renew_leases, args=(workers,), daemon=True)
+    renewer.start()
+    pool = [threading.Thread(target=work, args=(worker,)) for worker in workers]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    stop.set()
+    store.close()
+    return counts
+
+def _worker_process(
+    store_path: str,
+    mock: bool,
+    fanout: Optional[bool],
+    threads: int,
+    wait: bool,
+    processes: int
+) -> None:
+    # Each process has its own rate limiter; together they stay within
+    # the configured (or provider-reported) budgets
+    share = float(os.getenv("LLM_RATE_SHARE", "1")) / processes
+    os.environ["LLM_RATE_SHARE"] = str(share)
+    run_worker(store_path, mock=mock, fanout=fanout, threads=threads, wait=wait)
+
+def run_workers(
+    store_path: str,
+    processes: int,
+    mock: bool = False,
+    fanout: Optional[bool] = None,
+    threads: int = 1,
+    wait: bool = False
+) -> None:
+    """Run worker processes against one store and wait for them to exit.
+
+    The LLM rate budgets are split evenly between the processes.
+    """
+    processes = max(1, processes)
+    context = multiprocessing.get_context("spawn")
+    children = [
+        context.Process(target=_worker_process, args=(store_path, mock, fanout, threads, wait, processes))
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point: enqueue briefs, run workers, check status."""
+    parser = argparse.ArgumentParser(
+        description="Durable, resumable batch processing of campaign briefs."
+    )
+    parser.add_argument(
+        "--store",
+        default=os.getenv("JOBS_STORE_PATH", "jobs.sqlite"),
+        help="SQLite job store (default: JOBS_STORE_PATH or jobs.sqlite)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add the briefs of a JSONL file as jobs")
+    enqueue.add_argument("input", help="JSONL file with one brief per line")
+    enqueue.add_argument("--batch", help="Batch name (default: the file's path)")
+
+    work = commands.add_parser("work", help="Process jobs until none are left")
+    work.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    work.add_argument("--threads", type=int, default=1, help="Briefs in flight per process")
+    work.add_argument("--wait", action="store_true", help="Keep waiting for new jobs")
+    work.add_argument("--retry-failed", action="store_true", help="Requeue failed jobs first")
+    work.add_argument(
+        "--mock",
+        action="store_true",
+        default=os.getenv("MOCK_LLM", "false").lower() == "true",
+        help="Use mock LLM responses"
+    )
+    work.add_argument("--fanout", action="store_true", default=None)
+    work.add_argument("--metrics-port", type=int, help="Serve metrics of this process")
+
+    commands.add_parser("status", help="Print the number of jobs in each state")
+
+    export = commands.add_parser("export", help="Write finished results as batch JSONL")
+    export.add_argument("output", help="JSONL file to write")
+    export.add_argument("--batch", help="Only export this batch")
+    args = parser.parse_args(argv)
+
+    store = JobStore.from_env(args.store)
+    if args.command == "enqueue":
+        print(json.dumps({"added": store.enqueue(args.input, args.batch), **store.counts()}, indent=2))
+    elif args.command == "work":
+        if args.retry_failed:
+            store.retry_failed()
+        if args.metrics_port is not None:
+            start_metrics_server(args.metrics_port)
+        if args.processes <= 1:
+            run_worker(args.store, mock=args.mock, fanout=args.fanout, threads=args.threads, wait=args.wait)
+        else:
+            run_workers(args.store, args.processes, args.mock, args.fanout, args.threads, args.wait)
+        counts = store.counts()
+        print(json.dumps(counts, indent=2))
+        return 1 if counts["failed"] else 0
+    elif args.command == "status":
+        print(json.dumps(store.counts(), indent=2))
+    else:
+        print(json.dumps({"exported": store.export(args.output, args.batch)}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,3 +3,43 @@ USER_PROMPT_TEMPLATE = """Please create a detailed ad campaign plan based on the
 {brief}
 
 Generate a complete campaign plan following the required JSON schema. Include multiple ad groups and creative variants appropriate for the target audience and channels."""
+
+
+SKELETON_PROMPT_TEMPLATE = """Please plan the structure of an ad campaign based on the following brief:
+
+{brief}
+
+Do not write any ad copy yet. Return a single JSON object with "campaign_id", "campaign_name", "objective", "total_budget", a "budget_breakdown" covering every channel in the brief, and "ad_groups": a list of ad groups, each with an "id" (ag_1, ag_2, ...), the "channel" it runs on and a "target" with "age" and "behaviors". Plan at least one ad group per channel. Set "creatives" to an empty list in every ad group."""
+
+AD_GROUP_PROMPT_TEMPLATE = """Please write the creatives for one ad group of the campaign "{campaign_name}", based on the following brief:
+
+{brief}
+
+The ad group is:
+
+{ad_group}
+
+Return a single JSON object of the form {{"creatives": [...]}} with two or three creative variants for this ad group only. Each creative has an "id" ({ad_group_id}_a, {ad_group_id}_b, ...), a "headline", a "body", a "cta" and a short "justification". Keep ad copy within the channel's limits."""
+
+AD_GROUP_REPLAN_PROMPT_TEMPLATE = """Please plan and write one ad group of the campaign "{campaign_name}", based on the following edited brief:
+
+{brief}
+
+The campaign's other ad groups target:
+
+{other_targets}
+
+Target an audience from the brief's audience hints that the other ad groups don't cover yet. Return a single JSON object with "id": "{ad_group_id}", a "target" with "age" and "behaviors", and "creatives": two or three creative variants, each with an "id" ({ad_group_id}_a, {ad_group_id}_b, ...), a "headline", a "body", a "cta" and a short "justification". Keep ad copy within the channel's limits."""
+
+REPAIR_PROMPT_TEMPLATE = """A generated ad campaign for the following brief failed validation:
+
+{brief}
+
+This fragment of the campaign is invalid:
+
+{fragment}
+
+Validation errors:
+{errors}
+
+Return only the corrected fragment as a single JSON object. Keep every valid field unchanged and fill in missing fields consistently with the brief."""
@@ -0,0 +1,273 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from src.utils.metrics import export_prometheus, gauges_snapshot, metrics_snapshot
+from src.utils.ratelimit import LANES
+
+# The agent and LLM client (openai, pydantic, httpx) are imported by
+# start_service only, so `submit` stays a thin, fast-starting client.
+if TYPE_CHECKING:
+    from src.agent import CampaignAgent
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+def brief_key(brief: Dict) -> str:
+    """Key identical briefs share, independent of key order."""
+    payload = json.dumps(brief, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class BriefCoalescer:
+    """Run identical concurrent requests once.
+
+    The first caller for a key runs the work; callers arriving while it
+    is in flight wait for it and receive a copy of its result (or its
+    exception). Nothing is kept once the work finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def run(self, key: str, work: Callable[[], Dict]) -> Tuple[Dict, bool]:
+        """Run work for key, or wait for the identical run in flight.
+
+        Returns:
+            Tuple: The result and whether it was coalesced onto another call
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            return copy.deepcopy(future.result()), True
+
+        try:
+            result = work()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+class CampaignService(ThreadingHTTPServer):
+    """HTTP server keeping a warm CampaignAgent, KB and LLM client.
+
+    Endpoints:
+        POST /campaigns: brief JSON in, campaign plan JSON out
+        GET /health: liveness and in-flight count
+        GET /metrics, /metrics.json: as served by --metrics-port
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], agent: "CampaignAgent"):
+        super().__init__(address, _ServiceRequestHandler)
+        self.agent = agent
+        self.coalescer = BriefCoalescer()
+        self.stats = {"requests": 0, "coalesced": 0}
+        self._stats_lock = threading.Lock()
+
+    def process(self, brief: Dict, priority: str = "interactive") -> Tuple[Dict, bool]:
+        """Process a brief, coalescing it with an identical one in flight."""
+        def work() -> Dict:
+            # process_brief keeps per-call state, and the server starts a
+            # thread per request, so each request gets its own (cheap) clone
+            agent = self.agent.clone()
+            agent.priority = priority
+            return agent.process_brief(brief)
+
+        result, coalesced = self.coalescer.run(brief_key(brief), work)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["coalesced"] += int(coalesced)
+        return result, coalesced
+
+class _ServiceRequestHandler(BaseHTTPRequestHandler):
+    server: CampaignService
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "in_flight": self.server.coalescer.in_flight(),
+                **self.server.stats
+            })
+        elif self.path == "/metrics":
+            payload = export_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        elif self.path == "/metrics.json":
+            self._send_json(200, {**metrics_snapshot(), "gauges": gauges_snapshot()})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != "/campaigns":
+            self.send_error(404)
+            return
+        priority = self.headers.get("X-Priority", "interactive")
+        if priority not in LANES:
+            self._send_json(400, {"error": f"Unknown priority: {priority}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            brief = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        try:
+            campaign, coalesced = self.server.process(brief, priority)
+        except ValueError as e:
+            # Invalid briefs and campaigns that failed validation
+            self._send_json(422, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, campaign, {"X-Coalesced": "true" if coalesced else "false"})
+
+    def log_message(self, format, *args):
+        pass  # requests are recorded by the metrics logger
+
+def start_service(
+    port: int = 8765,
+    host: str = "127.0.0.1",
+    mock: bool = False,
+    fanout: Optional[bool] = None
+) -> CampaignService:
+    """Start the service on a daemon thread with a warmed-up agent.
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        host: Interface to bind, local only by default
+        mock: Use mock LLM responses
+        fanout: Use fan-out generation; defaults to LLM_FANOUT
+
+    Returns:
+        CampaignService: The running server; call shutdown() to stop it
+    """
+    from src.agent import CampaignAgent
+    from src.utils.llm import get_client
+
+    agent = CampaignAgent(mock=mock, fanout=fanout)
+    if not mock:
+        get_client()  # open the connection pool before the first request
+    server = CampaignService((host, port), agent)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def submit_brief(
+    brief: Dict,
+    url: str = DEFAULT_URL,
+    priority: str = "interactive",
+    timeout: float = 300
+) -> Dict:
+    """Submit a brief to a running service and return the campaign plan.
+
+    Args:
+        brief: The campaign brief
+        url: Base URL of the service
+        priority: Rate limiter lane, "interactive" or "batch"
+        timeout: Seconds to wait for the response
+
+    Returns:
+        Dict: The campaign plan
+
+    Raises:
+        ValueError: If the service rejected the brief or its campaign
+        RuntimeError: If the service failed to process the brief
+    """
+    request = urllib.request.Request(
+        url.rstrip("/") + "/campaigns",
+        data=json.dumps(brief).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Priority": priority},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        if e.code < 500:
+            raise ValueError(message) from None
+        raise RuntimeError(message) from None
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point: run the service or submit a brief to it."""
+    parser = argparse.ArgumentParser(
+        description="Resident campaign agent service and its client."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the service in the foreground")
+    serve.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    serve.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8765")))
+    serve.add_argument(
+        "--mock",
+        action="store_true",
+        default=os.getenv("MOCK_LLM", "false").lower() == "true",
+        help="Use mock LLM responses"
+    )
+    serve.add_argument("--fanout", action="store_true", default=None)
+
+    submit = commands.add_parser("submit", help="Submit a JSON brief file to the service")
+    submit.add_argument("brief", help="Path to a JSON brief file")
+    submit.add_argument("--url", default=os.getenv("SERVICE_URL", DEFAULT_URL))
+    submit.add_argument("--priority", choices=list(LANES), default="interactive")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = start_service(args.port, args.host, args.mock, args.fanout)
+        print(f"Serving on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    with open(args.brief, "r") as f:
+        brief = json.load(f)
+    try:
+        campaign = submit_brief(brief, args.url, args.priority)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(campaign, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+class ResponseCache:
+    """Content-addressed cache for LLM completions.
+
+    Entries live in a bounded in-process LRU tier backed by a persistent
+    SQLite tier. Both tiers honor the same TTL; the SQLite tier is also
+    bounded in bytes and evicts least recently used entries first.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 256,
+        ttl: float = 7 * 24 * 3600,
+        max_bytes: int = 100 * 1024 * 1024
+    ):
+        """Initialize the cache.
+
+        Args:
+            path: SQLite file for the persistent tier, or None for memory only
+            max_entries: Maximum number of entries in the in-memory tier
+            ttl: Time to live for entries in seconds
+            max_bytes: Maximum total size of cached values on disk
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0}
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "size INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Build a cache from environment variables, or None if disabled."""
+        if os.getenv("LLM_CACHE", "true").lower() != "true":
+            return None
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite") or None,
+            max_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+        )
+
+    @staticmethod
+    def make_key(system_prompt: str, user_prompt: str, model: str, params: Dict) -> str:
+        """Hash the prompts, model and sampling parameters into a cache key."""
+        payload = json.dumps(
+            {
+                "system": system_prompt,
+                "user": user_prompt,
+                "model": model,
+                "params": params
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """Look up a cached value.
+
+        Returns:
+            Tuple: (value, tier) where tier is "memory" or "disk", or
+            (None, None) on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return value, "memory"
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl:
+                        self._db.execute(
+                            "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        self._remember(key, value, created_at)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return value, "disk"
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats["misses"] += 1
+            return None, None
+
+    def contains(self, key: str) -> bool:
+        """Whether a live entry exists, without counting a hit or miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                return True
+            if self._db is None:
+                return False
+            row = self._db.execute(
+                "SELECT created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            return row is not None and now - row[0] <= self.ttl
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value in both tiers, evicting old entries as needed."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, len(value.encode("utf-8")))
+            )
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            self._evict_disk()
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at, rowid"
+        ).fetchall()
+        evict = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+_cache_lock = threading.Lock()
+_cache: Optional[ResponseCache] = None
+_cache_loaded = False
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None if caching is disabled."""
+    global _cache, _cache_loaded
+    if not _cache_loaded:
+        with _cache_lock:
+            if not _cache_loaded:
+                _cache = ResponseCache.from_env()
+                _cache_loaded = True
+    return _cache
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """Replace the process-wide response cache (None disables caching)."""
+    global _cache, _cache_loaded
+    with _cache_lock:
+        _cache = cache
+        _cache_loaded = True
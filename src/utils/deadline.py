@@ -0,0 +1,58 @@
+import os
+import time
+from typing import Dict, Optional
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a brief's deadline leaves no time for the next step.
+
+    Attributes:
+        partial: The part of the campaign generated before the deadline,
+            if any, e.g. the skeleton with the ad groups completed so far
+    """
+
+    def __init__(self, message: str, partial: Optional[Dict] = None):
+        super().__init__(message)
+        self.partial = partial
+
+class Deadline:
+    """Point in time by which a brief must be processed.
+
+    Generation has to stop margin seconds early, which leaves time to
+    validate, repair locally and score whatever was generated.
+    """
+
+    def __init__(self, seconds: float, margin: float = 0.25):
+        """Start the clock.
+
+        Args:
+            seconds: Time the brief may take from now
+            margin: Seconds reserved after generation for validation and scoring
+        """
+        self.seconds = seconds
+        self.margin = min(margin, seconds / 4)
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def start(cls, seconds: Optional[float]) -> Optional["Deadline"]:
+        """Start a deadline, or return None if seconds is None (no deadline).
+
+        The margin is read from CAMPAIGN_DEADLINE_MARGIN.
+        """
+        if seconds is None:
+            return None
+        return cls(seconds, float(os.getenv("CAMPAIGN_DEADLINE_MARGIN", "0.25")))
+
+    def remaining(self) -> float:
+        """Seconds left until the deadline."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def generation_time(self, step: str) -> float:
+        """Seconds left for a generation step, keeping the margin free.
+
+        Raises:
+            DeadlineExceeded: If there's no time left for the step
+        """
+        left = self.remaining() - self.margin
+        if left <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s left no time for {step}")
+        return left
@@ -0,0 +1,162 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.models.brief import CampaignBrief
+from src.validators.repair import repair_budget_breakdown
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+def normalize_brief(brief: CampaignBrief) -> Dict[str, Any]:
+    """Reduce a brief to the fields that shape its creatives.
+
+    The campaign ID and budget are dropped, text is whitespace- and
+    case-normalized, and channels and audience hints are sorted since
+    their order doesn't change the campaign.
+    """
+    data = brief.model_dump()
+    data.pop("campaign_id", None)
+    data.pop("budget", None)
+    for key in ("channels", "audience_hints"):
+        data[key] = sorted(_normalize_text(value) for value in data.get(key) or [])
+    for key in ("goal", "tone"):
+        if isinstance(data.get(key), str):
+            data[key] = _normalize_text(data[key])
+    product = data.get("product") or {}
+    for key, value in product.items():
+        if isinstance(value, str):
+            product[key] = _normalize_text(value)
+        elif isinstance(value, list):
+            product[key] = [_normalize_text(v) if isinstance(v, str) else v for v in value]
+    return data
+
+def brief_fingerprint(brief: CampaignBrief) -> str:
+    """Fingerprint of a brief; equal for briefs equivalent for creative purposes."""
+    normalized = json.dumps(normalize_brief(brief), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def derive_campaign(
+    source_campaign: Dict,
+    source_brief: CampaignBrief,
+    brief: CampaignBrief
+) -> Dict:
+    """Derive a campaign for a brief from one generated for an equivalent brief.
+
+    The campaign ID and total are taken from the brief and the budget
+    breakdown is rescaled to its budget. Scores and metrics are dropped so
+    the result can be validated and scored like a fresh generation.
+
+    Args:
+        source_campaign (Dict): Campaign plan generated for source_brief
+        source_brief (CampaignBrief): Brief the source campaign was generated for
+        brief (CampaignBrief): Brief with the same fingerprint to derive for
+
+    Returns:
+        Dict: The raw campaign for brief
+    """
+    campaign = copy.deepcopy({k: v for k, v in source_campaign.items() if k != "metrics"})
+    for ad_group in campaign.get("ad_groups", []):
+        for creative in ad_group.get("creatives", []):
+            creative.pop("score", None)
+    campaign["campaign_id"] = brief.campaign_id
+    campaign["total_budget"] = brief.budget
+    ratio = brief.budget / source_brief.budget if source_brief.budget else 0.0
+    breakdown = campaign["budget_breakdown"]
+    for channel, amount in breakdown.items():
+        breakdown[channel] = round(amount * ratio, 2)
+    # Puts the rounding remainder on the largest channel
+    repair_budget_breakdown(breakdown, brief.channels, brief.budget)
+    return campaign
+
+def prune_channels(campaign: Dict, brief: CampaignBrief, ad_groups: bool = False) -> List[str]:
+    """Drop the channels a brief doesn't have from a campaign, in place.
+
+    Their budget goes to the brief's channels (see repair_budget_breakdown).
+
+    Args:
+        campaign (Dict): Raw campaign derived for brief
+        brief (CampaignBrief): Brief the campaign is for
+        ad_groups (bool): Also drop the ad groups planned for those channels
+
+    Returns:
+        List[str]: The channels dropped
+    """
+    breakdown = campaign["budget_breakdown"]
+    dropped = [channel for channel in breakdown if channel not in brief.channels]
+    for channel in dropped:
+        del breakdown[channel]
+    if ad_groups:
+        # Ad groups planned without a channel can run on any of them
+        stale = [
+            ad_group for ad_group in campaign.get("ad_groups", [])
+            if ad_group.get("channel") is not None and ad_group["channel"] not in brief.channels
+        ]
+        campaign["ad_groups"] = [ad_group for ad_group in campaign["ad_groups"] if ad_group not in stale]
+        dropped += [c for c in dict.fromkeys(a["channel"] for a in stale) if c not in dropped]
+    if dropped:
+        repair_budget_breakdown(breakdown, brief.channels, brief.budget)
+    return dropped
+
+class RecentPlans:
+    """Recently generated campaign plans, looked up by similar briefs.
+
+    Kept process-wide so a brief about to miss its deadline can fall back
+    to the plan of an equivalent brief (same fingerprint) or, failing
+    that, the latest plan for the same product.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """Initialize the store.
+
+        Args:
+            max_entries: Plans kept, least recently stored evicted first; 0 disables
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[str, Tuple[CampaignBrief, Dict]]" = OrderedDict()
+
+    def put(self, brief: CampaignBrief, campaign: Dict) -> None:
+        """Remember the plan generated for a brief."""
+        if self.max_entries <= 0:
+            return
+        plan = copy.deepcopy({k: v for k, v in campaign.items() if k != "metrics"})
+        key = brief_fingerprint(brief)
+        with self._lock:
+            self._plans[key] = (brief, plan)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def get(self, brief: CampaignBrief) -> Optional[Tuple[CampaignBrief, Dict]]:
+        """Find a plan for a similar brief.
+
+        Returns:
+            Tuple: The brief the plan was generated for and the plan (to be
+            passed to derive_campaign), or None if there is none
+        """
+        key = brief_fingerprint(brief)
+        product = _normalize_text(brief.product.name)
+        with self._lock:
+            if key in self._plans:
+                return self._plans[key]
+            for source_brief, plan in reversed(self._plans.values()):
+                if _normalize_text(source_brief.product.name) == product:
+                    return source_brief, plan
+        return None
+
+_recent_plans: Optional[RecentPlans] = None
+_recent_plans_lock = threading.Lock()
+
+def get_recent_plans() -> RecentPlans:
+    """Process-wide store of recent plans, sized by CAMPAIGN_RECENT_PLANS."""
+    global _recent_plans
+    if _recent_plans is None:
+        with _recent_plans_lock:
+            if _recent_plans is None:
+                _recent_plans = RecentPlans(int(os.getenv("CAMPAIGN_RECENT_PLANS", "256")))
+    return _recent_plans
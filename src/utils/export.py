@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only needed for columnar export
+    pd = pa = pq = None
+
+# Flattened tables and their columns. Every table has a fixed schema so
+# batches can be appended to a single Parquet or Arrow file.
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "campaigns": [
+        ("campaign_id", "string"),
+        ("campaign_name", "string"),
+        ("objective", "string"),
+        ("total_budget", "float"),
+        ("ad_groups", "int"),
+        ("creatives", "int"),
+        ("budget_sum_ok", "bool"),
+        ("required_fields_present", "bool"),
+        ("processing_time", "float"),
+        ("cost", "float"),
+        ("prompt_tokens", "int"),
+        ("completion_tokens", "int"),
+        ("llm_calls", "int"),
+        ("hallucination_flags", "int"),
+        ("repair_path", "string"),
+        ("derived_from", "string")
+    ],
+    "creatives": [
+        ("campaign_id", "string"),
+        ("ad_group_index", "int"),
+        ("ad_group_id", "string"),
+        ("target_age", "string"),
+        ("target_behaviors", "list<string>"),
+        ("creative_index", "int"),
+        ("creative_id", "string"),
+        ("headline", "string"),
+        ("body", "string"),
+        ("cta", "string"),
+        ("justification", "string"),
+        ("score", "float"),
+        ("hallucination_flagged", "bool"),
+        ("hallucination_confidence", "float")
+    ],
+    "budgets": [
+        ("campaign_id", "string"),
+        ("channel", "string"),
+        ("amount", "float")
+    ],
+    "stages": [
+        ("campaign_id", "string"),
+        ("stage", "string"),
+        ("duration_ms", "float")
+    ]
+}
+
+def flatten_campaign(campaign: Dict) -> Dict[str, List[Dict]]:
+    """Flatten a campaign plan into rows for each export table.
+
+    Args:
+        campaign (Dict): A campaign plan as returned by process_brief
+
+    Returns:
+        Dict: Rows keyed by table name ("campaigns", "creatives",
+        "budgets", "stages")
+    """
+    campaign_id = campaign.get("campaign_id")
+    metrics = campaign.get("metrics") or {}
+    usage = metrics.get("usage") or {}
+    checks = campaign.get("checks") or {}
+    flags = {}
+    for flag in metrics.get("hallucination_flags") or []:
+        # Creative IDs are only unique within their ad group
+        key = (flag.get("ad_group_id"), flag.get("creative_id"))
+        flags[key] = max(flags.get(key, 0.0), flag.get("confidence", 0.0))
+
+    creatives = []
+    for i, ad_group in enumerate(campaign.get("ad_groups") or []):
+        target = ad_group.get("target") or {}
+        for j, creative in enumerate(ad_group.get("creatives") or []):
+            confidence = flags.get((ad_group.get("id"), creative.get("id")))
+            creatives.append({
+                "campaign_id": campaign_id,
+                "ad_group_index": i,
+                "ad_group_id": ad_group.get("id"),
+                "target_age": target.get("age"),
+                "target_behaviors": list(target.get("behaviors") or []),
+                "creative_index": j,
+                "creative_id": creative.get("id"),
+                "headline": creative.get("headline"),
+                "body": creative.get("body"),
+                "cta": creative.get("cta"),
+                "justification": creative.get("justification"),
+                "score": creative.get("score"),
+                "hallucination_flagged": confidence is not None,
+                "hallucination_confidence": confidence
+            })
+
+    return {
+        "campaigns": [{
+            "campaign_id": campaign_id,
+            "campaign_name": campaign.get("campaign_name"),
+            "objective": campaign.get("objective"),
+            "total_budget": campaign.get("total_budget"),
+            "ad_groups": len(campaign.get("ad_groups") or []),
+            "creatives": len(creatives),
+            "budget_sum_ok": checks.get("budget_sum_ok"),
+            "required_fields_present": checks.get("required_fields_present"),
+            "processing_time": metrics.get("processing_time"),
+            "cost": metrics.get("cost"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "llm_calls": usage.get("llm_calls"),
+            "hallucination_flags": len(metrics.get("hallucination_flags") or []),
+            "repair_path": (metrics.get("repair") or {}).get("path"),
+            "derived_from": metrics.get("derived_from")
+        }],
+        "creatives": creatives,
+        "budgets": [
+            {"campaign_id": campaign_id, "channel": channel, "amount": amount}
+            for channel, amount in (campaign.get("budget_breakdown") or {}).items()
+        ],
+        "stages": [
+            {"campaign_id": campaign_id, "stage": stage, "duration_ms": duration_ms}
+            for stage, duration_ms in (metrics.get("stages") or {}).items()
+        ]
+    }
+
+def iter_campaigns(path: str) -> Iterator[Dict]:
+    """Yield campaigns from an NDJSON export or a batch results JSONL file.
+
+    Batch records are unwrapped to their "result"; failed briefs are skipped.
+    """
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "status" in record and "index" in record:
+                if record["status"] != "ok":
+                    continue
+                record = record["result"]
+            yield record
+
+class NDJSONExporter:
+    """Stream campaigns to an NDJSON file, one compact object per line.
+
+    Each campaign is written as soon as it arrives, so memory use doesn't
+    grow with the number of campaigns.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.counts = {"campaigns": 0}
+        self._file = open(path, "w")
+
+    def write(self, campaign: Dict) -> None:
+        self._file.write(json.dumps(campaign, separators=(",", ":")) + "\n")
+        self.counts["campaigns"] += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "NDJSONExporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _arrow_type(name: str):
+    return {
+        "string": pa.string(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "list<string>": pa.list_(pa.string())
+    }[name]
+
+class ColumnarExporter:
+    """Write campaigns as flattened Parquet or Arrow tables in batches.
+
+    Creates one file per table in the output directory
+    (campaigns.parquet, creatives.parquet, budgets.parquet and
+    stages.parquet, or .arrow files). Rows are buffered per table and
+    appended as a Parquet row group or Arrow record batch every
+    batch_size rows, so memory stays bounded by the batch size.
+    """
+
+    def __init__(self, directory: str, format: str = "parquet", batch_size: int = 1000):
+        """Initialize the exporter.
+
+        Args:
+            directory: Output directory, created if missing
+            format: "parquet" or "arrow" (Arrow IPC file format)
+            batch_size: Rows buffered per table before each write
+
+        Raises:
+            ImportError: If pandas or pyarrow isn't installed
+        """
+        if pa is None:
+            raise ImportError("Columnar export requires pandas and pyarrow: pip install pyarrow")
+        if format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown columnar format: {format}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.batch_size = max(1, batch_size)
+        self.counts = {table: 0 for table in TABLES}
+        self._rows: Dict[str, List[Dict]] = {table: [] for table in TABLES}
+        self._schemas = {
+            table: pa.schema([(name, _arrow_type(kind)) for name, kind in columns])
+            for table, columns in TABLES.items()
+        }
+        self._writers = {}
+
+    def write(self, campaign: Dict) -> None:
+        for table, rows in flatten_campaign(campaign).items():
+            self._rows[table].extend(rows)
+            if len(self._rows[table]) >= self.batch_size:
+                self._flush(table)
+
+    def _writer(self, table: str):
+        writer = self._writers.get(table)
+        if writer is None:
+            path = os.path.join(self.directory, f"{table}.{self.format}")
+            if self.format == "parquet":
+                writer = pq.ParquetWriter(path, self._schemas[table])
+            else:
+                writer = pa.ipc.new_file(path, self._schemas[table])
+            self._writers[table] = writer
+        return writer
+
+    def _flush(self, table: str) -> None:
+        rows = self._rows[table]
+        if not rows:
+            return
+        frame = pd.DataFrame.from_records(rows, columns=[name for name, _ in TABLES[table]])
+        batch = pa.Table.from_pandas(frame, schema=self._schemas[table], preserve_index=False)
+        self._writer(table).write_table(batch)
+        self.counts[table] += len(rows)
+        rows.clear()
+
+    def close(self) -> None:
+        for table in TABLES:
+            self._flush(table)
+            # Tables without rows still get a file with the schema
+            self._writer(table).close()
+
+    def __enter__(self) -> "ColumnarExporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def open_exporter(output: str, format: str = "ndjson", batch_size: int = 1000):
+    """Return an NDJSONExporter or ColumnarExporter for the format.
+
+    Args:
+        output: NDJSON file path, or the directory for columnar formats
+        format: "ndjson", "parquet" or "arrow"
+        batch_size: Rows per columnar batch
+    """
+    if format == "ndjson":
+        return NDJSONExporter(output)
+    return ColumnarExporter(output, format, batch_size)
+
+def export_campaigns(
+    campaigns: Iterable[Dict],
+    output: str,
+    format: str = "ndjson",
+    batch_size: int = 1000
+) -> Dict[str, int]:
+    """Export campaigns, streaming them through the chosen exporter.
+
+    Returns:
+        Dict: Number of rows written per table
+    """
+    with open_exporter(output, format, batch_size) as exporter:
+        for campaign in campaigns:
+            exporter.write(campaign)
+    return exporter.counts
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point: export batch results or NDJSON campaigns."""
+    parser = argparse.ArgumentParser(
+        description="Export campaign plans as NDJSON or flattened Parquet/Arrow tables."
+    )
+    parser.add_argument("input", help="Batch results JSONL or NDJSON file of campaigns")
+    parser.add_argument("output", help="NDJSON file, or directory for Parquet/Arrow tables")
+    parser.add_argument("--format", choices=["ndjson", "parquet", "arrow"], default="parquet")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per columnar batch")
+    args = parser.parse_args(argv)
+
+    counts = export_campaigns(iter_campaigns(args.input), args.output, args.format, args.batch_size)
+    print(json.dumps(counts, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import json
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+Span = Tuple[int, int]
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+def _skip(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+def _object_spans(text: str, pos: int) -> Tuple[Dict[str, Span], int]:
+    """Map each key of the JSON object starting at pos to its value's span.
+
+    Values are skipped with the C decoder rather than kept, so memory stays
+    bounded by the largest single value.
+    """
+    spans = {}
+    pos = _skip(text, pos)
+    if text[pos] != "{":
+        raise ValueError(f"Expected a JSON object at offset {pos}")
+    pos = _skip(text, pos + 1)
+    if text[pos] == "}":
+        return spans, pos + 1
+    while True:
+        key_start = pos
+        _, pos = _decoder.raw_decode(text, pos)
+        # The text is decoded as latin-1 so offsets are byte offsets; decode
+        # the key again from its raw bytes, which may be UTF-8 or \u escapes.
+        key = json.loads(text[key_start:pos].encode("latin-1").decode("utf-8"))
+        pos = _skip(text, pos)
+        if text[pos] != ":":
+            raise ValueError(f"Expected ':' at offset {pos}")
+        start = _skip(text, pos + 1)
+        _, end = _decoder.raw_decode(text, start)
+        spans[key] = (start, end)
+        pos = _skip(text, end)
+        if text[pos] == "}":
+            return spans, pos + 1
+        if text[pos] != ",":
+            raise ValueError(f"Expected ',' or '}}' at offset {pos}")
+        pos = _skip(text, pos + 1)
+
+class _ProductIndex(Mapping):
+    """Read-only mapping of product name to product data, decoded on demand."""
+
+    def __init__(self, kb: "KnowledgeBase"):
+        self._kb = kb
+
+    def __getitem__(self, name: str) -> Dict:
+        return self._kb._product(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._kb._index()[1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._kb._index()[1]))
+
+    def __len__(self) -> int:
+        return len(self._kb._index()[1])
+
+class KnowledgeBase(Mapping):
+    """Lazily-loaded, hot-reloadable view of a product knowledge base file.
+
+    The file is scanned once to record the byte span of every top-level
+    value and every product; the spans are persisted in a ``.idx`` sidecar
+    so other processes skip the scan. Lookups such as
+    ``kb["products"][name]`` decode only the requested product from a
+    memory map of the file. When the file's mtime or size changes, the
+    index is rebuilt and cached products are dropped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        reload_interval: float = 1.0,
+        cache_size: int = 1024
+    ):
+        """Initialize the knowledge base; nothing is read until first use.
+
+        Args:
+            path: Path of the KB JSON file
+            reload_interval: Minimum seconds between checks for file changes
+            cache_size: Maximum number of decoded products kept in memory
+        """
+        self.path = str(path)
+        self.reload_interval = reload_interval
+        self.cache_size = cache_size
+        self.version = 0
+        self._lock = threading.RLock()
+        self._stat: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._file = None
+        self._map = None
+        self._top: Dict[str, Span] = {}
+        self._products: Dict[str, Span] = {}
+        self._cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._derived: Dict[Any, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            top, _ = self._index()
+            if key == "products" and key in top:
+                return _ProductIndex(self)
+            if key not in top:
+                raise KeyError(key)
+            return self._decode(("top", key), top[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index()[0]))
+
+    def __len__(self) -> int:
+        return len(self._index()[0])
+
+    def memoize(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """Return a value derived from the KB, recomputed after a reload.
+
+        Used for per-product structures such as compiled feature matchers.
+        """
+        self._index()
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = factory()
+            return self._derived[key]
+
+    def refresh(self) -> bool:
+        """Reload the index if the file changed.
+
+        Returns:
+            bool: Whether the knowledge base was reloaded
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            current = (stat.st_mtime_ns, stat.st_size)
+            self._checked_at = time.monotonic()
+            if current == self._stat:
+                return False
+            self._open(current)
+            return True
+
+    def _index(self) -> Tuple[Dict[str, Span], Dict[str, Span]]:
+        if self._stat is None or time.monotonic() - self._checked_at >= self.reload_interval:
+            self.refresh()
+        return self._top, self._products
+
+    def _product(self, name: str) -> Dict:
+        with self._lock:
+            _, products = self._index()
+            if name not in products:
+                raise KeyError(name)
+            return self._decode(("product", name), products[name])
+
+    def _decode(self, key: Any, span: Span) -> Any:
+        # Called with the lock held, so the span matches the mapped file
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        value = json.loads(self._map[span[0]:span[1]])
+        self._cache[key] = value
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return value
+
+    def _open(self, stat: Tuple[int, int]) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = open(self.path, "rb")
+        # mmap can't map empty files; fall back to the bytes themselves
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat[1] else b""
+        self._top, self._products = self._load_index(stat)
+        self._stat = stat
+        self._cache.clear()
+        self._derived.clear()
+        self.version += 1
+
+    def _load_index(self, stat: Tuple[int, int]) -> Tuple[Dict[str, Span], Dict[str, Span]]:
+        index_path = self.path + ".idx"
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if tuple(index["stat"]) == stat:
+                return (
+                    {k: tuple(v) for k, v in index["top"].items()},
+                    {k: tuple(v) for k, v in index["products"].items()}
+                )
+        except (OSError, ValueError, KeyError):
+            pass
+
+        # latin-1 maps bytes 1:1 to characters, so offsets are byte offsets
+        text = self._map[:].decode("latin-1")
+        top, _ = _object_spans(text, 0) if text.strip() else ({}, 0)
+        products = _object_spans(text, top["products"][0])[0] if "products" in top else {}
+        try:
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"stat": list(stat), "top": top, "products": products}, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass  # read-only location; keep the index in memory only
+        return top, products
+
+_stores_lock = threading.Lock()
+_stores: Dict[str, KnowledgeBase] = {}
+
+def get_knowledge_base(path: str) -> KnowledgeBase:
+    """Return the process-wide knowledge base for a file, shared by all agents."""
+    key = str(Path(path).resolve())
+    with _stores_lock:
+        kb = _stores.get(key)
+        if kb is None:
+            kb = KnowledgeBase(
+                key,
+                reload_interval=float(os.getenv("KB_RELOAD_INTERVAL", "1.0")),
+                cache_size=int(os.getenv("KB_CACHE_SIZE", "1024"))
+            )
+            _stores[key] = kb
+        return kb
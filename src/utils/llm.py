@@ -1,39 +1,891 @@
+import asyncio
+import json
 import os
-from typing import Dict, Optional
+import random
+import socket
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
-from openai import OpenAI
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI
 
-def get_llm_response(
+from src.utils.cache import ResponseCache, get_response_cache
+from src.utils.deadline import DeadlineExceeded
+from src.utils.metrics import MetricsLogger, percentile, register_gauges
+from src.utils.profiling import llm_wait
+from src.utils.ratelimit import Slot, get_rate_limiter, reset_rate_limiter
+from src.utils.stream import extract_json
+from src.utils.tokens import estimate_tokens
+
+@dataclass(frozen=True)
+class LLMSettings:
+    """LLM configuration, read once from the environment."""
+    model: str
+    temperature: float
+    max_tokens: int
+    timeout: float
+    connect_timeout: float
+    max_retries: int
+    backoff_base: float
+    backoff_max: float
+    max_connections: int
+    cache_nondeterministic: bool
+    response_format: str
+
+    @classmethod
+    def from_env(cls) -> "LLMSettings":
+        """Build settings from environment variables."""
+        return cls(
+            model=os.getenv("LLM_MODEL", "gpt-4"),
+            temperature=float(os.getenv("TEMPERATURE", "0.7")),
+            max_tokens=int(os.getenv("MAX_TOKENS", "2000")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "20")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "64")),
+            cache_nondeterministic=os.getenv("LLM_CACHE_NONDETERMINISTIC", "true").lower() == "true",
+            response_format=os.getenv("LLM_RESPONSE_FORMAT", "").lower()
+        )
+
+class HedgePolicy:
+    """Decides when a slow LLM call gets a duplicate (hedge) request.
+
+    A call is hedged once it has run longer than the configured
+    percentile of recent call latencies. Every call earns budget credits
+    and every hedge spends one, so at most about a budget fraction of
+    calls are hedged, in bursts of at most max_burst.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.5,
+        max_burst: float = 5.0,
+        max_workers: int = 64
+    ):
+        """Initialize the policy.
+
+        Args:
+            percentile: Latency percentile (0-100) after which a call is hedged
+            budget: Maximum fraction of calls that get a hedge
+            window: Number of recent call latencies the percentile is taken over
+            min_samples: Latencies needed before any call is hedged
+            min_delay: Lower bound on the hedge delay in seconds
+            max_burst: Maximum hedges that can be sent back to back
+            max_workers: Threads running racing requests
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_burst = max_burst
+        self.latencies: "deque[float]" = deque(maxlen=window)
+        self.counts = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._credits = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.05")),
+            window=int(os.getenv("LLM_HEDGE_WINDOW", "200")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5")),
+            max_workers=int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+        )
+
+    def delay(self) -> Optional[float]:
+        """Register a call and return how long to wait before hedging it.
+
+        Returns:
+            float: Seconds, or None while there are too few latencies to learn from
+        """
+        with self._lock:
+            self.counts["calls"] += 1
+            self._credits = min(self.max_burst, self._credits + self.budget)
+            if len(self.latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, percentile(self.latencies, self.percentile))
+
+    def try_hedge(self) -> bool:
+        """Spend a budget credit on a hedge; False if the budget is used up."""
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            self.counts["hedged"] += 1
+            return True
+
+    def observe(self, seconds: float, hedge_won: bool = False) -> None:
+        """Record the latency a caller saw for a completed call."""
+        with self._lock:
+            self.latencies.append(seconds)
+            self.counts["hedge_wins"] += int(hedge_won)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            delay = percentile(self.latencies, self.percentile) if self.latencies else 0.0
+            return {**self.counts, "delay_seconds": max(self.min_delay, delay)}
+
+_lock = threading.Lock()
+_settings: Optional[LLMSettings] = None
+_client: Optional[OpenAI] = None
+# httpx async connections are bound to the event loop that opened them, so
+# the shared async client is kept per loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_hedge_policy: Optional[HedgePolicy] = None
+_hedge_loaded = False
+
+def get_settings() -> LLMSettings:
+    """Return the process-wide LLM settings."""
+    global _settings
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                _settings = LLMSettings.from_env()
+    return _settings
+
+def _timeout(settings: LLMSettings) -> httpx.Timeout:
+    return httpx.Timeout(settings.timeout, connect=settings.connect_timeout)
+
+def _limits(settings: LLMSettings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_connections
+    )
+
+def get_client() -> OpenAI:
+    """Return the shared synchronous client backed by a pooled HTTP transport."""
+    global _client
+    if _client is None:
+        settings = get_settings()
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,  # retried with jittered backoff in get_llm_response
+                    http_client=httpx.Client(
+                        limits=_limits(settings),
+                        timeout=_timeout(settings)
+                    )
+                )
+    return _client
+
+def get_async_client() -> AsyncOpenAI:
+    """Return the shared async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        settings = get_settings()
+        client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=_limits(settings),
+                timeout=_timeout(settings)
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+def get_hedge_policy() -> Optional[HedgePolicy]:
+    """Return the process-wide hedging policy, or None unless LLM_HEDGE is on."""
+    global _hedge_policy, _hedge_loaded
+    if not _hedge_loaded:
+        with _lock:
+            if not _hedge_loaded:
+                if os.getenv("LLM_HEDGE", "false").lower() == "true":
+                    _hedge_policy = HedgePolicy.from_env()
+                _hedge_loaded = True
+    return _hedge_policy
+
+def _close_async_client(loop: asyncio.AbstractEventLoop, client: AsyncOpenAI) -> None:
+    """Close an async client on the event loop its connections belong to.
+
+    On a running loop the close is scheduled rather than awaited; the
+    pool of a client whose loop is already closed is left to the GC.
+    """
+    if loop.is_closed():
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), loop)
+    else:
+        loop.run_until_complete(client.close())
+
+def reset_clients() -> None:
+    """Close the shared clients and re-read settings on next use."""
+    global _settings, _client, _hedge_policy, _hedge_loaded
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _settings = None
+        for loop, client in list(_async_clients.items()):
+            _close_async_client(loop, client)
+        _async_clients.clear()
+        if _hedge_policy is not None:
+            _hedge_policy.executor.shutdown(wait=False)
+        _hedge_policy = None
+        _hedge_loaded = False
+    reset_rate_limiter()
+
+register_gauges("hedge", lambda: _hedge_policy.snapshot() if _hedge_policy is not None else {})
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether an API error is transient (connection, timeout, 429 or 5xx)."""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def _backoff_delay(error: Exception, attempt: int, settings: LLMSettings) -> float:
+    """Jittered exponential backoff, honoring Retry-After when the API sends it."""
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), settings.backoff_max)
+        except ValueError:
+            pass
+    ceiling = min(settings.backoff_max, settings.backoff_base * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+def _request_kwargs(
+    settings: LLMSettings,
     system_prompt: str,
     user_prompt: str,
-    mock: bool = False
+    max_tokens: Optional[int] = None,
+    json_schema: Optional[Dict] = None
 ) -> Dict:
+    kwargs = {
+        "model": settings.model,
+        "temperature": settings.temperature,
+        "max_tokens": max_tokens or settings.max_tokens,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+    # Constrain the output to JSON (or to the schema) on models that support it
+    if settings.response_format == "json_schema" and json_schema is not None:
+        kwargs["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": json_schema.get("title", "response"), "schema": json_schema}
+        }
+    elif settings.response_format in ("json_object", "json_schema"):
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+def _estimate_request_tokens(kwargs: Dict) -> int:
+    """Tokens a request may consume: its prompt plus the completion budget."""
+    prompt = "".join(message["content"] for message in kwargs["messages"])
+    return estimate_tokens(prompt, kwargs["model"]) + kwargs["max_tokens"]
+
+def _error_headers(error: Exception) -> Optional[Mapping]:
+    return error.response.headers if isinstance(error, APIStatusError) else None
+
+def _release_failed(slot: Slot, error: Exception, metrics: Optional[MetricsLogger]) -> None:
+    throttled = isinstance(error, APIStatusError) and error.status_code == 429
+    get_rate_limiter().release(slot, headers=_error_headers(error), throttled=throttled, failed=True)
+    if metrics is not None:
+        metrics.log_rate_limit(slot.waited, throttled)
+
+def _time_left(expires: Optional[float]) -> Optional[float]:
+    """Seconds until expires (a time.monotonic() value), or None for no limit.
+
+    Raises:
+        DeadlineExceeded: If expires has passed
+    """
+    if expires is None:
+        return None
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("LLM call ran out of time")
+    return left
+
+def _expired(expires: Optional[float]) -> bool:
+    return expires is not None and time.monotonic() >= expires
+
+def _create(
+    create: Callable,
+    kwargs: Dict,
+    settings: LLMSettings,
+    metrics: Optional[MetricsLogger],
+    priority: str,
+    expires: Optional[float] = None
+) -> Tuple[Any, Slot]:
+    """Send a request through the rate limiter, retrying transient errors.
+
+    With expires set, queueing, retries and the request itself all end by
+    then; a retry whose backoff would overrun it isn't attempted.
+
+    Returns:
+        Tuple: The raw API response (headers included) and the limiter slot
+        it holds; the caller releases the slot once the response is consumed
+
+    Raises:
+        DeadlineExceeded: If expires passes first
+    """
+    limiter = get_rate_limiter()
+    tokens = _estimate_request_tokens(kwargs)
+    for attempt in range(settings.max_retries + 1):
+        try:
+            slot = limiter.acquire(tokens, priority, timeout=_time_left(expires))
+        except TimeoutError as e:
+            raise DeadlineExceeded("No rate limit capacity before the deadline") from e
+        try:
+            left = _time_left(expires)
+            with llm_wait():
+                raw = create(**kwargs) if left is None else create(**kwargs, timeout=left)
+        except Exception as e:
+            _release_failed(slot, e, metrics)
+            if _expired(expires):
+                raise DeadlineExceeded("LLM call timed out at the deadline") from e
+            if attempt == settings.max_retries or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(e, attempt, settings)
+            if expires is not None and time.monotonic() + delay >= expires:
+                raise
+            time.sleep(delay)
+            continue
+        if metrics is not None:
+            metrics.log_rate_limit(slot.waited)
+        return raw, slot
+
+def _abort(response: httpx.Response) -> None:
+    """Wake a read blocked on a streamed response from another thread.
+
+    Closing the response alone doesn't interrupt a blocked read, so the
+    socket is shut down first.
+    """
+    network_stream = response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def _timed_chunks(stream: Iterator) -> Iterator:
+    """Iterate a response stream, counting the time blocked on reads as LLM wait."""
+    chunks = iter(stream)
+    while True:
+        with llm_wait():
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+async def _create_async(
+    create: Callable,
+    kwargs: Dict,
+    settings: LLMSettings,
+    metrics: Optional[MetricsLogger],
+    priority: str
+) -> Tuple[Any, Slot]:
+    """Async variant of _create."""
+    limiter = get_rate_limiter()
+    tokens = _estimate_request_tokens(kwargs)
+    for attempt in range(settings.max_retries + 1):
+        slot = await limiter.acquire_async(tokens, priority)
+        try:
+            raw = await create(**kwargs)
+        except Exception as e:
+            _release_failed(slot, e, metrics)
+            if attempt == settings.max_retries or not _is_retryable(e):
+                raise
+            await asyncio.sleep(_backoff_delay(e, attempt, settings))
+            continue
+        except BaseException:
+            # Cancelled mid-request; free the slot before propagating
+            get_rate_limiter().release(slot, failed=True)
+            raise
+        if metrics is not None:
+            metrics.log_rate_limit(slot.waited)
+        return raw, slot
+
+Completion = Tuple[str, Any, Optional[str]]
+
+def _completion(
+    client: OpenAI,
+    kwargs: Dict,
+    settings: LLMSettings,
+    metrics: Optional[MetricsLogger],
+    priority: str,
+    expires: Optional[float] = None
+) -> Completion:
+    """Make a plain (non-streamed) call; returns (content, usage, finish_reason)."""
+    raw, slot = _create(
+        client.chat.completions.with_raw_response.create, kwargs, settings, metrics, priority, expires
+    )
+    response = raw.parse()
+    get_rate_limiter().release(slot, _total_tokens(response.usage), raw.headers)
+    return response.choices[0].message.content, response.usage, response.choices[0].finish_reason
+
+class _HedgeAttempt:
+    """One of the racing requests of a hedged call."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.stream = None
+
+    def cancel(self) -> None:
+        """Abort the request; closing its stream stops generation server-side."""
+        self.cancelled.set()
+        stream = self.stream
+        if stream is not None:
+            try:
+                _abort(stream.response)
+                stream.close()
+            except Exception:
+                pass
+
+def _streamed_completion(
+    attempt: _HedgeAttempt,
+    client: OpenAI,
+    kwargs: Dict,
+    settings: LLMSettings,
+    metrics: Optional[MetricsLogger],
+    priority: str,
+    expires: Optional[float] = None
+) -> Optional[Completion]:
+    """Make a racing call, streamed so it can be cancelled mid-generation.
+
+    Returns:
+        Tuple: (content, usage, finish_reason), or None if it was cancelled
+    """
+    raw, slot = _create(
+        client.chat.completions.with_raw_response.create,
+        dict(kwargs, stream=True, stream_options={"include_usage": True}),
+        settings,
+        metrics,
+        priority,
+        expires
+    )
+    stream = attempt.stream = raw.parse()
+    parts: List[str] = []
+    usage = None
+    finish_reason = None
+    try:
+        if attempt.cancelled.is_set():
+            return None
+        for chunk in _timed_chunks(stream):
+            if attempt.cancelled.is_set():
+                return None
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices:
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                parts.append(chunk.choices[0].delta.content or "")
+    except Exception:
+        if attempt.cancelled.is_set():
+            return None
+        raise
+    finally:
+        stream.close()
+        # A cancelled request's usage never arrives; its estimate stays charged
+        get_rate_limiter().release(slot, _total_tokens(usage), raw.headers)
+    return "".join(parts), usage, finish_reason
+
+def _hedged_completion(
+    policy: HedgePolicy,
+    client: OpenAI,
+    kwargs: Dict,
+    settings: LLMSettings,
+    metrics: Optional[MetricsLogger],
+    priority: str,
+    expires: Optional[float] = None
+) -> Completion:
+    """Make a call, racing a hedge request against it if it runs slow.
+
+    The first valid response (complete JSON) wins and the other request
+    is cancelled. A failed or invalid response only decides the call if
+    its rival does no better; an invalid response is preferred over an
+    error. Both are cancelled if expires passes first.
+    """
+    start = time.perf_counter()
+    delay = policy.delay()
+    if delay is None:
+        result = _completion(client, kwargs, settings, metrics, priority, expires)
+        policy.observe(time.perf_counter() - start)
+        return result
+
+    attempts: List[_HedgeAttempt] = []
+    futures = {}
+
+    def launch() -> None:
+        attempt = _HedgeAttempt()
+        attempts.append(attempt)
+        future = policy.executor.submit(
+            _streamed_completion, attempt, client, kwargs, settings, metrics, priority, expires
+        )
+        futures[future] = len(attempts) - 1
+
+    left = _time_left(expires)
+    launch()
+    hedged = False
+    if left is not None and left <= delay:
+        delay = None  # no time for a hedge to help
+    if delay is not None:
+        with llm_wait():
+            first_done = wait(futures, timeout=delay).done
+        if not first_done and policy.try_hedge():
+            hedged = True
+            launch()
+
+    error: Optional[Exception] = None
+    invalid: Optional[Tuple[int, Completion]] = None
+    while futures:
+        left = None if expires is None else max(0.0, expires - time.monotonic())
+        with llm_wait():
+            done, _ = wait(futures, timeout=left, return_when=FIRST_COMPLETED)
+        if not done:
+            for attempt in attempts:
+                attempt.cancel()
+            raise DeadlineExceeded("LLM call ran out of time")
+        for future in done:
+            index = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if not _is_valid(result):
+                # Truncated or not JSON: only used if the rival does no better
+                invalid = invalid or (index, result)
+                continue
+            for attempt in attempts:
+                attempt.cancel()
+            policy.observe(time.perf_counter() - start, hedge_won=index == 1)
+            if hedged and metrics is not None:
+                metrics.log_hedge(won=index == 1)
+            return result
+    if hedged and metrics is not None:
+        metrics.log_hedge(won=False)
+    if invalid is not None:
+        policy.observe(time.perf_counter() - start)
+        return invalid[1]
+    if error is None:
+        # Every attempt either returns, fails or is invalid, so this can't happen
+        raise RuntimeError("Hedged LLM call ended without a response or an error")
+    raise error
+
+def _is_valid(result: Completion) -> bool:
+    """Whether a completion is complete and holds a JSON object."""
+    content, _, finish_reason = result
+    if finish_reason != "stop" or not content:
+        return False
+    try:
+        json.loads(extract_json(content))
+    except ValueError:
+        return False
+    return True
+
+def _resolve_cache(settings: LLMSettings, use_cache: Optional[bool]) -> Optional[ResponseCache]:
+    """Pick the response cache for a call, honoring the opt-outs."""
+    if use_cache is False:
+        return None
+    if use_cache is None and settings.temperature > 0 and not settings.cache_nondeterministic:
+        return None
+    return get_response_cache()
+
+def _cache_key(kwargs: Dict) -> str:
+    # max_tokens is left out: the adaptive planner changes it from run to
+    # run, and only complete (not truncated) completions are cached anyway
+    system_message, user_message = kwargs["messages"]
+    params = {k: v for k, v in kwargs.items() if k not in ("model", "messages", "max_tokens")}
+    return ResponseCache.make_key(
+        system_message["content"], user_message["content"], kwargs["model"], params
+    )
+
+def _cache_get(cache: Optional[ResponseCache], key: str, metrics: Optional[MetricsLogger]) -> Optional[str]:
+    if cache is None:
+        return None
+    value, tier = cache.get(key)
+    if metrics is not None:
+        metrics.log_cache(tier)
+    return value
+
+def _cacheable(content: Optional[str], finish_reason: Optional[str]) -> bool:
+    """Whether a completion may be cached: complete, not cut off at max_tokens."""
+    return bool(content) and finish_reason == "stop"
+
+def cache_response(
+    system_prompt: str,
+    user_prompt: str,
+    content: str,
+    use_cache: Optional[bool] = None,
+    json_schema: Optional[Dict] = None
+) -> None:
+    """Cache a completion the caller has parsed and validated.
+
+    For calls made with defer_cache=True; the arguments must match the
+    call's. A completion that is already cached is left as it is.
+    """
+    settings = get_settings()
+    cache = _resolve_cache(settings, use_cache)
+    if cache is None or not content:
+        return
+    key = _cache_key(_request_kwargs(settings, system_prompt, user_prompt, json_schema=json_schema))
+    if not cache.contains(key):
+        cache.set(key, content)
+
+def _total_tokens(usage) -> Optional[int]:
+    return usage.total_tokens if usage is not None else None
+
+def _record_usage(metrics: Optional[MetricsLogger], usage, finish_reason: Optional[str]) -> None:
+    if metrics is not None and usage is not None:
+        metrics.log_usage(usage.prompt_tokens, usage.completion_tokens, finish_reason)
+
+def get_llm_response(
+    system_prompt: str,
+    user_prompt: str,
+    mock: bool = False,
+    metrics: Optional[MetricsLogger] = None,
+    use_cache: Optional[bool] = None,
+    max_tokens: Optional[int] = None,
+    mock_kind: str = "campaign",
+    priority: str = "interactive",
+    json_schema: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    defer_cache: bool = False
+) -> Union[str, Dict]:
     """Get response from the LLM.
-    
+
+    With LLM_HEDGE enabled, a call still running after the learned
+    latency percentile is raced against a duplicate request.
+
     Args:
         system_prompt (str): The system prompt
         user_prompt (str): The user prompt
         mock (bool): Whether to return mock responses
-        
+        metrics (MetricsLogger, optional): Logger receiving cache hits/misses
+        use_cache (bool, optional): Force the response cache on or off;
+            by default it is used unless disabled for temperature > 0
+        max_tokens (int, optional): Completion size limit for this request,
+            instead of MAX_TOKENS
+        mock_kind (str): Mock response to return: "campaign", "skeleton",
+            "creatives", "ad_group" or "patch"
+        priority (str): Rate limiter lane, "interactive" or "batch"
+        json_schema (Dict, optional): JSON schema of the expected response,
+            sent when LLM_RESPONSE_FORMAT is "json_schema"
+        timeout (float, optional): Seconds the call may take in total,
+            rate limiter queueing and retries included
+        defer_cache (bool): Don't cache the completion; the caller caches it
+            with cache_response once it has validated it
+
     Returns:
-        Dict: The LLM response parsed as JSON
+        str: The completion text (JSON); mock responses are returned as dicts
+
+    Raises:
+        DeadlineExceeded: If the call isn't done within timeout
     """
     if mock:
-        return _get_mock_response()
-    
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
-    response = client.chat.completions.create(
-        model=os.getenv("LLM_MODEL", "gpt-4"),
-        temperature=float(os.getenv("TEMPERATURE", "0.7")),
-        max_tokens=int(os.getenv("MAX_TOKENS", "2000")),
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        return _MOCK_RESPONSES[mock_kind]()
+
+    expires = time.monotonic() + timeout if timeout is not None else None
+    settings = get_settings()
+    kwargs = _request_kwargs(settings, system_prompt, user_prompt, max_tokens, json_schema)
+    cache = _resolve_cache(settings, use_cache)
+    key = _cache_key(kwargs) if cache is not None else None
+    cached = _cache_get(cache, key, metrics)
+    if cached is not None:
+        return cached
+
+    client = get_client()
+    policy = get_hedge_policy()
+    if policy is None:
+        content, usage, finish_reason = _completion(client, kwargs, settings, metrics, priority, expires)
+    else:
+        content, usage, finish_reason = _hedged_completion(
+            policy, client, kwargs, settings, metrics, priority, expires
+        )
+
+    _record_usage(metrics, usage, finish_reason)
+    if cache is not None and not defer_cache and _cacheable(content, finish_reason):
+        cache.set(key, content)
+    return content
+
+async def get_llm_response_async(
+    system_prompt: str,
+    user_prompt: str,
+    mock: bool = False,
+    metrics: Optional[MetricsLogger] = None,
+    use_cache: Optional[bool] = None,
+    max_tokens: Optional[int] = None,
+    mock_kind: str = "campaign",
+    priority: str = "interactive",
+    json_schema: Optional[Dict] = None
+) -> Union[str, Dict]:
+    """Async variant of get_llm_response built on the shared async client.
+
+    Args:
+        system_prompt (str): The system prompt
+        user_prompt (str): The user prompt
+        mock (bool): Whether to return mock responses
+        metrics (MetricsLogger, optional): Logger receiving cache hits/misses
+        use_cache (bool, optional): Force the response cache on or off
+        max_tokens (int, optional): Completion size limit for this request
+        mock_kind (str): Mock response to return, as in get_llm_response
+        priority (str): Rate limiter lane, "interactive" or "batch"
+        json_schema (Dict, optional): JSON schema of the expected response,
+            sent when LLM_RESPONSE_FORMAT is "json_schema"
+
+    Returns:
+        str: The completion text (JSON); mock responses are returned as dicts
+    """
+    if mock:
+        return _MOCK_RESPONSES[mock_kind]()
+
+    settings = get_settings()
+    kwargs = _request_kwargs(settings, system_prompt, user_prompt, max_tokens, json_schema)
+    cache = _resolve_cache(settings, use_cache)
+    key = _cache_key(kwargs) if cache is not None else None
+    cached = _cache_get(cache, key, metrics)
+    if cached is not None:
+        return cached
+
+    client = get_async_client()
+    raw, slot = await _create_async(
+        client.chat.completions.with_raw_response.create, kwargs, settings, metrics, priority
+    )
+    response = raw.parse()
+    get_rate_limiter().release(slot, _total_tokens(response.usage), raw.headers)
+
+    content = response.choices[0].message.content
+    finish_reason = response.choices[0].finish_reason
+    _record_usage(metrics, response.usage, finish_reason)
+    if cache is not None and _cacheable(content, finish_reason):
+        cache.set(key, content)
+    return content
+
+def stream_llm_response(
+    system_prompt: str,
+    user_prompt: str,
+    mock: bool = False,
+    metrics: Optional[MetricsLogger] = None,
+    use_cache: Optional[bool] = None,
+    max_tokens: Optional[int] = None,
+    priority: str = "interactive",
+    json_schema: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+    defer_cache: bool = False
+) -> Iterator[str]:
+    """Stream the LLM response as text chunks.
+
+    Closing the generator early (e.g. after a fatal validation failure)
+    closes the underlying HTTP stream, so no further tokens are generated.
+
+    Args:
+        system_prompt (str): The system prompt
+        user_prompt (str): The user prompt
+        mock (bool): Whether to stream the mock response
+        metrics (MetricsLogger, optional): Logger receiving cache hits/misses
+        use_cache (bool, optional): Force the response cache on or off
+        max_tokens (int, optional): Completion size limit for this request
+        priority (str): Rate limiter lane, "interactive" or "batch"
+        json_schema (Dict, optional): JSON schema of the expected response,
+            sent when LLM_RESPONSE_FORMAT is "json_schema"
+        timeout (float, optional): Seconds the whole stream may take
+        defer_cache (bool): Don't cache the completion, as in get_llm_response
+
+    Yields:
+        str: Successive pieces of the completion text
+
+    Raises:
+        DeadlineExceeded: If the stream isn't finished within timeout; the
+            request is cancelled
+    """
+    if mock:
+        text = json.dumps(_get_mock_response())
+        for i in range(0, len(text), 64):
+            yield text[i:i + 64]
+        return
+
+    expires = time.monotonic() + timeout if timeout is not None else None
+    settings = get_settings()
+    kwargs = _request_kwargs(settings, system_prompt, user_prompt, max_tokens, json_schema)
+    cache = _resolve_cache(settings, use_cache)
+    key = _cache_key(kwargs) if cache is not None else None
+    cached = _cache_get(cache, key, metrics)
+    if cached is not None:
+        yield cached
+        return
+
+    client = get_client()
+    # Only opening the stream is retried; a failure mid-stream is surfaced
+    # to the caller, which may already have acted on earlier chunks. The
+    # limiter slot is held until the stream is finished or closed.
+    raw, slot = _create(
+        client.chat.completions.with_raw_response.create,
+        dict(kwargs, stream=True, stream_options={"include_usage": True}),
+        settings,
+        metrics,
+        priority,
+        expires
     )
-    
-    return response.choices[0].message.content
+    stream = raw.parse()
+    # The request timeout bounds each read, not the whole stream, so a
+    # timer closes the stream at the deadline even while a read blocks
+    expired = threading.Event()
+    timer = None
+    if expires is not None:
+        def expire() -> None:
+            expired.set()
+            _abort(raw.http_response)
+            stream.close()
+
+        timer = threading.Timer(max(0.0, expires - time.monotonic()), expire)
+        timer.daemon = True
+        timer.start()
+
+    parts = []
+    usage = None
+    finish_reason = None
+    try:
+        for chunk in _timed_chunks(stream):
+            _time_left(expires)
+            # With include_usage, the final chunk has usage and no choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        if expired.is_set():
+            raise DeadlineExceeded("LLM stream ran out of time")
+    except Exception as e:
+        if isinstance(e, DeadlineExceeded) or not (expired.is_set() or _expired(expires)):
+            raise
+        raise DeadlineExceeded("LLM stream ran out of time") from e
+    finally:
+        if timer is not None:
+            timer.cancel()
+        stream.close()
+        get_rate_limiter().release(slot, _total_tokens(usage), raw.headers)
+
+    _record_usage(metrics, usage, finish_reason)
+
+    if cache is not None and not defer_cache and _cacheable("".join(parts), finish_reason):
+        cache.set(key, "".join(parts))
 
 def _get_mock_response() -> Dict:
     """Return a mock campaign response for testing."""
@@ -69,3 +921,31 @@ def _get_mock_response() -> Dict:
             "required_fields_present": True
         }
     }
+
+def _get_mock_skeleton() -> Dict:
+    """Return the mock campaign's skeleton, as planned by a fan-out first call."""
+    skeleton = _get_mock_response()
+    for ad_group, channel in zip(skeleton["ad_groups"], skeleton["budget_breakdown"]):
+        ad_group["channel"] = channel
+        ad_group["creatives"] = []
+    return skeleton
+
+def _get_mock_creatives() -> Dict:
+    """Return the mock creatives of one ad group."""
+    return {"creatives": _get_mock_response()["ad_groups"][0]["creatives"]}
+
+def _get_mock_ad_group() -> Dict:
+    """Return one mock ad group with its target and creatives."""
+    return _get_mock_response()["ad_groups"][0]
+
+def _get_mock_patch() -> Dict:
+    """Return an empty patch; the mock campaign never needs repairing."""
+    return {}
+
+_MOCK_RESPONSES = {
+    "campaign": _get_mock_response,
+    "skeleton": _get_mock_skeleton,
+    "creatives": _get_mock_creatives,
+    "ad_group": _get_mock_ad_group,
+    "patch": _get_mock_patch
+}
@@ -0,0 +1,63 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+class PhraseMatcher:
+    """Case-insensitive multi-phrase matcher (Aho-Corasick).
+
+    All phrases are compiled into one automaton up front, so finding every
+    phrase that occurs in a text takes a single pass over the text no
+    matter how many phrases there are. Overlapping phrases are all found.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        """Compile the phrases.
+
+        Args:
+            phrases: Phrases to look for; matching ignores case
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for phrase in phrases:
+            if not phrase:
+                continue
+            state = 0
+            for char in phrase.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(phrase)
+
+        # Breadth-first pass to compute failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find(self, *texts: str) -> Set[str]:
+        """Return the phrases occurring in any of the given texts."""
+        found: Set[str] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        for text in texts:
+            state = 0
+            for char in text.lower():
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if out[state]:
+                    found.update(out[state])
+        return found
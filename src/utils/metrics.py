@@ -1,21 +1,315 @@
+import atexit
+import json
 import logging
-from typing import Dict, Optional
+import math
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import QueueHandler
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
 import time
 
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values using nearest-rank.
+
+    Args:
+        values: Sample values, in any order
+        q: Percentile to compute, between 0 and 100
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty sample
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize_latencies(latencies: List[float], elapsed: float) -> Dict:
+    """Build a throughput/latency summary for a batch of briefs.
+
+    Args:
+        latencies: Per-brief processing times in seconds
+        elapsed: Wall-clock duration of the whole batch in seconds
+
+    Returns:
+        Dict: Throughput in briefs/s and p50/p95 latency in seconds
+    """
+    return {
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+    }
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a call from per-1K-token prices in the environment."""
+    prompt_price = float(os.getenv("LLM_PRICE_PROMPT_PER_1K", "0.03"))
+    completion_price = float(os.getenv("LLM_PRICE_COMPLETION_PER_1K", "0.06"))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+class LatencyHistogram:
+    """Rolling window of latency samples with running totals."""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> Dict:
+        """Return count, sum and p50/p95/p99 over the rolling window."""
+        samples = list(self.samples)
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99)
+        }
+
+_histograms_lock = threading.Lock()
+_stage_histograms: Dict[str, LatencyHistogram] = {}
+
+def record_stage(stage: str, duration_ms: float) -> None:
+    """Add a stage duration to the process-wide histograms."""
+    with _histograms_lock:
+        histogram = _stage_histograms.get(stage)
+        if histogram is None:
+            histogram = _stage_histograms[stage] = LatencyHistogram()
+        histogram.observe(duration_ms)
+
+def metrics_snapshot() -> Dict:
+    """Return per-stage latency summaries (milliseconds) across all briefs."""
+    with _histograms_lock:
+        return {
+            stage: histogram.summary()
+            for stage, histogram in sorted(_stage_histograms.items())
+        }
+
+_gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+def register_gauges(name: str, collect: Callable[[], Dict[str, float]]) -> None:
+    """Register a callback reporting current values (e.g. queue depth) under name."""
+    _gauges[name] = collect
+
+def gauges_snapshot() -> Dict[str, Dict[str, float]]:
+    """Return the current values of all registered gauges."""
+    return {name: collect() for name, collect in sorted(_gauges.items())}
+
+def export_prometheus() -> str:
+    """Render the per-stage latency summaries and gauges in Prometheus text format."""
+    lines = [
+        "# HELP campaign_stage_latency_ms Per-stage brief processing latency in milliseconds.",
+        "# TYPE campaign_stage_latency_ms summary"
+    ]
+    for stage, summary in metrics_snapshot().items():
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+            lines.append(
+                f'campaign_stage_latency_ms{{stage="{stage}",quantile="{quantile}"}} {summary[key]}'
+            )
+        lines.append(f'campaign_stage_latency_ms_sum{{stage="{stage}"}} {summary["sum"]}')
+        lines.append(f'campaign_stage_latency_ms_count{{stage="{stage}"}} {summary["count"]}')
+    for name, values in gauges_snapshot().items():
+        for key, value in values.items():
+            lines.append(f"# TYPE campaign_{name}_{key} gauge")
+            lines.append(f"campaign_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = export_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps({**metrics_snapshot(), "gauges": gauges_snapshot()}).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of stderr
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread.
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        host: Interface to bind, local only by default
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one JSON object per line.
+
+    Structured values passed as ``extra={"fields": {...}}`` are merged into
+    the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str)
+
+class BatchingFileHandler(logging.FileHandler):
+    """File handler that buffers formatted records and writes them in batches.
+
+    The buffer is written when it reaches batch_size, when an ERROR (or
+    worse) record arrives, or when flush() is called by the log writer's
+    periodic timer.
+    """
+
+    def __init__(self, filename: str, batch_size: int = 100):
+        super().__init__(filename, delay=True)
+        self.batch_size = batch_size
+        self.buffer: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.buffer) >= self.batch_size or record.levelno >= logging.ERROR:
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write("\n".join(self.buffer) + "\n")
+                self.buffer = []
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+class _LogWriter:
+    """Background thread draining the metrics log queue into a handler."""
+
+    _STOP = object()
+
+    def __init__(self, handler: logging.Handler, flush_interval: float):
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.handler = handler
+        self.flush_interval = flush_interval
+        self.thread = threading.Thread(
+            target=self._run, name="metrics-log-writer", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self) -> None:
+        # Flush at least every flush_interval, even while records keep coming
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if isinstance(item, threading.Event):
+                self.handler.flush()
+                last_flush = time.monotonic()
+                item.set()
+                continue
+            if item is not None:
+                self.handler.handle(item)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.handler.flush()
+                last_flush = time.monotonic()
+        self.handler.close()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Block until everything queued so far has been written."""
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def stop(self) -> None:
+        self.queue.put(self._STOP)
+        self.thread.join(timeout=5.0)
+
+_logging_lock = threading.Lock()
+_log_writer: Optional[_LogWriter] = None
+
+def get_metrics_logger() -> logging.Logger:
+    """Return the "campaign_metrics" logger, configuring it once per process.
+
+    Records are put on an in-memory queue by the calling thread and written
+    by a single background thread, so logging never blocks on file I/O and
+    each line is written exactly once however many MetricsLoggers exist.
+    """
+    global _log_writer
+    logger = logging.getLogger("campaign_metrics")
+    if _log_writer is None:
+        with _logging_lock:
+            if _log_writer is None:
+                handler = BatchingFileHandler(
+                    os.getenv("METRICS_LOG_PATH", "campaign_metrics.log"),
+                    batch_size=int(os.getenv("METRICS_LOG_BATCH_SIZE", "100"))
+                )
+                if os.getenv("METRICS_LOG_FORMAT", "json").lower() == "json":
+                    handler.setFormatter(JsonLinesFormatter())
+                else:
+                    handler.setFormatter(
+                        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+                    )
+                writer = _LogWriter(
+                    handler,
+                    flush_interval=float(os.getenv("METRICS_LOG_FLUSH_INTERVAL", "1.0"))
+                )
+                logger.setLevel(logging.INFO)
+                logger.addHandler(QueueHandler(writer.queue))
+                atexit.register(writer.stop)
+                _log_writer = writer
+    return logger
+
+def flush_metrics_log(timeout: float = 5.0) -> None:
+    """Wait until all queued metrics log records have been written."""
+    if _log_writer is not None:
+        _log_writer.flush(timeout)
+
 class MetricsLogger:
     def __init__(self):
         """Initialize the metrics logger."""
-        self.logger = logging.getLogger("campaign_metrics")
-        self.logger.setLevel(logging.INFO)
-        
-        # Add file handler
-        handler = logging.FileHandler("campaign_metrics.log")
-        handler.setFormatter(
-            logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        )
-        self.logger.addHandler(handler)
+        # The underlying logger and its background writer are shared
+        # process-wide; creating more MetricsLoggers adds no handlers.
+        self.logger = get_metrics_logger()
         
         # Initialize metrics
+        self._spans = []
+        # Guards counters updated from fan-out worker threads
+        self._lock = threading.Lock()
         self.reset_metrics()
     
     def reset_metrics(self):
@@ -26,46 +320,288 @@ class MetricsLogger:
                 "user_prompt": 0,
                 "completion": 0
             },
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "llm_calls": 0,
+                "truncated": 0
+            },
+            "cost": 0.0,
             "processing_time": 0,
+            "stages": {},
             "hallucination_flags": [],
             "validation_errors": [],
+            "cache": {
+                "hits": 0,
+                "misses": 0
+            },
             "completion_successful": False
         }
     
     def log_token_count(self, prompt_type: str, count: int):
         """Log token count for different parts of the process."""
         self.metrics["token_counts"][prompt_type] = count
-        self.logger.info(f"Token count for {prompt_type}: {count}")
+        self.logger.info(
+            f"Token count for {prompt_type}: {count}",
+            extra={"fields": {"event": "token_count", "prompt_type": prompt_type, "count": count}}
+        )
+    
+    def log_max_tokens(self, max_tokens: int):
+        """Log the completion budget requested for the brief."""
+        self.metrics["max_tokens"] = max_tokens
+        self.logger.info(
+            f"Requesting max_tokens={max_tokens}",
+            extra={"fields": {"event": "max_tokens", "max_tokens": max_tokens}}
+        )
+    
+    def log_usage(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        finish_reason: Optional[str] = None
+    ):
+        """Log the token usage reported by the API for one LLM call."""
+        cost = estimate_cost(prompt_tokens, completion_tokens)
+        with self._lock:
+            usage = self.metrics["usage"]
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["llm_calls"] += 1
+            if finish_reason == "length":
+                usage["truncated"] += 1
+            self.metrics["token_counts"]["completion"] += completion_tokens
+            self.metrics["cost"] += cost
+        self.logger.info(
+            f"LLM usage: {prompt_tokens} prompt + {completion_tokens} completion tokens "
+            f"(${cost:.4f})",
+            extra={"fields": {
+                "event": "usage",
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "finish_reason": finish_reason,
+                "cost": cost
+            }}
+        )
     
-    def log_hallucination(self, message: str, confidence: float):
-        """Log potential hallucination with confidence score."""
+    def log_hallucination(
+        self,
+        message: str,
+        confidence: float,
+        creative_id: Optional[str] = None,
+        ad_group_id: Optional[str] = None
+    ):
+        """Log potential hallucination with confidence score.
+
+        Creative IDs are only unique within an ad group, so a flagged
+        creative is identified by both IDs.
+        """
         self.metrics["hallucination_flags"].append({
             "message": message,
-            "confidence": confidence
+            "confidence": confidence,
+            "ad_group_id": ad_group_id,
+            "creative_id": creative_id
         })
-        self.logger.warning(f"Potential hallucination: {message} (confidence: {confidence})")
+        self.logger.warning(
+            f"Potential hallucination: {message} (confidence: {confidence})",
+            extra={"fields": {"event": "hallucination", "confidence": confidence}}
+        )
+    
+    def log_claims(self, checked: int, unsupported: int):
+        """Log how many claims in a campaign's copy were checked against the KB."""
+        self.metrics["claims"] = {"checked": checked, "unsupported": unsupported}
+        self.logger.info(
+            f"Verified {checked} claims, {unsupported} unsupported",
+            extra={"fields": {"event": "claims", **self.metrics["claims"]}}
+        )
+    
+    def log_cache(self, tier: Optional[str]):
+        """Log a response cache lookup; tier is None on a miss."""
+        with self._lock:
+            cache = self.metrics["cache"]
+            if tier is None:
+                cache["misses"] += 1
+            else:
+                cache["hits"] += 1
+                cache[f"{tier}_hits"] = cache.get(f"{tier}_hits", 0) + 1
+        self.logger.info(
+            f"Response cache {'miss' if tier is None else tier + ' hit'}",
+            extra={"fields": {"event": "cache", "hit": tier is not None, "tier": tier}}
+        )
+    
+    def log_stream(self, aborted: bool, chars_received: int):
+        """Log the outcome of a streamed generation."""
+        self.metrics["streaming"] = {
+            "aborted_early": aborted,
+            "chars_received": chars_received
+        }
+        self.logger.info(
+            f"Streamed {chars_received} chars{' (aborted early)' if aborted else ''}",
+            extra={"fields": {"event": "stream", **self.metrics["streaming"]}}
+        )
+    
+    def log_fanout(self, call_times: List[float]):
+        """Log the per-ad-group call latencies (seconds) of a fan-out generation."""
+        self.metrics["fanout"] = {
+            "ad_groups": len(call_times),
+            "slowest_call": max(call_times, default=0.0),
+            "total_call_time": sum(call_times)
+        }
+        self.logger.info(
+            f"Generated {len(call_times)} ad groups in parallel "
+            f"(slowest call {self.metrics['fanout']['slowest_call']:.2f}s)",
+            extra={"fields": {"event": "fanout", **self.metrics["fanout"]}}
+        )
+    
+    def log_derived(self, source_campaign_id: Optional[str]):
+        """Log that a campaign was derived from an equivalent brief's campaign."""
+        self.metrics["derived_from"] = source_campaign_id
+        self.logger.info(
+            f"Campaign derived from {source_campaign_id} without an LLM call",
+            extra={"fields": {"event": "derived", "source_campaign_id": source_campaign_id}}
+        )
+    
+    def log_incremental(
+        self,
+        changed: List[str],
+        regenerated: Optional[List[str]],
+        reused: int
+    ):
+        """Log how a campaign was updated for an edited brief.
+
+        regenerated lists the ad groups generated again, or is None if the
+        whole campaign was; reused counts the ad groups kept as they were.
+        """
+        self.metrics["incremental"] = {
+            "changed": list(changed),
+            "full": regenerated is None,
+            "regenerated": list(regenerated or []),
+            "reused": reused
+        }
+        self.logger.info(
+            f"Brief changed in {', '.join(changed) or 'nothing'}: "
+            + ("regenerated the campaign" if regenerated is None else
+               f"regenerated {len(regenerated)} ad groups, reused {reused}"),
+            extra={"fields": {"event": "incremental", **self.metrics["incremental"]}}
+        )
+    
+    def log_repair(self, path: str, fixes: List[str]):
+        """Log how an invalid campaign was handled.
+
+        path is "local" (fixed without an LLM call), "llm_patch" (failing
+        fragments regenerated) or "failed".
+        """
+        self.metrics["repair"] = {"path": path, "fixes": list(fixes)}
+        self.logger.info(
+            f"Campaign repair {path}: {'; '.join(fixes) or 'no fixes applied'}",
+            extra={"fields": {"event": "repair", "path": path, "fixes": list(fixes)}}
+        )
+    
+    def log_degraded(self, reason: str, source: str, **details):
+        """Log that a partial or fallback plan was returned to meet a deadline.
+
+        source is "partial" (what was generated before the deadline) or
+        "recent_plan" (derived from a recent similar brief's plan).
+        """
+        self.metrics["degraded"] = {"reason": reason, "source": source, **details}
+        self.logger.warning(
+            f"Returning a degraded plan ({source}): {reason}",
+            extra={"fields": {"event": "degraded", **self.metrics["degraded"]}}
+        )
+    
+    def log_rate_limit(self, waited: float, throttled: bool = False):
+        """Log time (seconds) an LLM call queued in the rate limiter, or a 429."""
+        with self._lock:
+            rate_limit = self.metrics.setdefault("rate_limit", {"wait": 0.0, "throttled": 0})
+            rate_limit["wait"] += waited
+            rate_limit["throttled"] += int(throttled)
+        if throttled:
+            self.logger.warning(
+                "LLM request rate limited (429)",
+                extra={"fields": {"event": "rate_limit", "throttled": True}}
+            )
+    
+    def log_hedge(self, won: bool):
+        """Log that a slow LLM call was hedged and whether the hedge won."""
+        with self._lock:
+            hedging = self.metrics.setdefault("hedging", {"hedged": 0, "wins": 0})
+            hedging["hedged"] += 1
+            hedging["wins"] += int(won)
+        self.logger.info(
+            f"Hedged a slow LLM call ({'hedge' if won else 'original'} won)",
+            extra={"fields": {"event": "hedge", "won": won}}
+        )
+    
+    def log_profile(self, report: Dict):
+        """Log where a brief's CPU/allocation profile was written.
+
+        Keeps the profile paths and the wall, CPU and LLM wait times
+        (seconds) under metrics["profile"].
+        """
+        self.metrics["profile"] = {
+            key: report[key]
+            for key in ("profile", "report", "wall_time", "cpu_time", "llm_wait")
+        }
+        self.logger.info(
+            f"Profile written to {report['profile']} (cpu {report['cpu_time']:.3f}s, "
+            f"llm wait {report['llm_wait']:.3f}s)",
+            extra={"fields": {"event": "profile", **self.metrics["profile"]}}
+        )
     
     def log_validation_error(self, error: str):
         """Log validation errors."""
         self.metrics["validation_errors"].append(error)
-        self.logger.error(f"Validation error: {error}")
+        self.logger.error(
+            f"Validation error: {error}",
+            extra={"fields": {"event": "validation_error"}}
+        )
+    
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time a processing stage.
+
+        Spans nest: a span opened inside "score" is recorded as
+        "score.<stage>". Durations (ms) are stored per brief under
+        metrics["stages"] and added to the process-wide histograms.
+        """
+        self._spans.append(stage)
+        name = ".".join(self._spans)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter_ns() - start) / 1e6
+            self._spans.pop()
+            stages = self.metrics["stages"]
+            stages[name] = stages.get(name, 0.0) + duration_ms
+            record_stage(name, duration_ms)
     
     def start_processing(self):
         """Start timing the processing."""
-        self.start_time = time.time()
+        self._spans = []
+        self.start_time = time.perf_counter_ns()
     
     def end_processing(self, success: bool = True):
         """End timing and log success status."""
-        self.metrics["processing_time"] = time.time() - self.start_time
+        duration_ns = time.perf_counter_ns() - self.start_time
+        self.metrics["processing_time"] = duration_ns / 1e9
+        record_stage("total", duration_ns / 1e6)
         self.metrics["completion_successful"] = success
         self.logger.info(
             f"Processing completed in {self.metrics['processing_time']:.2f}s "
-            f"(success: {success})"
+            f"(success: {success})",
+            extra={"fields": {
+                "event": "processing_completed",
+                "processing_time": self.metrics["processing_time"],
+                "success": success,
+                "stages": dict(self.metrics["stages"])
+            }}
         )
     
     def get_metrics(self) -> Dict:
         """Get the current metrics."""
-        return self.metrics.copy()
+        metrics = self.metrics.copy()
+        metrics["stages"] = dict(metrics["stages"])
+        return metrics
     
     def log_summary(self):
         """Log a summary of all metrics."""
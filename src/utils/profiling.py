@@ -0,0 +1,242 @@
+import argparse
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# cProfile can't run two profilers at once (on Python 3.12+ it profiles
+# every thread), so at most one brief is profiled at a time.
+_active = threading.Lock()
+_sequence = itertools.count()
+_waits = threading.local()
+
+@contextmanager
+def llm_wait() -> Iterator[None]:
+    """Count the time the calling thread is blocked in the block as LLM wait.
+
+    Used around network calls only (requests, stream reads, waits on
+    calls made by other threads), so parsing and validation done while
+    streaming count as CPU time. CPU time spent inside the block (e.g.
+    decoding the response) isn't counted twice.
+    """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        blocked = (time.perf_counter() - wall) - (time.thread_time() - cpu)
+        _waits.seconds = thread_llm_wait() + max(0.0, blocked)
+
+def thread_llm_wait() -> float:
+    """Total seconds the calling thread has been blocked on the LLM API."""
+    return getattr(_waits, "seconds", 0.0)
+
+class BriefProfiler:
+    """CPU and allocation profile of one brief.
+
+    Captures cProfile stats and a tracemalloc snapshot of the top
+    allocation sites while the brief runs. finish() writes
+    <name>.prof (pstats) and <name>.json (timings and allocations) to
+    the profile directory, which keeps only the newest max_briefs.
+
+    tracemalloc traces the whole process, not the profiled thread: the
+    allocations and peak memory include those of any briefs processed
+    concurrently. Profile with a concurrency of 1 for per-brief numbers.
+    """
+
+    def __init__(self, directory: str, top: int = 25, max_briefs: int = 100):
+        """Start profiling the calling thread.
+
+        Args:
+            directory: Directory the profiles are written to
+            top: Number of allocation sites to keep
+            max_briefs: Profiles kept in the directory; older ones are deleted
+        """
+        self.directory = directory
+        self.top = top
+        self.max_briefs = max_briefs
+        self._finished = False
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._wait_start = thread_llm_wait()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    @classmethod
+    def start(cls, enabled: Optional[bool] = None) -> Optional["BriefProfiler"]:
+        """Start a profiler if this brief should be profiled.
+
+        Args:
+            enabled: Force profiling on or off; by default a PROFILE_SAMPLE_RATE
+                fraction of briefs is profiled
+
+        Returns:
+            BriefProfiler: The running profiler, or None if the brief isn't
+            sampled or another brief is being profiled
+        """
+        if enabled is None:
+            rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+            enabled = rate > 0 and random.random() < rate
+        if not enabled or not _active.acquire(blocking=False):
+            return None
+        try:
+            return cls(
+                directory=os.getenv("PROFILE_DIR", "profiles"),
+                top=int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25")),
+                max_briefs=int(os.getenv("PROFILE_MAX_BRIEFS", "100"))
+            )
+        except BaseException:
+            _active.release()
+            raise
+
+    def finish(self, campaign_id: Optional[str], stages: Dict[str, float]) -> Dict:
+        """Stop profiling and write the profile files.
+
+        Must be called on the thread that started the profiler.
+
+        Args:
+            campaign_id: The brief's campaign ID, used in the file names
+            stages: The brief's stage timings in milliseconds
+
+        Returns:
+            Dict: Report with "wall_time", "cpu_time" and "llm_wait" (seconds),
+            "peak_memory" (bytes), "top_allocations" and the file paths
+        """
+        if self._finished:
+            return {}
+        self._finished = True
+        try:
+            self._profile.disable()
+            wall_time = time.perf_counter() - self._wall_start
+            cpu_time = time.thread_time() - self._cpu_start
+            waited = thread_llm_wait() - self._wait_start
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*")
+            ])
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            _active.release()
+
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(campaign_id or "brief"))
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}_{next(_sequence)}_{safe_id}"
+        base = os.path.join(self.directory, name)
+        self._profile.dump_stats(base + ".prof")
+
+        report = {
+            "campaign_id": campaign_id,
+            "wall_time": wall_time,
+            "cpu_time": cpu_time,
+            "llm_wait": waited,
+            # Time neither on this thread's CPU nor in LLM calls (GIL, I/O, ...)
+            "other_time": max(0.0, wall_time - cpu_time - waited),
+            "peak_memory": peak,
+            "stages": dict(stages),
+            "top_allocations": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size": stat.size,
+                    "count": stat.count
+                }
+                for stat in snapshot.statistics("lineno")[:self.top]
+            ],
+            "profile": base + ".prof"
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        self._rotate()
+        return {**report, "report": base + ".json"}
+
+    def _rotate(self) -> None:
+        reports = sorted(Path(self.directory).glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for report in reports[:max(0, len(reports) - self.max_briefs)]:
+            report.unlink(missing_ok=True)
+            report.with_suffix(".prof").unlink(missing_ok=True)
+
+def summarize(directory: str, top: int = 25, sort: str = "cumulative") -> str:
+    """Merge the profiles in a directory into one text report.
+
+    Args:
+        directory: Profile directory, e.g. of a batch run
+        top: Functions and allocation sites to list
+        sort: pstats sort key for the function table
+
+    Returns:
+        str: Timing totals, the merged cProfile table and the top
+        allocation sites summed across briefs
+    """
+    reports = []
+    prof_paths = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with open(path, "r") as f:
+            reports.append(json.load(f))
+        prof_paths.append(path.with_suffix(".prof"))
+    if not reports:
+        return f"No profiles in {directory}\n"
+
+    totals = {key: sum(r[key] for r in reports) for key in ("wall_time", "cpu_time", "llm_wait", "other_time")}
+    lines = [f"{len(reports)} profiled briefs"]
+    for key, total in totals.items():
+        lines.append(f"  {key:<10} total {total:9.3f}s  mean {total / len(reports):8.3f}s")
+    lines.append(f"  peak_memory max {max(r['peak_memory'] for r in reports) / 1e6:.1f}MB")
+
+    # Each .prof file sits next to its report; the path recorded in the
+    # report is relative to wherever the brief ran
+    out = io.StringIO()
+    profiles = [str(path) for path in prof_paths if path.exists()]
+    if profiles:
+        stats = pstats.Stats(*profiles, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+    else:
+        out.write(f"No .prof files next to the reports in {directory}\n")
+    lines.append(out.getvalue())
+
+    allocations: Dict[str, List[int]] = {}
+    for report in reports:
+        for stat in report["top_allocations"]:
+            size_count = allocations.setdefault(stat["location"], [0, 0])
+            size_count[0] += stat["size"]
+            size_count[1] += stat["count"]
+    lines.append("Top allocation sites (summed across briefs):")
+    ranked = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for location, (size, count) in ranked:
+        lines.append(f"  {size / 1024:10.1f} KiB  {count:8d} blocks  {location}")
+    return "\n".join(lines) + "\n"
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point: summarize a directory of brief profiles."""
+    parser = argparse.ArgumentParser(description="Merge per-brief profiles into one report.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summarize", help="Merge the profiles of a run")
+    summary.add_argument("directory", nargs="?", default=os.getenv("PROFILE_DIR", "profiles"))
+    summary.add_argument("--top", type=int, default=25, help="Functions and allocation sites to list")
+    summary.add_argument(
+        "--sort",
+        default="cumulative",
+        help="pstats sort key, e.g. cumulative, tottime or calls"
+    )
+    args = parser.parse_args(argv)
+
+    sys.stdout.write(summarize(args.directory, args.top, args.sort))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
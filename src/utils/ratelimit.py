@@ -0,0 +1,342 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from src.utils.metrics import record_stage, register_gauges
+
+# Lower rank goes first: interactive (UI) requests pre-empt queued batch work
+LANES = {"interactive": 0, "batch": 1}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset header such as "1s", "6m0s" or "20ms" into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+def _header_int(headers: Mapping, name: str) -> Optional[int]:
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    A rate of 0 means unlimited until the API reports its limits.
+    """
+
+    def __init__(self, per_minute: float = 0):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float) -> None:
+        if self.limited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (amounts above capacity wait for a full bucket)."""
+        if not self.limited:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.limited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        """Return over-estimated tokens (or charge more when amount is negative)."""
+        if self.limited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining: Optional[int], limit: Optional[int], now: float) -> None:
+        """Align with the provider's view from rate-limit headers."""
+        if limit and limit != self.capacity:
+            self._refill(now)
+            self.level = self.level if self.limited else float(limit)
+            self.capacity = float(limit)
+        if remaining is not None and self.limited:
+            self._refill(now)
+            self.level = min(self.level, float(remaining))
+
+class Slot:
+    """A granted request: its lane, estimated tokens and time spent queued."""
+
+    def __init__(self, lane: str, tokens: int, waited: float):
+        self.lane = lane
+        self.tokens = tokens
+        self.waited = waited
+
+class RateLimiter:
+    """Client-side scheduler for LLM requests.
+
+    Every request needs a concurrency slot, one unit from the
+    requests-per-minute bucket and its estimated tokens from the
+    tokens-per-minute bucket. The concurrency limit adapts with AIMD:
+    it grows by about one slot per limit's worth of successful requests
+    and halves on a 429 (at most once per cooldown). Buckets are
+    corrected from the provider's x-ratelimit-* headers, and Retry-After
+    pauses all requests. Waiters are served by lane, then arrival order;
+    batch requests also leave reserve slots free for interactive ones.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        interactive_reserve: int = 1,
+        cooldown: float = 2.0,
+        share: float = 1.0
+    ):
+        """Initialize the limiter.
+
+        Args:
+            requests_per_minute: Request budget (0 learns it from headers)
+            tokens_per_minute: Token budget (0 learns it from headers)
+            max_concurrency: Upper bound (and starting value) of the concurrency limit
+            min_concurrency: Lower bound of the concurrency limit
+            interactive_reserve: Slots batch requests leave for interactive ones
+            cooldown: Minimum seconds between two multiplicative decreases
+            share: Fraction of the request and token budgets (configured or
+                from headers) this process may use, e.g. 1/N for N processes
+        """
+        self.share = share
+        self.requests = TokenBucket(requests_per_minute * share)
+        self.tokens = TokenBucket(tokens_per_minute * share)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.interactive_reserve = interactive_reserve
+        self.cooldown = cooldown
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self.resume_at = 0.0
+        self._decreased_at = 0.0
+        self._waiting: List[Tuple[int, int]] = []
+        self._queued = {lane: 0 for lane in LANES}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "0")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "0")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            interactive_reserve=int(os.getenv("LLM_INTERACTIVE_RESERVE", "1")),
+            share=float(os.getenv("LLM_RATE_SHARE", "1"))
+        )
+
+    def _lane_limit(self, lane: str) -> int:
+        limit = max(1, math.floor(self.limit))
+        if lane == "interactive":
+            return limit
+        return max(1, limit - self.interactive_reserve)
+
+    def _try_acquire(self, ticket: Tuple[int, int], lane: str, tokens: int) -> Optional[float]:
+        """Take capacity for the ticket if it's its turn (lock held).
+
+        Returns:
+            0.0 when acquired, otherwise seconds to wait (None: until notified)
+        """
+        now = time.monotonic()
+        if self._waiting[0] != ticket:
+            return None
+        if now < self.resume_at:
+            return self.resume_at - now
+        if self.in_flight >= self._lane_limit(lane):
+            return None
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        self._queued[lane] -= 1
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.in_flight += 1
+        # The next waiter may be able to go too
+        self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self, lane: str) -> Tuple[int, int]:
+        if lane not in LANES:
+            raise ValueError(f"Unknown rate limit lane: {lane}")
+        ticket = (LANES[lane], next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        self._queued[lane] += 1
+        return ticket
+
+    def _granted(self, lane: str, tokens: int, start: float) -> Slot:
+        waited = time.monotonic() - start
+        record_stage(f"rate_limit_wait.{lane}", waited * 1000)
+        return Slot(lane, tokens, waited)
+
+    def _dequeue(self, ticket: Tuple[int, int], lane: str) -> None:
+        # A waiter that gave up; the next one may be able to go now
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._queued[lane] -= 1
+        self._cond.notify_all()
+
+    def acquire(self, tokens: int, lane: str = "batch", timeout: Optional[float] = None) -> Slot:
+        """Block until a request with the estimated tokens may be sent.
+
+        Raises:
+            TimeoutError: If timeout seconds pass before the request may go
+        """
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(lane)
+            while True:
+                wait = self._try_acquire(ticket, lane, tokens)
+                if wait == 0.0:
+                    break
+                if timeout is not None:
+                    left = start + timeout - time.monotonic()
+                    if left <= 0:
+                        self._dequeue(ticket, lane)
+                        raise TimeoutError(f"No rate limit capacity within {timeout:.2f}s")
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+        return self._granted(lane, tokens, start)
+
+    async def acquire_async(self, tokens: int, lane: str = "batch") -> Slot:
+        """Like acquire, but waits without blocking the event loop."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(lane)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(ticket, lane, tokens)
+                if wait == 0.0:
+                    break
+                # Async waiters aren't notified, so poll
+                await asyncio.sleep(min(wait or 0.05, 0.05))
+        except BaseException:
+            # Cancelled (e.g. by asyncio.wait_for); don't block the queue
+            with self._cond:
+                self._dequeue(ticket, lane)
+            raise
+        return self._granted(lane, tokens, start)
+
+    def release(
+        self,
+        slot: Slot,
+        used_tokens: Optional[int] = None,
+        headers: Optional[Mapping] = None,
+        throttled: bool = False,
+        failed: bool = False
+    ) -> None:
+        """Finish a request and adapt the limits to its outcome.
+
+        Args:
+            slot: The slot returned by acquire
+            used_tokens: Actual total tokens, to correct the estimate
+            headers: Response headers carrying x-ratelimit-* and Retry-After
+            throttled: Whether the request got a 429
+            failed: Whether the request failed; only successes grow the limit
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.give_back(slot.tokens - used_tokens)
+            if headers is not None:
+                self._sync(headers, now)
+            if throttled:
+                self.throttled += 1
+                if now - self._decreased_at >= self.cooldown:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._decreased_at = now
+            elif not failed:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _shared(self, headers: Mapping, name: str) -> Optional[int]:
+        value = _header_int(headers, name)
+        return None if value is None else int(value * self.share)
+
+    def _sync(self, headers: Mapping, now: float) -> None:
+        self.requests.sync(
+            self._shared(headers, "x-ratelimit-remaining-requests"),
+            self._shared(headers, "x-ratelimit-limit-requests"),
+            now
+        )
+        self.tokens.sync(
+            self._shared(headers, "x-ratelimit-remaining-tokens"),
+            self._shared(headers, "x-ratelimit-limit-tokens"),
+            now
+        )
+        retry_after = parse_reset(headers.get("retry-after"))
+        if retry_after:
+            self.resume_at = max(self.resume_at, now + retry_after)
+
+    @contextmanager
+    def slot(self, tokens: int, lane: str = "batch") -> Iterator[Slot]:
+        """Hold a slot for the duration of a block."""
+        slot = self.acquire(tokens, lane)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def stats(self) -> Dict[str, float]:
+        """Current limit, in-flight requests, saturation and queue depth per lane."""
+        with self._cond:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self.in_flight,
+                "saturation": self.in_flight / max(1, math.floor(self.limit)),
+                "queued_interactive": self._queued["interactive"],
+                "queued_batch": self._queued["batch"],
+                "throttled_total": self.throttled
+            }
+
+_limiter_lock = threading.Lock()
+_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter shared by all LLM calls."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter.from_env()
+    return _limiter
+
+def reset_rate_limiter() -> None:
+    """Drop the shared limiter so the next call re-reads its settings."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+register_gauges("rate_limiter", lambda: get_rate_limiter().stats() if _limiter is not None else {})
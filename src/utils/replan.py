@@ -0,0 +1,118 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set
+
+from src.models.brief import CampaignBrief
+from src.utils.dedupe import normalize_brief
+
+# Brief fields a campaign can be updated for without any LLM call
+LOCAL_FIELDS = {"campaign_id", "budget", "channels"}
+# Fields that only change the ad copy; ad group targets stay valid
+CREATIVE_FIELDS = {"tone", "product.key_features"}
+AUDIENCE_FIELDS = {"audience_hints"}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"with", "that", "this", "your", "from", "more", "than", "into", "then", "over"}
+
+@dataclass
+class ReplanPlan:
+    """What to regenerate when a campaign is updated for an edited brief.
+
+    Attributes:
+        changed: Brief fields that changed, product fields as "product.<field>"
+        full: Whether the campaign must be generated from scratch
+        retarget: Ad groups (indices) to plan and write again, target included
+        rewrite: Ad groups (indices) that keep their target but get new creatives
+        new_ad_groups: Ad groups to add for audience hints nothing targets
+    """
+
+    changed: List[str]
+    full: bool = False
+    retarget: List[int] = field(default_factory=list)
+    rewrite: List[int] = field(default_factory=list)
+    new_ad_groups: int = 0
+
+def _stems(texts: Iterable[str]) -> Set[str]:
+    # Four-letter prefixes, so "workers" matches "remote work"
+    return {
+        word[:4]
+        for text in texts
+        for word in _WORD_PATTERN.findall(text.lower())
+        if len(word) >= 4 and word not in _STOPWORDS
+    }
+
+def _missing_from(values: List[str], others: List[str]) -> List[str]:
+    return [value for value in values if value not in others]
+
+def diff_briefs(old: CampaignBrief, new: CampaignBrief) -> List[str]:
+    """List the fields in which two briefs differ.
+
+    Text is compared as normalize_brief compares it (ignoring case,
+    whitespace and list order); product fields are reported as
+    "product.<field>".
+    """
+    before, after = normalize_brief(old), normalize_brief(new)
+    changed = [key for key in ("campaign_id", "budget") if getattr(old, key) != getattr(new, key)]
+    for key in sorted(set(before) | set(after)):
+        if key == "product":
+            product_before, product_after = before.get(key) or {}, after.get(key) or {}
+            changed += [
+                f"product.{name}"
+                for name in sorted(set(product_before) | set(product_after))
+                if product_before.get(name) != product_after.get(name)
+            ]
+        elif before.get(key) != after.get(key):
+            changed.append(key)
+    return changed
+
+def plan_replan(old: CampaignBrief, new: CampaignBrief, campaign: Dict) -> ReplanPlan:
+    """Decide which parts of a campaign an edited brief invalidates.
+
+    Budget, campaign ID and channel edits are handled locally. An edited
+    audience re-plans the ad groups whose target matched a removed hint
+    and adds one for each new hint no re-planned group can take. Edited
+    tone or added features rewrite every ad group's creatives; removed
+    features only those of ad groups whose creatives mention them. Any
+    other edit (goal, product name, ...) needs a full generation.
+
+    Args:
+        old (CampaignBrief): Brief the campaign was generated for
+        new (CampaignBrief): The edited brief
+        campaign (Dict): Campaign plan generated for old
+
+    Returns:
+        ReplanPlan: The changed fields and the ad groups to regenerate
+    """
+    changed = diff_briefs(old, new)
+    plan = ReplanPlan(changed=changed)
+    if set(changed) - LOCAL_FIELDS - CREATIVE_FIELDS - AUDIENCE_FIELDS:
+        plan.full = True
+        return plan
+
+    ad_groups = campaign.get("ad_groups") or []
+    before, after = normalize_brief(old), normalize_brief(new)
+    if "audience_hints" in changed:
+        removed = _stems(_missing_from(before["audience_hints"], after["audience_hints"]))
+        added = _missing_from(after["audience_hints"], before["audience_hints"])
+        for i, ad_group in enumerate(ad_groups):
+            target = ad_group.get("target") or {}
+            if removed & _stems([str(target.get("age", ""))] + list(target.get("behaviors") or [])):
+                plan.retarget.append(i)
+        plan.new_ad_groups = max(0, len(added) - len(plan.retarget))
+
+    features_before = before["product"]["key_features"]
+    features_after = after["product"]["key_features"]
+    if "tone" in changed or _missing_from(features_after, features_before):
+        plan.rewrite = list(range(len(ad_groups)))
+    elif "product.key_features" in changed:
+        removed = _stems(_missing_from(features_before, features_after))
+        for i, ad_group in enumerate(ad_groups):
+            ad_copy = [
+                creative.get(key, "")
+                for creative in ad_group.get("creatives") or []
+                for key in ("headline", "body")
+            ]
+            if removed & _stems(ad_copy):
+                plan.rewrite.append(i)
+    plan.rewrite = [i for i in plan.rewrite if i not in plan.retarget]
+    return plan
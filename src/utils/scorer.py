@@ -1,70 +1,113 @@
-from typing import Dict, List
-import json
-from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.kb import KnowledgeBase, get_knowledge_base
+from src.utils.matcher import PhraseMatcher
 
 class CreativeScorer:
     def __init__(self, kb_path: str = None):
         """Initialize the creative scorer with knowledge base data."""
         self.kb = self._load_kb(kb_path) if kb_path else {}
-        
-    def _load_kb(self, kb_path: str) -> Dict:
-        """Load the knowledge base data."""
-        with open(kb_path, 'r') as f:
-            return json.load(f)
-    
+
+    def _load_kb(self, kb_path: str) -> KnowledgeBase:
+        """Load the knowledge base data, shared with every other scorer."""
+        return get_knowledge_base(kb_path)
+
+    def _features(self, product_name: str) -> Optional[Tuple[Dict, PhraseMatcher]]:
+        """Return a product's features and their compiled matcher, if known.
+
+        Matchers are compiled once per KB load and shared across scorers.
+        """
+        if product_name not in self.kb.get("products", {}):
+            return None
+
+        def compile_features():
+            features = self.kb["products"][product_name]["features"]
+            return features, PhraseMatcher(features)
+
+        return self.kb.memoize(("features", product_name), compile_features)
+
     def score_creative(self, creative: Dict, product_name: str) -> float:
         """Score a creative based on various heuristics.
-        
+
         Args:
             creative: The creative to score
             product_name: Name of the product
-            
+
         Returns:
             float: Score between 0 and 1
         """
-        scores = []
-        
+        return self.score_creatives([creative], product_name)["score"][0]
+
+    def score_creatives(self, creatives: List[Dict], product_name: str) -> Dict[str, List]:
+        """Score a whole campaign's creatives in one pass.
+
+        Args:
+            creatives: The creatives to score
+            product_name: Name of the product
+
+        Returns:
+            Dict: Per-component score arrays ("feature", "headline_length",
+            "body_length", "cta", "justification") aligned with creatives,
+            plus the final scores under "score". A feature score is None
+            when a creative mentions no known feature.
+        """
         # 1. Feature effectiveness score
-        if product_name in self.kb.get("products", {}):
-            features = self.kb["products"][product_name]["features"]
-            mentioned_features = [
-                f for f in features
-                if f.lower() in creative["body"].lower() or f.lower() in creative["headline"].lower()
-            ]
-            if mentioned_features:
-                feature_scores = [features[f]["effectiveness"] for f in mentioned_features]
-                scores.append(sum(feature_scores) / len(feature_scores))
-        
+        feature_scores: List[Optional[float]] = [None] * len(creatives)
+        compiled = self._features(product_name)
+        if compiled is not None:
+            features, matcher = compiled
+            for i, creative in enumerate(creatives):
+                mentioned_features = matcher.find(creative["body"], creative["headline"])
+                if mentioned_features:
+                    feature_scores[i] = (
+                        sum(features[f]["effectiveness"] for f in mentioned_features)
+                        / len(mentioned_features)
+                    )
+
         # 2. Length appropriateness score
-        headline_length = len(creative["headline"])
-        body_length = len(creative["body"])
-        
         # Ideal lengths based on common platform limits
-        if 30 <= headline_length <= 65:  # Good headline length for most platforms
-            scores.append(1.0)
-        elif headline_length < 30:
-            scores.append(0.7)
-        else:
-            scores.append(0.5)
-            
-        if 60 <= body_length <= 180:  # Good body length for most platforms
-            scores.append(1.0)
-        elif body_length < 60:
-            scores.append(0.7)
-        else:
-            scores.append(0.5)
-        
+        headline_scores = [
+            _length_score(len(creative["headline"]), 30, 65)  # Good headline length for most platforms
+            for creative in creatives
+        ]
+        body_scores = [
+            _length_score(len(creative["body"]), 60, 180)  # Good body length for most platforms
+            for creative in creatives
+        ]
+
         # 3. CTA clarity score
-        cta_length = len(creative["cta"])
-        if 2 <= len(creative["cta"].split()) <= 4:  # Ideal CTA word count
-            scores.append(1.0)
-        else:
-            scores.append(0.6)
-        
+        cta_scores = [
+            1.0 if 2 <= len(creative["cta"].split()) <= 4 else 0.6  # Ideal CTA word count
+            for creative in creatives
+        ]
+
         # 4. Justification completeness
-        if len(creative["justification"].split()) >= 5:
-            scores.append(1.0)
-        else:
-            scores.append(0.7)
-        
-        return sum(scores) / len(scores) if scores else 0.5
+        justification_scores = [
+            1.0 if len(creative["justification"].split()) >= 5 else 0.7
+            for creative in creatives
+        ]
+
+        final_scores = []
+        for i in range(len(creatives)):
+            scores = [headline_scores[i], body_scores[i], cta_scores[i], justification_scores[i]]
+            if feature_scores[i] is not None:
+                scores.insert(0, feature_scores[i])
+            final_scores.append(sum(scores) / len(scores))
+
+        return {
+            "feature": feature_scores,
+            "headline_length": headline_scores,
+            "body_length": body_scores,
+            "cta": cta_scores,
+            "justification": justification_scores,
+            "score": final_scores
+        }
+
+def _length_score(length: int, low: int, high: int) -> float:
+    """Score a text length against an ideal [low, high] range."""
+    if low <= length <= high:
+        return 1.0
+    elif length < low:
+        return 0.7
+    else:
+        return 0.5
@@ -0,0 +1,176 @@
+import bisect
+import json
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_decoder = json.JSONDecoder()
+
+def extract_json(text: str) -> str:
+    """Return the JSON object in an LLM response.
+
+    Models sometimes wrap JSON in a ```json fence or add a sentence
+    before or after it. The first complete top-level object is returned;
+    bare JSON is returned as is, and text without an object is returned
+    unchanged for the JSON decoder to report.
+    """
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        return stripped
+    fence = _FENCE.search(text)
+    if fence is not None:
+        text = fence.group(1)
+    start = text.find("{")
+    if start < 0:
+        return text
+    try:
+        _, end = _decoder.raw_decode(text, start)
+    except ValueError:
+        return text[start:]
+    return text[start:end]
+
+class _Frame:
+    """An open JSON object or array on the parser stack."""
+    __slots__ = ("kind", "path", "expect_key", "key", "index", "value_start")
+
+    def __init__(self, kind: str, path: Path):
+        self.kind = kind
+        self.path = path
+        self.expect_key = kind == "{"
+        self.key = None
+        self.index = 0
+        self.value_start: Optional[int] = None
+
+    def child_path(self) -> Path:
+        return self.path + ((self.key,) if self.kind == "{" else (self.index,))
+
+class IncrementalJSONParser:
+    """Scan a JSON document chunk by chunk and report values as they close.
+
+    Every value is identified by its path from the root, e.g.
+    ("ad_groups", 0, "creatives", 1). Only values whose path is accepted by
+    ``wants`` are decoded, so scanning stays cheap for everything else.
+    Text before the opening brace (such as a markdown fence) and after the
+    closing brace is ignored.
+    """
+
+    def __init__(self, wants: Optional[Callable[[Path], bool]] = None):
+        """Initialize the parser.
+
+        Args:
+            wants: Predicate selecting the paths to decode; all paths by default
+        """
+        self.wants = wants or (lambda path: True)
+        # Chunks are kept as received, with their offsets: appending to
+        # one growing string would copy it on every chunk
+        self._chunks: List[str] = []
+        self._offsets: List[int] = []
+        self.done = False
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._key_start: Optional[int] = None
+        self._root_start = 0
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Consume a chunk of text and return the values completed by it.
+
+        Returns:
+            List: (path, value) pairs in completion order
+        """
+        events = []
+        base = self._pos
+        self._chunks.append(chunk)
+        self._offsets.append(base)
+        stack = self._stack
+
+        for k, c in enumerate(chunk):
+            if self.done:
+                break
+            i = base + k
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        stack[-1].key = json.loads(self._slice(self._key_start, i + 1))
+                        self._key_start = None
+                continue
+
+            if c in " \t\r\n":
+                continue
+            if not stack:
+                # Skip any prefix until the root object or array opens
+                if c in "{[":
+                    self._root_start = i
+                    stack.append(_Frame(c, ()))
+                continue
+
+            top = stack[-1]
+            if c == '"':
+                self._in_string = True
+                if top.kind == "{" and top.expect_key:
+                    self._key_start = i
+                elif top.value_start is None:
+                    top.value_start = i
+            elif c == ":":
+                top.expect_key = False
+            elif c in "{[":
+                top.value_start = i
+                stack.append(_Frame(c, top.child_path()))
+            elif c in "}]":
+                self._finish_scalar(top, i, events)
+                stack.pop()
+                if not stack:
+                    self.done = True
+                    if self.wants(()):
+                        events.append(((), json.loads(self._slice(self._root_start, i + 1))))
+                    continue
+                parent = stack[-1]
+                path = parent.child_path()
+                if self.wants(path):
+                    events.append((path, json.loads(self._slice(parent.value_start, i + 1))))
+                parent.value_start = None
+            elif c == ",":
+                self._finish_scalar(top, i, events)
+                if top.kind == "{":
+                    top.expect_key = True
+                    top.key = None
+                else:
+                    top.index += 1
+            elif top.value_start is None:
+                top.value_start = i
+
+        self._pos = base + len(chunk)
+        return events
+
+    @property
+    def text(self) -> str:
+        """All text fed so far."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+            self._offsets = [0]
+        return self._chunks[0] if self._chunks else ""
+
+    def _slice(self, start: int, end: int) -> str:
+        """Text between two offsets, joining only the chunks it spans."""
+        first = bisect.bisect_right(self._offsets, start) - 1
+        last = bisect.bisect_left(self._offsets, end)
+        joined = "".join(self._chunks[first:last])
+        offset = self._offsets[first]
+        return joined[start - offset:end - offset]
+
+    def _finish_scalar(self, frame: _Frame, end: int, events: List) -> None:
+        if frame.value_start is None:
+            return
+        path = frame.child_path()
+        if self.wants(path):
+            events.append((path, json.loads(self._slice(frame.value_start, end))))
+        frame.value_start = None
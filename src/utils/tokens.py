@@ -0,0 +1,114 @@
+import math
+import os
+import threading
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character heuristic
+    tiktoken = None
+
+from src.models.brief import CampaignBrief
+
+_encodings = {}
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """Estimate the number of tokens in text before sending it.
+
+    Uses tiktoken when it is installed, otherwise ~4 characters per token.
+    """
+    if tiktoken is not None:
+        model = model or os.getenv("LLM_MODEL", "gpt-4")
+        encoding = _encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            _encodings[model] = encoding
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+def brief_size(brief: CampaignBrief) -> int:
+    """Size of a brief in output units.
+
+    Ad groups scale with channels and audience hints, and every feature
+    adds copy to each of them.
+    """
+    return (
+        len(brief.channels) * max(1, len(brief.audience_hints))
+        + len(brief.product.key_features)
+    )
+
+class MaxTokensPlanner:
+    """Choose max_tokens per request from observed completion sizes.
+
+    Tracks an exponentially weighted average of completion tokens per
+    brief size unit. Until enough completions have been seen, the
+    configured ceiling is used. A truncated completion grows the estimate
+    so the next similar brief gets more room.
+    """
+
+    def __init__(
+        self,
+        ceiling: int,
+        floor: int = 256,
+        headroom: float = 1.3,
+        min_samples: int = 5,
+        smoothing: float = 0.2
+    ):
+        """Initialize the planner.
+
+        Args:
+            ceiling: Largest max_tokens ever requested (MAX_TOKENS)
+            floor: Smallest max_tokens ever requested
+            headroom: Multiplier applied on top of the expected size
+            min_samples: Completions to observe before adapting
+            smoothing: Weight of each new observation in the average
+        """
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.smoothing = smoothing
+        self.tokens_per_unit: Optional[float] = None
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def plan(self, units: int) -> int:
+        """Return max_tokens for a brief of the given size."""
+        with self._lock:
+            if self.tokens_per_unit is None or self.samples < self.min_samples:
+                return self.ceiling
+            expected = self.tokens_per_unit * max(1, units) * self.headroom
+        return max(self.floor, min(self.ceiling, math.ceil(expected)))
+
+    def observe(self, units: int, completion_tokens: int, truncated: bool = False) -> None:
+        """Record the size of a finished completion."""
+        ratio = completion_tokens / max(1, units)
+        if truncated:
+            # The true size is unknown, only that it didn't fit
+            ratio *= 1.5
+        with self._lock:
+            if self.tokens_per_unit is None:
+                self.tokens_per_unit = ratio
+            elif truncated:
+                self.tokens_per_unit = max(self.tokens_per_unit, ratio)
+            else:
+                self.tokens_per_unit += self.smoothing * (ratio - self.tokens_per_unit)
+            self.samples += 1
+
+_planner_lock = threading.Lock()
+_planner: Optional[MaxTokensPlanner] = None
+
+def get_max_tokens_planner() -> MaxTokensPlanner:
+    """Return the process-wide max_tokens planner."""
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                _planner = MaxTokensPlanner(
+                    ceiling=int(os.getenv("MAX_TOKENS", "2000")),
+                    floor=int(os.getenv("MIN_TOKENS", "256"))
+                )
+    return _planner
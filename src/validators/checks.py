@@ -1,45 +1,152 @@
+from typing import Any, Dict, List, Optional, Set
+
 from src.models.brief import CampaignBrief
 from src.models.campaign import Campaign
 
+def check_campaign_id(campaign_id: str, brief: CampaignBrief) -> None:
+    """Raise if the campaign ID doesn't match the brief."""
+    if campaign_id != brief.campaign_id:
+        raise ValueError("Campaign ID mismatch")
+
+def check_total_budget(total_budget: float, brief: CampaignBrief) -> None:
+    """Raise if the campaign total doesn't match the brief budget."""
+    if total_budget != brief.budget:
+        raise ValueError("Total budget mismatch")
+
+def check_budget_breakdown(
+    budget_breakdown: Dict[str, float],
+    total_budget: float,
+    brief: CampaignBrief
+) -> None:
+    """Raise if the breakdown doesn't sum to the total or misses a channel."""
+    budget_sum = sum(budget_breakdown.values())
+    if abs(budget_sum - total_budget) > 0.01:  # Allow for small float differences
+        raise ValueError("Budget breakdown sum doesn't match total budget")
+
+    for channel in brief.channels:
+        if channel not in budget_breakdown:
+            raise ValueError(f"Channel {channel} from brief missing in budget breakdown")
+
+def check_unique_ids(ids: List[str], message: str) -> None:
+    """Raise ValueError(message) if ids contains duplicates."""
+    if len(ids) != len(set(ids)):
+        raise ValueError(message)
+
 def validate_campaign(campaign: Campaign, brief: CampaignBrief) -> None:
     """Validate campaign output against the input brief.
-    
+
     Args:
         campaign (Campaign): The generated campaign
         brief (CampaignBrief): The input brief
-        
+
     Raises:
         ValueError: If validation fails
     """
     # Validate campaign ID matches
-    if campaign.campaign_id != brief.campaign_id:
-        raise ValueError("Campaign ID mismatch")
-    
+    check_campaign_id(campaign.campaign_id, brief)
+
     # Validate total budget matches
-    if campaign.total_budget != brief.budget:
-        raise ValueError("Total budget mismatch")
-    
-    # Validate budget breakdown sum
-    budget_sum = sum(campaign.budget_breakdown.values())
-    if abs(budget_sum - campaign.total_budget) > 0.01:  # Allow for small float differences
-        raise ValueError("Budget breakdown sum doesn't match total budget")
-    
-    # Validate all channels from brief are in budget breakdown
-    for channel in brief.channels:
-        if channel not in campaign.budget_breakdown:
-            raise ValueError(f"Channel {channel} from brief missing in budget breakdown")
-    
+    check_total_budget(campaign.total_budget, brief)
+
+    # Validate budget breakdown sum and channel coverage
+    check_budget_breakdown(campaign.budget_breakdown, campaign.total_budget, brief)
+
     # Validate ad groups have unique IDs
-    ad_group_ids = [ag.id for ag in campaign.ad_groups]
-    if len(ad_group_ids) != len(set(ad_group_ids)):
-        raise ValueError("Duplicate ad group IDs found")
-    
+    check_unique_ids([ag.id for ag in campaign.ad_groups], "Duplicate ad group IDs found")
+
     # Validate creatives have unique IDs within each ad group
     for ad_group in campaign.ad_groups:
-        creative_ids = [c.id for c in ad_group.creatives]
-        if len(creative_ids) != len(set(creative_ids)):
-            raise ValueError(f"Duplicate creative IDs found in ad group {ad_group.id}")
-    
+        check_unique_ids(
+            [c.id for c in ad_group.creatives],
+            f"Duplicate creative IDs found in ad group {ad_group.id}"
+        )
+
     # Update checks in campaign
     campaign.checks.budget_sum_ok = True
     campaign.checks.required_fields_present = True
+
+class IncrementalCampaignValidator:
+    """Apply validate_campaign's checks to fragments of a streamed campaign.
+
+    Each fragment is checked as soon as it is complete, so a fatal problem
+    (wrong campaign ID, budget mismatch, duplicate IDs) is detected while
+    the rest of the campaign is still being generated.
+
+    When the campaign will be repaired, these problems aren't fatal:
+    repair_campaign fixes every one of them once the stream ends. They are
+    then collected in problems instead of raised, and the stream goes on.
+    """
+
+    def __init__(self, brief: CampaignBrief, repairable: bool = False):
+        """Initialize the validator.
+
+        Args:
+            brief (CampaignBrief): The input brief
+            repairable (bool): Collect problems repair_campaign fixes instead of raising
+        """
+        self.brief = brief
+        self.repairable = repairable
+        self.problems: List[str] = []
+        self.total_budget = None
+        self.budget_breakdown = None
+        self.ad_group_ids: Set[str] = set()
+        self.creative_ids: Dict[int, Set[str]] = {}
+
+    def _fail(self, message: str) -> None:
+        if not self.repairable:
+            raise ValueError(message)
+        self.problems.append(message)
+
+    def check_field(self, name: str, value: Any) -> None:
+        """Check a top-level campaign field.
+
+        Raises:
+            ValueError: If the field contradicts the brief
+        """
+        try:
+            if name == "campaign_id":
+                check_campaign_id(value, self.brief)
+            elif name == "total_budget":
+                self.total_budget = value
+                check_total_budget(value, self.brief)
+            elif name == "budget_breakdown":
+                self.budget_breakdown = value
+            else:
+                return
+            if self.total_budget is not None and self.budget_breakdown is not None:
+                check_budget_breakdown(self.budget_breakdown, self.total_budget, self.brief)
+        except ValueError as e:
+            self._fail(str(e))
+
+    def check_ad_group_id(self, ad_group_id: str) -> None:
+        """Check that an ad group ID hasn't been used yet.
+
+        Raises:
+            ValueError: On a duplicate ad group ID
+        """
+        if ad_group_id in self.ad_group_ids:
+            self._fail("Duplicate ad group IDs found")
+        self.ad_group_ids.add(ad_group_id)
+
+    def check_creative(
+        self,
+        ad_group_index: int,
+        creative: Dict,
+        ad_group_id: Optional[str] = None
+    ) -> None:
+        """Check that a creative ID is unique within its ad group.
+
+        Args:
+            ad_group_index (int): Position of the ad group in the campaign
+            creative (Dict): The completed creative
+            ad_group_id (str, optional): ID of the ad group, if already known
+
+        Raises:
+            ValueError: On a duplicate creative ID
+        """
+        seen = self.creative_ids.setdefault(ad_group_index, set())
+        if creative.get("id") in seen:
+            self._fail(
+                f"Duplicate creative IDs found in ad group {ad_group_id or ad_group_index + 1}"
+            )
+        seen.add(creative.get("id"))
@@ -0,0 +1,204 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from src.models.brief import CampaignBrief
+
+# Numeric claims ad copy makes: prices, percentages, durations, multipliers,
+# user counts and other decimals (e.g. ratings). One pass per text.
+_CLAIM_PATTERN = re.compile(
+    r"""
+    # Every claim starts with a digit or "$"; fail fast everywhere else
+    (?=[\d$])
+    (?:
+      \$\s?(?P<money>\d[\d,]*(?:\.\d+)?)
+    | (?P<percent>\d+(?:\.\d+)?)\s?%
+    | (?P<duration>\d+)[\s-]?(?P<unit>days?|d|weeks?|wks?|months?|mos?|hours?|hrs?|h)\b
+    | (?P<multiplier>\d+(?:\.\d+)?)\s?x\b
+    | (?P<count>\d[\d,]*(?:\.\d+)?)\s?(?P<scale>[km])?\+?\s
+      (?:users|customers|teams|companies|businesses|downloads|installs|reviews)\b
+    | \b(?P<number>\d+\.\d+)\b
+    )
+    """,
+    re.VERBOSE | re.IGNORECASE
+)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_SENTENCE_END = re.compile(r"[.!?:;]\s+")
+
+_DAYS_PER_UNIT = {"d": 1, "day": 1, "days": 1, "week": 7, "weeks": 7, "wk": 7, "wks": 7,
+                  "month": 30, "months": 30, "mo": 30, "mos": 30}
+
+# Confidence that an unsupported claim of each kind is a hallucination
+UNSUPPORTED_CONFIDENCE = {
+    "money": 0.9,
+    "percent": 0.85,
+    "count": 0.8,
+    "duration": 0.8,
+    "hours": 0.7,
+    "multiplier": 0.75,
+    "number": 0.6,
+    "entity": 0.5
+}
+
+Claim = Tuple[str, Any]
+
+def _number(text: str) -> float:
+    return round(float(text.replace(",", "")), 2)
+
+def extract_claims(text: str) -> Iterator[Tuple[str, Claim]]:
+    """Yield (matched text, (kind, value)) for each numeric claim in text.
+
+    Durations are normalized to days, so "14-Day", "14d" and "2 weeks"
+    compare equal.
+    """
+    for match in _CLAIM_PATTERN.finditer(text):
+        groups = match.groupdict()
+        if groups["money"]:
+            claim = ("money", _number(groups["money"]))
+        elif groups["percent"]:
+            claim = ("percent", _number(groups["percent"]))
+        elif groups["duration"]:
+            unit = groups["unit"].lower()
+            if unit.startswith("h"):
+                claim = ("hours", int(groups["duration"]))
+            else:
+                claim = ("duration", int(groups["duration"]) * _DAYS_PER_UNIT[unit])
+        elif groups["multiplier"]:
+            claim = ("multiplier", _number(groups["multiplier"]))
+        elif groups["count"]:
+            scale = {"k": 1e3, "m": 1e6}.get((groups["scale"] or "").lower(), 1)
+            claim = ("count", _number(groups["count"]) * scale)
+        else:
+            claim = ("number", _number(groups["number"]))
+        yield match.group(0).strip(), claim
+
+def _entities(text: str) -> Iterator[str]:
+    """Yield capitalized words that don't start a sentence (likely names)."""
+    for sentence in _SENTENCE_END.split(text):
+        words = _WORD_PATTERN.findall(sentence)
+        for word in words[1:]:
+            if word[0].isupper() and len(word) > 1:
+                yield word
+
+class ClaimIndex:
+    """Facts a claim can be checked against: tokens and normalized values."""
+
+    def __init__(self):
+        self.tokens: Set[str] = set()
+        self.values: Set[Claim] = set()
+
+    def add_text(self, text: str) -> None:
+        self.tokens.update(_TOKEN_PATTERN.findall(text.lower()))
+        for _, claim in extract_claims(text):
+            self.values.add(claim)
+
+    def add_number(self, value: float) -> None:
+        value = round(float(value), 2)
+        self.values.add(("number", value))
+        self.values.add(("money", value))
+        if 0 < value <= 1:
+            # Rates such as avg_trial_conversion are quoted as percentages
+            self.values.add(("percent", round(value * 100, 2)))
+
+    def add(self, data: Any) -> None:
+        """Index every string (including keys) and number in a JSON value."""
+        if isinstance(data, str):
+            self.add_text(data)
+        elif isinstance(data, bool):
+            return
+        elif isinstance(data, (int, float)):
+            self.add_number(data)
+        elif isinstance(data, Mapping):
+            for key, value in data.items():
+                self.add_text(str(key))
+                self.add(value)
+        elif isinstance(data, (list, tuple)):
+            for value in data:
+                self.add(value)
+
+    def supports(self, kind: str, value: Any) -> bool:
+        if kind == "entity":
+            return value.lower() in self.tokens
+        if (kind, value) in self.values:
+            return True
+        # A bare number in the facts supports the same number with a unit
+        return kind in ("money", "percent", "multiplier", "count") and ("number", value) in self.values
+
+@lru_cache(maxsize=256)
+def _text_index(text: str) -> ClaimIndex:
+    """Index of a brief's text; cached since batches repeat briefs."""
+    index = ClaimIndex()
+    index.add_text(text)
+    return index
+
+class ClaimVerifier:
+    """Check the claims made by ad copy against the KB and the brief.
+
+    Each product's facts (feature names and descriptions, metrics, segment
+    figures) are indexed once per KB load, so verification cost depends
+    on the copy being checked rather than on the size of the KB.
+    """
+
+    def __init__(self, kb: Optional[Mapping] = None):
+        """Initialize the verifier.
+
+        Args:
+            kb: Knowledge base mapping, usually the scorer's KnowledgeBase
+        """
+        self.kb = kb if kb is not None else {}
+
+    def _product_index(self, product_name: str) -> ClaimIndex:
+        def build() -> ClaimIndex:
+            index = ClaimIndex()
+            index.add(self.kb["products"][product_name])
+            return index
+
+        products = self.kb.get("products", {})
+        if product_name not in products:
+            return ClaimIndex()
+        memoize = getattr(self.kb, "memoize", None)
+        return memoize(("claims", product_name), build) if memoize else build()
+
+    def _brief_index(self, brief: CampaignBrief) -> ClaimIndex:
+        # IDs and the budget aren't facts the copy should quote
+        product = brief.product
+        return _text_index("\n".join(str(text) for text in (
+            product.name, product.category, product.price, brief.goal,
+            *product.key_features, *brief.audience_hints
+        )))
+
+    def verify(self, creatives: List[Dict], brief: CampaignBrief) -> List[List[Dict]]:
+        """Check all creatives of a campaign in one pass.
+
+        Args:
+            creatives: The creatives to check
+            brief: The input brief; its price, features and hints count as facts
+
+        Returns:
+            List: For each creative, its claims as dicts with "text", "kind",
+            "value", "supported" and "confidence" (the likelihood that the
+            claim is a hallucination; 0.0 when supported)
+        """
+        indexes = (self._product_index(brief.product.name), self._brief_index(brief))
+        results = []
+        for creative in creatives:
+            claims = []
+            seen = set()
+            text = f"{creative.get('headline', '')}\n{creative.get('body', '')}"
+            found = list(extract_claims(text))
+            found += [(word, ("entity", word)) for word in _entities(creative.get("body", ""))]
+            for claim_text, (kind, value) in found:
+                if (kind, value) in seen:
+                    continue
+                seen.add((kind, value))
+                supported = any(index.supports(kind, value) for index in indexes)
+                claims.append({
+                    "text": claim_text,
+                    "kind": kind,
+                    "value": value,
+                    "supported": supported,
+                    "confidence": 0.0 if supported else UNSUPPORTED_CONFIDENCE[kind]
+                })
+            results.append(claims)
+        return results
@@ -0,0 +1,141 @@
+import itertools
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.models.brief import CampaignBrief
+
+def repair_budget_breakdown(
+    budget_breakdown: Dict[str, Any],
+    channels: List[str],
+    total_budget: float
+) -> List[str]:
+    """Make a budget breakdown cover every channel and sum to the total, in place.
+
+    Missing channels get the average share of the existing ones, then all
+    shares are rescaled proportionally and rounded to cents; the rounding
+    remainder goes to the largest channel.
+
+    Returns:
+        List[str]: Descriptions of the fixes applied
+    """
+    fixes = []
+    for channel, amount in budget_breakdown.items():
+        if not isinstance(amount, (int, float)):
+            try:
+                budget_breakdown[channel] = float(amount)
+            except (TypeError, ValueError):
+                budget_breakdown[channel] = 0.0
+            fixes.append(f"Coerced budget for {channel} to a number")
+
+    missing = [channel for channel in channels if channel not in budget_breakdown]
+    if missing:
+        current = sum(budget_breakdown.values())
+        share = current / len(budget_breakdown) if current > 0 else 1.0
+        for channel in missing:
+            budget_breakdown[channel] = share
+        fixes.append(f"Inserted missing channels: {', '.join(missing)}")
+
+    current = sum(budget_breakdown.values())
+    if budget_breakdown and abs(current - total_budget) > 0.01:
+        if current > 0:
+            for channel, amount in budget_breakdown.items():
+                budget_breakdown[channel] = round(amount * total_budget / current, 2)
+        else:
+            for channel in budget_breakdown:
+                budget_breakdown[channel] = round(total_budget / len(budget_breakdown), 2)
+        largest = max(budget_breakdown, key=budget_breakdown.get)
+        budget_breakdown[largest] = round(
+            budget_breakdown[largest] + total_budget - sum(budget_breakdown.values()), 2
+        )
+        fixes.append(f"Rescaled budget breakdown from {current:g} to {total_budget:g}")
+    return fixes
+
+def _dedupe_ids(items: List[Dict], make_id: Callable[[int], str]) -> bool:
+    """Give each item whose ID repeats an earlier one the next unused make_id(k).
+
+    Returns:
+        bool: Whether any ID was changed
+    """
+    taken = {item.get("id") for item in items}
+    seen = set()
+    candidates = (make_id(k) for k in itertools.count(1))
+    changed = False
+    for item in items:
+        if item.get("id") in seen:
+            item["id"] = next(c for c in candidates if c not in taken)
+            taken.add(item["id"])
+            changed = True
+        seen.add(item["id"])
+    return changed
+
+def _creative_id(ad_group_number: int, k: int) -> str:
+    """Creative IDs follow c_1a, c_1b, ...; past z they become c_1_27, ..."""
+    return f"c_{ad_group_number}{chr(ord('a') + k - 1)}" if k <= 26 else f"c_{ad_group_number}_{k}"
+
+def renumber_duplicate_ids(ad_groups: List[Any]) -> List[str]:
+    """Re-number duplicate ad group IDs and duplicate creative IDs, in place.
+
+    Only the repeated IDs change; the first use of each ID is kept.
+
+    Returns:
+        List[str]: Descriptions of the fixes applied
+    """
+    fixes = []
+    groups = [ad_group for ad_group in ad_groups if isinstance(ad_group, dict)]
+    if _dedupe_ids(groups, lambda k: f"ag_{k}"):
+        fixes.append("Re-numbered duplicate ad group IDs")
+    for number, ad_group in enumerate(groups, 1):
+        creatives = ad_group.get("creatives")
+        if not isinstance(creatives, list):
+            continue
+        creatives = [creative for creative in creatives if isinstance(creative, dict)]
+        if _dedupe_ids(creatives, lambda k: _creative_id(number, k)):
+            fixes.append(f"Re-numbered duplicate creative IDs in ad group {ad_group.get('id')}")
+    return fixes
+
+def repair_campaign(campaign: Dict, brief: CampaignBrief) -> List[str]:
+    """Fix deterministic validation problems in a raw campaign dict, in place.
+
+    Corrects the campaign ID and total budget from the brief, repairs the
+    budget breakdown and re-numbers duplicate IDs. Nothing here needs an
+    LLM call; problems in the generated copy itself are left alone.
+
+    Args:
+        campaign (Dict): The campaign as decoded from the LLM response
+        brief (CampaignBrief): The input brief
+
+    Returns:
+        List[str]: Descriptions of the fixes applied, empty if none were needed
+    """
+    fixes = []
+    if campaign.get("campaign_id") != brief.campaign_id:
+        campaign["campaign_id"] = brief.campaign_id
+        fixes.append("Corrected campaign ID")
+    if campaign.get("total_budget") != brief.budget:
+        campaign["total_budget"] = brief.budget
+        fixes.append("Corrected total budget")
+    if isinstance(campaign.get("budget_breakdown"), dict):
+        fixes += repair_budget_breakdown(campaign["budget_breakdown"], brief.channels, brief.budget)
+    if isinstance(campaign.get("ad_groups"), list):
+        fixes += renumber_duplicate_ids(campaign["ad_groups"])
+    return fixes
+
+def fragment_path(loc: Tuple) -> Tuple:
+    """Path of the innermost list element (ad group or creative) an error is in.
+
+    An empty path means the error is in the campaign's top-level fields.
+    """
+    path = ()
+    for i, key in enumerate(loc):
+        if isinstance(key, int):
+            path = tuple(loc[:i + 1])
+    return path
+
+def get_fragment(campaign: Dict, path: Tuple) -> Any:
+    """Return the value at a path of keys and indexes, or None if absent."""
+    value = campaign
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
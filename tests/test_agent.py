@@ -1,11 +1,18 @@
 import json
+import time
 from pathlib import Path
 
 import pytest
 
+from benchmarks.stub_server import StubConfig, start_stub_server
 from src.agent import CampaignAgent
 from src.models.brief import CampaignBrief
 from src.models.campaign import Campaign
+from src.utils import metrics as metrics_module
+from src.utils.cache import set_response_cache
+from src.utils.deadline import DeadlineExceeded
+from src.utils.llm import _get_mock_response, reset_clients
+from src.utils.metrics import export_prometheus, flush_metrics_log, metrics_snapshot
 
 @pytest.fixture
 def example_brief():
@@ -40,3 +47,389 @@ def test_campaign_creation(example_brief):
     # Validate checks passed
     assert campaign["checks"]["budget_sum_ok"]
     assert campaign["checks"]["required_fields_present"]
+
+def test_process_batch(example_brief, tmp_path):
+    input_path = tmp_path / "briefs.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    bad_brief = dict(example_brief, campaign_id="cmp_2025_10_01")
+    input_path.write_text(
+        "\n".join([
+            json.dumps(example_brief),
+            "not json",
+            json.dumps(bad_brief),
+            json.dumps(example_brief),
+        ]) + "\n"
+    )
+
+    agent = CampaignAgent(mock=True)
+    summary = agent.process_batch(str(input_path), str(output_path), concurrency=2, dedupe=False)
+
+    # Per-brief failures are recorded without aborting the batch, and the
+    # campaign ID mismatch is repaired locally
+    assert summary["total"] == 4
+    assert summary["succeeded"] == 3
+    assert summary["failed"] == 1
+    assert summary["repaired_local"] == 1
+    assert summary["throughput"] > 0
+    assert summary["latency_p50"] <= summary["latency_p95"]
+
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert sorted(r["index"] for r in records) == [1, 2, 3, 4]
+    by_index = {r["index"]: r for r in records}
+    assert by_index[1]["status"] == "ok"
+    assert by_index[1]["result"]["campaign_id"] == example_brief["campaign_id"]
+    assert by_index[2]["status"] == "error"
+    assert by_index[3]["status"] == "ok"
+    assert by_index[3]["repair"] == "local"
+    assert by_index[3]["result"]["campaign_id"] == "cmp_2025_10_01"
+
+def test_process_batch_derives_near_duplicates(example_brief, tmp_path):
+    input_path = tmp_path / "briefs.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    variants = [
+        example_brief,
+        dict(example_brief, campaign_id="cmp_2025_10_01", budget=7500),
+        dict(example_brief, campaign_id="cmp_2025_10_02",
+             audience_hints=list(reversed(example_brief["audience_hints"]))),
+        dict(example_brief, campaign_id="cmp_2025_10_03", tone="playful"),
+    ]
+    input_path.write_text("\n".join(json.dumps(brief) for brief in variants) + "\n")
+
+    summary = CampaignAgent(mock=True).process_batch(str(input_path), str(output_path), concurrency=4)
+
+    # The new tone needs its own generation; the other two reuse the first
+    assert summary["succeeded"] == 4
+    assert summary["derived"] == 2
+    assert summary["llm_calls_avoided"] == 2
+    by_index = {r["index"]: r for r in map(json.loads, output_path.read_text().splitlines())}
+    assert "derived_from" not in by_index[1] and "derived_from" not in by_index[4]
+    derived = by_index[2]["result"]
+    assert by_index[2]["derived_from"] == example_brief["campaign_id"]
+    assert derived["campaign_id"] == "cmp_2025_10_01"
+    assert derived["total_budget"] == 7500
+    assert derived["budget_breakdown"] == {"search": 4500, "social": 3000}
+    assert derived["metrics"]["derived_from"] == example_brief["campaign_id"]
+    assert derived["ad_groups"] == by_index[1]["result"]["ad_groups"]
+
+def test_process_brief_incremental(example_brief, monkeypatch):
+    from src import agent as agent_module
+
+    agent = CampaignAgent(mock=True)
+    previous = agent.process_brief(example_brief)
+    calls = []
+    get_llm_response = agent_module.get_llm_response
+
+    def counting_response(**kwargs):
+        calls.append(kwargs.get("mock_kind", "campaign"))
+        return get_llm_response(**kwargs)
+
+    monkeypatch.setattr(agent_module, "get_llm_response", counting_response)
+
+    # Budget and channel edits are applied without an LLM call
+    edited = dict(example_brief, budget=7500, channels=["search"])
+    campaign = agent.process_brief_incremental(edited, example_brief, previous)
+    assert calls == []
+    assert campaign["budget_breakdown"] == {"search": 7500}
+    assert campaign["ad_groups"][0]["creatives"][0]["headline"] == \
+        previous["ad_groups"][0]["creatives"][0]["headline"]
+    assert campaign["metrics"]["incremental"]["reused"] == 1
+
+    # A new audience hint adds an ad group; the existing one is reused
+    edited = dict(example_brief, audience_hints=example_brief["audience_hints"] + ["students"])
+    campaign = agent.process_brief_incremental(edited, example_brief, previous)
+    assert calls == ["ad_group"]
+    assert [ad_group["id"] for ad_group in campaign["ad_groups"]] == ["ag_1", "ag_2"]
+    assert campaign["metrics"]["incremental"]["regenerated"] == ["ag_2"]
+    assert all("score" in c for ad_group in campaign["ad_groups"] for c in ad_group["creatives"])
+
+    # A new goal needs the whole campaign generated again
+    campaign = agent.process_brief_incremental(dict(example_brief, goal="awareness"), example_brief, previous)
+    assert campaign["metrics"]["incremental"]["full"]
+    assert calls[1:] == ["campaign"]
+
+def test_deadline_returns_completed_ad_groups(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils.llm import _get_mock_response
+
+    skeleton = _get_mock_response()
+    skeleton["ad_groups"].append(dict(skeleton["ad_groups"][0], id="ag_2"))
+
+    def slow_second_ad_group(**kwargs):
+        if kwargs["mock_kind"] == "skeleton":
+            return skeleton
+        if "ag_2" in kwargs["user_prompt"]:
+            time.sleep(1.0)
+        return {"creatives": _get_mock_response()["ad_groups"][0]["creatives"]}
+
+    monkeypatch.setattr(agent_module, "get_llm_response", slow_second_ad_group)
+    start = time.perf_counter()
+    campaign = CampaignAgent(mock=True, fanout=True).process_brief(example_brief, deadline=0.4)
+
+    assert time.perf_counter() - start < 0.4
+    assert [ad_group["id"] for ad_group in campaign["ad_groups"]] == ["ag_1"]
+    assert campaign["metrics"]["degraded"]["source"] == "partial"
+    assert campaign["checks"]["budget_sum_ok"]
+
+def test_deadline_cuts_stream_short(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils import dedupe
+
+    document = _get_mock_response()
+    document["ad_groups"].append(dict(document["ad_groups"][0], id="ag_2"))
+    text = json.dumps(document)
+
+    def stream(**kwargs):
+        yield text[:text.index('{"id": "ag_2"')]
+        raise DeadlineExceeded("LLM call ran out of time")
+
+    # No recent plan to fall back to, so the ad group streamed so far is used
+    monkeypatch.setattr(dedupe, "_recent_plans", dedupe.RecentPlans())
+    monkeypatch.setattr(agent_module, "stream_llm_response", stream)
+    campaign = CampaignAgent(mock=True).process_brief_stream(example_brief, deadline=5)
+
+    assert [ad_group["id"] for ad_group in campaign["ad_groups"]] == ["ag_1"]
+    assert campaign["metrics"]["degraded"]["ad_groups"] == 1
+
+def test_incremental_update_honors_deadline(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils import dedupe
+
+    def slow_response(**kwargs):
+        time.sleep(kwargs["timeout"])
+        raise DeadlineExceeded("LLM call ran out of time")
+
+    monkeypatch.setattr(dedupe, "_recent_plans", dedupe.RecentPlans())
+    agent = CampaignAgent(mock=True)
+    previous = agent.process_brief(example_brief)
+    monkeypatch.setattr(agent_module, "get_llm_response", slow_response)
+
+    # A full regeneration falls back to the recent plan
+    start = time.perf_counter()
+    campaign = agent.process_brief_incremental(
+        dict(example_brief, goal="awareness"), example_brief, previous, deadline=0.5
+    )
+    assert time.perf_counter() - start < 0.5
+    assert campaign["metrics"]["degraded"]["source"] == "recent_plan"
+
+    # Ad groups not regenerated in time keep their previous creatives
+    edited = dict(example_brief, tone="playful")
+    campaign = agent.process_brief_incremental(edited, example_brief, previous, deadline=0.5)
+    assert campaign["metrics"]["degraded"]["source"] == "partial"
+    assert campaign["ad_groups"][0]["creatives"][0]["headline"] == \
+        previous["ad_groups"][0]["creatives"][0]["headline"]
+
+def test_deadline_interrupts_stalled_stream(example_brief, monkeypatch):
+    from benchmarks.stub_server import StubConfig, start_stub_server
+    from src.utils import dedupe
+    from src.utils.cache import set_response_cache
+    from src.utils.llm import reset_clients
+
+    stub = start_stub_server(StubConfig(latency=0.05, stall=5.0))
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{stub.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(dedupe, "_recent_plans", dedupe.RecentPlans())
+    reset_clients()
+    set_response_cache(None)
+    start = time.perf_counter()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            CampaignAgent().process_brief_stream(example_brief, deadline=1.0)
+        elapsed = time.perf_counter() - start
+    finally:
+        stub.shutdown()
+        reset_clients()
+    # Around the deadline, well before the stalled stream would resume
+    assert elapsed < 1.5
+
+def test_deadline_falls_back_to_recent_plan(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils import dedupe
+
+    def timed_out(**kwargs):
+        raise DeadlineExceeded("LLM call ran out of time")
+
+    monkeypatch.setattr(dedupe, "_recent_plans", dedupe.RecentPlans())
+    get_llm_response = agent_module.get_llm_response
+    monkeypatch.setattr(agent_module, "get_llm_response", timed_out)
+    agent = CampaignAgent(mock=True)
+    with pytest.raises(DeadlineExceeded):
+        agent.process_brief(example_brief, deadline=1)
+
+    monkeypatch.setattr(agent_module, "get_llm_response", get_llm_response)
+    agent.process_brief(example_brief)
+    monkeypatch.setattr(agent_module, "get_llm_response", timed_out)
+    campaign = agent.process_brief(dict(example_brief, campaign_id="cmp_2025_10_01", budget=10000), deadline=1)
+
+    assert campaign["campaign_id"] == "cmp_2025_10_01"
+    assert sum(campaign["budget_breakdown"].values()) == 10000
+    assert campaign["metrics"]["degraded"]["source"] == "recent_plan"
+    assert campaign["metrics"]["degraded"]["derived_from"] == example_brief["campaign_id"]
+
+def test_recent_plan_fallback_drops_other_channels(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils import dedupe
+
+    def timed_out(**kwargs):
+        raise DeadlineExceeded("LLM call ran out of time")
+
+    source = dict(example_brief, channels=["search", "social", "display"], goal="awareness")
+    plan = dict(
+        _get_mock_response(),
+        budget_breakdown={"search": 2000, "social": 2000, "display": 1000},
+        ad_groups=[
+            {"id": f"ag_{i}", "channel": channel, "target": {"age": "25-40", "behaviors": ["remote work"]},
+             "creatives": [{"id": f"c_{i}a", "headline": "Get More Done", "body": "Try FocusFlow free.",
+                            "cta": "Start Free Trial", "justification": "Trial offer."}]}
+            for i, channel in enumerate(["search", "social", "display"], 1)
+        ]
+    )
+    monkeypatch.setattr(dedupe, "_recent_plans", dedupe.RecentPlans())
+    dedupe.get_recent_plans().put(CampaignBrief(**source), plan)
+    monkeypatch.setattr(agent_module, "get_llm_response", timed_out)
+    campaign = CampaignAgent(mock=True).process_brief(example_brief, deadline=1)
+
+    # Same product, but the plan's display budget and ad group don't carry over
+    assert campaign["budget_breakdown"] == {"search": 2500, "social": 2500}
+    assert [ad_group["id"] for ad_group in campaign["ad_groups"]] == ["ag_1", "ag_2"]
+    assert campaign["metrics"]["degraded"]["source"] == "recent_plan"
+    assert campaign["metrics"]["degraded"]["dropped_channels"] == ["display"]
+
+def test_fenced_response_is_parsed_without_repair(example_brief, monkeypatch):
+    from src import agent as agent_module
+    from src.utils.llm import _get_mock_response
+
+    text = f"Here is the campaign:\n```json\n{json.dumps(_get_mock_response())}\n```\nEnjoy!"
+    monkeypatch.setattr(agent_module, "get_llm_response", lambda **kwargs: text)
+    campaign = CampaignAgent(mock=True).process_brief(example_brief)
+
+    assert campaign["campaign_id"] == example_brief["campaign_id"]
+    assert campaign["metrics"]["validation_errors"] == []
+    assert "repair" not in campaign["metrics"]
+
+def test_process_brief_stream(example_brief):
+    agent = CampaignAgent(mock=True)
+    events = []
+    campaign = agent.process_brief_stream(
+        example_brief,
+        on_event=lambda kind, payload: events.append((kind, payload))
+    )
+
+    assert campaign["campaign_id"] == example_brief["campaign_id"]
+    assert campaign["metrics"]["streaming"]["aborted_early"] is False
+    kinds = [kind for kind, _ in events]
+    assert kinds.index("creative") < kinds.index("ad_group")
+    creative_events = [p for kind, p in events if kind == "creative"]
+    assert all(0 <= p["score"] <= 1 for p in creative_events)
+
+def test_process_brief_stream_aborts_on_fatal_mismatch(example_brief):
+    agent = CampaignAgent(mock=True)
+    agent.repair = False
+    events = []
+    with pytest.raises(ValueError, match="Campaign ID mismatch"):
+        agent.process_brief_stream(
+            dict(example_brief, campaign_id="cmp_2025_10_01"),
+            on_event=lambda kind, payload: events.append(kind)
+        )
+
+    # Nothing after the campaign ID was consumed
+    assert events == []
+    assert agent.metrics.get_metrics()["streaming"]["aborted_early"] is True
+
+def test_process_brief_stream_repairs_mismatches(example_brief):
+    agent = CampaignAgent(mock=True)
+    events = []
+    campaign = agent.process_brief_stream(
+        dict(example_brief, campaign_id="cmp_2025_10_01", budget=10000),
+        on_event=lambda kind, payload: events.append(kind)
+    )
+
+    # The whole response was streamed, then repaired
+    assert events == ["creative", "ad_group"]
+    assert campaign["campaign_id"] == "cmp_2025_10_01"
+    assert sum(campaign["budget_breakdown"].values()) == 10000
+    assert campaign["metrics"]["streaming"]["aborted_early"] is False
+    assert campaign["metrics"]["repair"]["path"] == "local"
+
+def test_clone_shares_resources_but_not_metrics(example_brief):
+    agent = CampaignAgent(mock=True)
+    clone = agent.clone()
+    assert clone.scorer is agent.scorer
+    assert clone.system_prompt == agent.system_prompt
+    assert not agent.system_prompt.startswith("SYSTEM_PROMPT")
+
+    clone.process_brief(example_brief)
+    assert clone.metrics.metrics["stages"]
+    assert not agent.metrics.metrics["stages"]
+
+def test_stage_timings(example_brief):
+    agent = CampaignAgent(mock=True)
+    campaign = agent.process_brief(example_brief)
+
+    stages = campaign["metrics"]["stages"]
+    for stage in ("validate_brief", "render_prompt", "llm", "parse", "validate_campaign",
+                  "result", "result.dump", "result.score"):
+        assert stages[stage] >= 0
+    assert stages["result.score"] <= stages["result"]
+
+    snapshot = metrics_snapshot()
+    assert snapshot["llm"]["count"] >= 1
+    assert snapshot["total"]["p50"] <= snapshot["total"]["p99"]
+    assert 'campaign_stage_latency_ms{stage="llm",quantile="0.95"}' in export_prometheus()
+
+def test_metrics_log_is_shared_and_written_once(example_brief):
+    agents = [CampaignAgent(mock=True) for _ in range(5)]
+    logger = agents[0].metrics.logger
+    assert all(agent.metrics.logger is logger for agent in agents)
+    assert len(logger.handlers) == 1
+
+    agents[-1].process_brief(example_brief)
+    flush_metrics_log()
+
+    log_path = Path(metrics_module._log_writer.handler.baseFilename)
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    completed = [e for e in entries if e.get("event") == "processing_completed"]
+    assert completed[-1]["success"] is True
+    assert "llm" in completed[-1]["stages"]
+
+def test_process_brief_over_http(example_brief, monkeypatch):
+    server = start_stub_server(StubConfig(latency=0, creatives_per_ad_group=2))
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    reset_clients()
+    set_response_cache(None)
+    try:
+        campaign = CampaignAgent().process_brief(example_brief)
+        streamed = CampaignAgent().process_brief_stream(example_brief)
+    finally:
+        server.shutdown()
+        reset_clients()
+
+    assert campaign["campaign_id"] == example_brief["campaign_id"]
+    assert len(campaign["ad_groups"]) == len(example_brief["channels"])
+    assert campaign["metrics"]["usage"]["llm_calls"] == 1
+    assert streamed["ad_groups"] == campaign["ad_groups"]
+    assert streamed["metrics"]["usage"]["completion_tokens"] > 0
+
+def test_process_brief_fanout_over_http(example_brief, monkeypatch):
+    config = StubConfig(latency=0.2, creatives_per_ad_group=2)
+    server = start_stub_server(config)
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("LLM_CACHE", "false")
+    reset_clients()
+    set_response_cache(None)
+    brief = dict(example_brief, channels=["search", "social", "display", "video"])
+    try:
+        campaign = CampaignAgent(fanout=True).process_brief(brief)
+    finally:
+        server.shutdown()
+        reset_clients()
+
+    # One skeleton call, then the four ad groups in parallel
+    assert config.requests == 5
+    assert campaign["metrics"]["usage"]["llm_calls"] == 5
+    assert [ag["id"] for ag in campaign["ad_groups"]] == ["ag_1", "ag_2", "ag_3", "ag_4"]
+    assert all(len(ag["creatives"]) == 2 for ag in campaign["ad_groups"])
+    assert campaign["checks"]["budget_sum_ok"]
+    stages = campaign["metrics"]["stages"]
+    assert stages["ad_groups"] < 4 * 200
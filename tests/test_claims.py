@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from src.models.brief import CampaignBrief
+from src.utils.kb import get_knowledge_base
+from src.validators.claims import ClaimVerifier, extract_claims
+
+ROOT = Path(__file__).parent.parent
+
+@pytest.fixture
+def brief():
+    with open(ROOT / "examples" / "brief2.json", "r") as f:
+        return CampaignBrief(**json.load(f))
+
+@pytest.fixture
+def verifier():
+    return ClaimVerifier(get_knowledge_base(str(ROOT / "kb" / "product_data.json")))
+
+def _creative(headline, body):
+    return {"id": "c_1a", "headline": headline, "body": body, "cta": "Start", "justification": ""}
+
+def test_extract_claims_normalizes_units():
+    claims = [claim for _, claim in extract_claims("Free 14-Day trial, then $9.99/mo. 2 weeks, 35% and 10k+ users")]
+    assert claims == [
+        ("duration", 14), ("money", 9.99), ("duration", 14), ("percent", 35.0), ("count", 10000.0)
+    ]
+
+def test_claims_are_checked_against_kb_and_brief(verifier, brief):
+    claims = verifier.verify([
+        _creative("Try FocusFlow free for 14 days", "Then $9.99/mo. 4.6-star rated, syncs with Outlook."),
+        _creative("Only $4.99/mo", "Loved by 10k+ teams, now with Slack sync. 42% of startup teams convert.")
+    ], brief)
+
+    assert all(claim["supported"] for claim in claims[0])
+    assert {c["text"] for c in claims[0]} >= {"14 days", "$9.99", "4.6", "Outlook"}
+    unsupported = {c["text"]: c["confidence"] for c in claims[1] if not c["supported"]}
+    assert unsupported == {"$4.99": 0.9, "10k+ teams": 0.8, "Slack": 0.5}
+
+def test_unknown_product_uses_brief_facts_only(brief):
+    claims = ClaimVerifier().verify([_creative("Free for 14 days", "Then $9.99/mo, 35% off")], brief)[0]
+    assert [c["supported"] for c in claims] == [True, True, False]
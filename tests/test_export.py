@@ -0,0 +1,65 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from src.agent import CampaignAgent
+from src.utils.export import TABLES, export_campaigns, flatten_campaign, iter_campaigns
+
+@pytest.fixture
+def campaign():
+    with open(Path(__file__).parent.parent / "examples" / "brief1.json", "r") as f:
+        brief = json.load(f)
+    return CampaignAgent(mock=True).process_brief(brief)
+
+def test_flatten_campaign(campaign):
+    tables = flatten_campaign(campaign)
+
+    for table, rows in tables.items():
+        columns = [name for name, _ in TABLES[table]]
+        assert all(list(row) == columns for row in rows)
+    assert len(tables["campaigns"]) == 1
+    assert tables["campaigns"][0]["creatives"] == len(tables["creatives"]) == 1
+    creative = tables["creatives"][0]
+    assert creative["creative_id"] == "c_1a"
+    assert creative["score"] == campaign["ad_groups"][0]["creatives"][0]["score"]
+    assert creative["hallucination_flagged"] is bool(campaign["metrics"]["hallucination_flags"])
+    assert {row["channel"]: row["amount"] for row in tables["budgets"]} == campaign["budget_breakdown"]
+    assert {row["stage"] for row in tables["stages"]} >= {"llm", "validate_campaign"}
+
+def test_flags_match_creatives_by_ad_group(campaign):
+    campaign = copy.deepcopy(campaign)
+    second = dict(copy.deepcopy(campaign["ad_groups"][0]), id="ag_2")
+    campaign["ad_groups"].append(second)
+    campaign["metrics"]["hallucination_flags"] = [
+        {"message": "unsupported", "confidence": 0.8, "ad_group_id": "ag_2", "creative_id": "c_1a"}
+    ]
+
+    # Both ad groups have a creative c_1a, but only the second was flagged
+    rows = flatten_campaign(campaign)["creatives"]
+    assert [(row["ad_group_id"], row["creative_id"]) for row in rows] == [("ag_1", "c_1a"), ("ag_2", "c_1a")]
+    assert [row["hallucination_confidence"] for row in rows] == [None, 0.8]
+
+def test_batch_results_export_to_ndjson(tmp_path, campaign):
+    results = tmp_path / "results.jsonl"
+    results.write_text("\n".join([
+        json.dumps({"index": 1, "status": "ok", "result": campaign}),
+        json.dumps({"index": 2, "status": "error", "error": "ValueError: bad"})
+    ]) + "\n")
+    output = tmp_path / "campaigns.ndjson"
+
+    counts = export_campaigns(iter_campaigns(str(results)), str(output), "ndjson")
+
+    assert counts == {"campaigns": 1}
+    assert list(iter_campaigns(str(output))) == [campaign]
+
+def test_parquet_export(tmp_path, campaign):
+    pq = pytest.importorskip("pyarrow.parquet")
+    counts = export_campaigns([campaign] * 3, str(tmp_path), "parquet", batch_size=2)
+
+    assert counts["campaigns"] == 3
+    creatives = pq.read_table(tmp_path / "creatives.parquet")
+    assert creatives.num_rows == 3
+    assert creatives.column_names == [name for name, _ in TABLES["creatives"]]
+    assert pq.read_table(tmp_path / "stages.parquet").num_rows == counts["stages"]
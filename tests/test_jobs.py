@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from src.jobs import JobStore, run_worker, run_workers
+
+@pytest.fixture
+def briefs_path(tmp_path):
+    with open(Path(__file__).parent.parent / "examples" / "brief1.json", "r") as f:
+        brief = json.load(f)
+    path = tmp_path / "briefs.jsonl"
+    path.write_text("\n".join([
+        json.dumps(brief),
+        "not json",
+        json.dumps(dict(brief, campaign_id="cmp_2025_09_02")),
+    ]) + "\n")
+    return path
+
+@pytest.fixture(autouse=True)
+def job_settings(monkeypatch):
+    monkeypatch.setenv("JOBS_MAX_ATTEMPTS", "2")
+    monkeypatch.setenv("JOBS_RETRY_DELAY", "0")
+
+def test_resumes_unfinished_jobs_after_a_crash(briefs_path, tmp_path):
+    store_path = str(tmp_path / "jobs.sqlite")
+    store = JobStore.from_env(store_path)
+    assert store.enqueue(str(briefs_path)) == 3
+    # A worker that claimed a job and died: its lease runs out
+    store.lease_seconds = 0
+    crashed = store.claim("crashed-worker")
+
+    counts = run_worker(store_path, mock=True, poll_interval=0)
+
+    # The brief that isn't JSON fails on its first attempt, without a retry
+    assert counts == {"done": 2, "error": 1}
+    assert store.counts() == {"pending": 0, "running": 0, "done": 2, "failed": 1}
+    assert not store.complete(crashed, "crashed-worker", {})
+    # Enqueueing the same file again after a restart adds nothing
+    assert store.enqueue(str(briefs_path)) == 0
+
+    output = tmp_path / "results.jsonl"
+    assert store.export(str(output)) == 3
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["status"] for record in records] == ["ok", "error", "ok"]
+    assert records[0]["attempts"] == 2
+    assert records[1]["error"].startswith("JSONDecodeError")
+    assert records[1]["attempts"] == 1
+
+def test_expired_last_attempt_is_exported(briefs_path, tmp_path):
+    store = JobStore.from_env(str(tmp_path / "jobs.sqlite"))
+    store.enqueue(str(briefs_path))
+    store.lease_seconds = 0
+    # The first job's worker dies on both of its attempts
+    assert store.claim("crashed-worker")["line"] == 1
+    assert store.claim("crashed-worker")["line"] == 1
+    store.lease_seconds = 300
+    assert store.claim("worker")["line"] == 2
+
+    output = tmp_path / "results.jsonl"
+    assert store.export(str(output)) == 1
+    record = json.loads(output.read_text())
+    assert record["index"] == 1
+    assert record["campaign_id"] == "cmp_2025_09_01"
+    assert record["status"] == "error"
+    assert record["error"] == "Lease expired"
+
+def test_leases_are_exclusive(briefs_path, tmp_path):
+    first = JobStore(str(tmp_path / "jobs.sqlite"))
+    second = JobStore(str(tmp_path / "jobs.sqlite"))
+    first.enqueue(str(briefs_path))
+
+    claimed = [first.claim("a"), second.claim("b"), first.claim("a"), second.claim("b")]
+    assert [job["line"] for job in claimed[:3]] == [1, 2, 3]
+    assert claimed[3] is None
+    assert not second.complete(claimed[0], "b", {})
+    assert first.complete(claimed[0], "a", {})
+
+def test_worker_processes_share_a_store(briefs_path, tmp_path):
+    store_path = str(tmp_path / "jobs.sqlite")
+    store = JobStore(store_path)
+    store.enqueue(str(briefs_path))
+
+    run_workers(store_path, processes=2, mock=True)
+
+    assert store.counts() == {"pending": 0, "running": 0, "done": 2, "failed": 1}
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from openai import OpenAI, RateLimitError
+
+from src.utils import llm
+from src.utils.cache import ResponseCache, set_response_cache
+from src.utils.metrics import MetricsLogger
+from src.utils.tokens import MaxTokensPlanner
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Route the shared client through an in-process transport."""
+    statuses = []
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json=_completion(json.dumps({"ok": True})))
+
+    client = OpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm.time, "sleep", lambda seconds: None)
+    monkeypatch.setenv("LLM_MAX_RETRIES", "2")
+    llm.reset_clients()
+    set_response_cache(None)
+    yield statuses, calls
+    llm.reset_clients()
+    set_response_cache(None)
+
+def test_retries_transient_errors(fake_api):
+    statuses, _ = fake_api
+    statuses.extend([429, 503])
+    response = llm.get_llm_response("system", "user")
+    assert json.loads(response) == {"ok": True}
+
+def test_gives_up_after_max_retries(fake_api):
+    statuses, _ = fake_api
+    statuses.extend([429, 429, 429])
+    with pytest.raises(RateLimitError):
+        llm.get_llm_response("system", "user")
+
+def test_rate_limiter_backs_off_on_429(fake_api):
+    statuses, _ = fake_api
+    statuses.append(429)
+    metrics = MetricsLogger()
+    limiter = llm.get_rate_limiter()
+    assert llm.get_llm_response("system", "user", metrics=metrics, use_cache=False, priority="batch")
+
+    assert limiter.limit < limiter.max_concurrency / 2 + 1
+    assert metrics.get_metrics()["rate_limit"]["throttled"] == 1
+    assert limiter.stats()["in_flight"] == 0
+
+def test_response_format(fake_api, monkeypatch):
+    _, calls = fake_api
+    schema = {"title": "Campaign", "type": "object"}
+    llm.get_llm_response("system", "user", use_cache=False, json_schema=schema)
+    monkeypatch.setenv("LLM_RESPONSE_FORMAT", "json_schema")
+    llm.reset_clients()
+    llm.get_llm_response("system", "user", use_cache=False, json_schema=schema)
+    llm.get_llm_response("system", "user", use_cache=False)
+
+    formats = [json.loads(call.content).get("response_format") for call in calls]
+    assert formats == [
+        None,
+        {"type": "json_schema", "json_schema": {"name": "Campaign", "schema": schema}},
+        {"type": "json_object"}
+    ]
+
+def test_backoff_is_bounded():
+    settings = llm.LLMSettings.from_env()
+    error = ValueError("not an API error")
+    for attempt in range(10):
+        assert 0 <= llm._backoff_delay(error, attempt, settings) <= settings.backoff_max
+
+def test_response_cache_tiers(fake_api, tmp_path):
+    _, calls = fake_api
+    cache_path = str(tmp_path / "cache.sqlite")
+    set_response_cache(ResponseCache(path=cache_path))
+    metrics = MetricsLogger()
+
+    first = llm.get_llm_response("system", "user", metrics=metrics)
+    second = llm.get_llm_response("system", "user", metrics=metrics)
+    assert first == second
+    assert len(calls) == 1
+    assert metrics.get_metrics()["cache"] == {"hits": 1, "misses": 1, "memory_hits": 1}
+
+    # A different completion budget (e.g. from adaptive sizing) still hits
+    assert llm.get_llm_response("system", "user", max_tokens=321) == first
+    assert len(calls) == 1
+
+    # A fresh process only has the SQLite tier to go on
+    set_response_cache(ResponseCache(path=cache_path))
+    assert llm.get_llm_response("system", "user", metrics=metrics) == first
+    assert len(calls) == 1
+    assert metrics.get_metrics()["cache"]["disk_hits"] == 1
+
+    # Opting out always goes to the API
+    llm.get_llm_response("system", "user", use_cache=False)
+    assert len(calls) == 2
+
+def test_only_complete_validated_responses_are_cached(monkeypatch):
+    finish_reasons = ["length", "stop", "stop"]
+
+    def handler(request):
+        body = _completion(json.dumps({"ok": True}))
+        body["choices"][0]["finish_reason"] = finish_reasons.pop(0)
+        return httpx.Response(200, json=body)
+
+    client = OpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    llm.reset_clients()
+    cache = ResponseCache()
+    set_response_cache(cache)
+    try:
+        # Cut off at max_tokens: not cached
+        llm.get_llm_response("system", "truncated")
+        assert cache.stats["misses"] == 1 and not cache._memory
+
+        # Deferred until the caller has validated it
+        content = llm.get_llm_response("system", "deferred", defer_cache=True)
+        assert not cache._memory
+        llm.cache_response("system", "deferred", content)
+        assert llm.get_llm_response("system", "deferred") == content
+        assert len(finish_reasons) == 1  # the last call was a cache hit
+    finally:
+        llm.reset_clients()
+        set_response_cache(None)
+
+def test_response_cache_eviction(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), max_entries=1, max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "67890")
+    cache.set("c", "abcde")
+    assert cache.get("c") == ("abcde", "memory")
+    assert cache.get("b") == ("67890", "disk")
+    assert cache.get("a") == (None, None)
+
+    cache.ttl = -1
+    assert cache.get("c") == (None, None)
+
+def test_usage_and_cost_are_recorded(fake_api, monkeypatch):
+    monkeypatch.setenv("LLM_PRICE_PROMPT_PER_1K", "1.0")
+    monkeypatch.setenv("LLM_PRICE_COMPLETION_PER_1K", "2.0")
+    _, calls = fake_api
+    metrics = MetricsLogger()
+    llm.get_llm_response("system", "user", metrics=metrics, max_tokens=321)
+
+    assert json.loads(calls[0].content)["max_tokens"] == 321
+    usage = metrics.get_metrics()["usage"]
+    assert (usage["prompt_tokens"], usage["completion_tokens"], usage["llm_calls"]) == (10, 5, 1)
+    assert metrics.get_metrics()["cost"] == pytest.approx(0.02)
+
+def test_max_tokens_planner_adapts():
+    planner = MaxTokensPlanner(ceiling=2000, floor=100, headroom=1.0, min_samples=2)
+    assert planner.plan(4) == 2000
+
+    planner.observe(4, 400)
+    planner.observe(4, 400)
+    assert planner.plan(4) == 400
+    assert planner.plan(8) == 800
+    assert planner.plan(100) == 2000
+
+    # A truncated completion makes room for more
+    planner.observe(4, 400, truncated=True)
+    assert planner.plan(4) == 600
+
+def _sse(content, finish_reason="stop"):
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]},
+        {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]},
+        {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}
+    ]
+    events = [
+        "data: " + json.dumps({"id": "c", "object": "chat.completion.chunk", "created": 0,
+                               "model": "gpt-4", **chunk})
+        for chunk in chunks
+    ]
+    return ("\n\n".join(events + ["data: [DONE]"]) + "\n\n").encode("utf-8")
+
+def test_slow_calls_are_hedged(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            time.sleep(1.0)  # the provider's occasional very slow completion
+        body = _sse(json.dumps({"request": len(requests)}))
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    client = OpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setenv("LLM_HEDGE", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.05")
+    llm.reset_clients()
+    set_response_cache(None)
+    policy = llm.get_hedge_policy()
+    for _ in range(policy.min_samples):
+        policy.observe(0.01)
+    policy._credits = 1.0
+    metrics = MetricsLogger()
+
+    start = time.perf_counter()
+    response = llm.get_llm_response("system", "user", metrics=metrics, use_cache=False)
+    elapsed = time.perf_counter() - start
+    llm.reset_clients()
+
+    assert json.loads(response) == {"request": 2}
+    assert elapsed < 0.9
+    assert json.loads(requests[0].content)["stream"] is True
+    assert metrics.get_metrics()["hedging"] == {"hedged": 1, "wins": 1}
+    assert metrics.get_metrics()["usage"]["completion_tokens"] == 5
+
+def test_invalid_hedge_response_does_not_win(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            time.sleep(0.3)
+            body = _sse(json.dumps({"request": 1}))
+        else:
+            body = _sse('{"request": 2, "cut off', finish_reason="length")
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    client = OpenAI(
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setenv("LLM_HEDGE", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.05")
+    llm.reset_clients()
+    set_response_cache(None)
+    policy = llm.get_hedge_policy()
+    for _ in range(policy.min_samples):
+        policy.observe(0.01)
+    policy._credits = 1.0
+    metrics = MetricsLogger()
+
+    response = llm.get_llm_response("system", "user", metrics=metrics, use_cache=False)
+    llm.reset_clients()
+
+    assert json.loads(response) == {"request": 1}
+    assert metrics.get_metrics()["hedging"] == {"hedged": 1, "wins": 0}
+
+def test_hedge_budget():
+    policy = llm.HedgePolicy(budget=0.5, min_samples=1, min_delay=0.2, max_burst=1)
+    assert policy.delay() is None
+    policy.observe(0.1)
+    assert policy.delay() == 0.2
+    assert policy.try_hedge()
+    policy.delay()
+    assert not policy.try_hedge()
+    policy.executor.shutdown()
+
+def test_reset_closes_async_clients(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    loop = asyncio.new_event_loop()
+
+    async def client():
+        return llm.get_async_client()
+
+    try:
+        async_client = loop.run_until_complete(client())
+        llm.reset_clients()
+        assert async_client.is_closed()
+    finally:
+        loop.close()
+
+def test_cancelled_async_call_frees_its_slot():
+    llm.reset_clients()
+
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+
+    kwargs = llm._request_kwargs(llm.get_settings(), "system", "user")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(
+            llm._create_async(create, kwargs, llm.get_settings(), None, "interactive"), 0.1
+        ))
+    assert llm.get_rate_limiter().stats()["in_flight"] == 0
@@ -0,0 +1,51 @@
+import json
+import time
+from pathlib import Path
+
+from src.agent import CampaignAgent
+from src.utils.profiling import BriefProfiler, llm_wait, summarize
+
+def test_profile_is_written_and_summarized(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PROFILE_DIR", "profiles")
+    monkeypatch.setenv("PROFILE_MAX_BRIEFS", "2")
+    brief_path = Path(__file__).parent.parent / "examples" / "brief1.json"
+    with open(brief_path, "r") as f:
+        brief = json.load(f)
+
+    agent = CampaignAgent(mock=True)
+    assert "profile" not in agent.process_brief(brief)["metrics"]
+    for _ in range(3):
+        campaign = agent.process_brief(brief, profile=True)
+
+    profile = campaign["metrics"]["profile"]
+    assert Path(profile["profile"]).exists()
+    assert profile["cpu_time"] + profile["llm_wait"] <= profile["wall_time"]
+    # Only the newest two briefs are kept
+    directory = tmp_path / "profiles"
+    assert len(list(directory.glob("*.json"))) == 2
+    assert len(list(directory.glob("*.prof"))) == 2
+
+    # Summarized from elsewhere, e.g. after copying the profiles off a host
+    monkeypatch.chdir(Path(__file__).parent)
+    report = summarize(str(directory), top=5)
+    assert report.startswith("2 profiled briefs")
+    assert "function calls" in report
+    assert "Top allocation sites" in report
+
+def test_one_brief_profiled_at_a_time(tmp_path):
+    assert BriefProfiler.start(False) is None
+    profiler = BriefProfiler.start(True)
+    assert BriefProfiler.start(True) is None
+    profiler.directory = str(tmp_path)
+    with llm_wait():
+        time.sleep(0.1)
+    report = profiler.finish("cmp/1", {"llm": 100.0, "score": 10.0})
+    assert 0.09 < report["llm_wait"] < 0.5
+    assert Path(report["report"]).name.endswith("cmp_1.json")
+    assert profiler.finish("cmp/1", {}) == {}  # already finished
+
+    # The lock is free again
+    second = BriefProfiler.start(True)
+    second.directory = str(tmp_path)
+    assert second.finish(None, {})["campaign_id"] is None
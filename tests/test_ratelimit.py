@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.ratelimit import RateLimiter, parse_reset
+
+def test_interactive_requests_preempt_batch():
+    limiter = RateLimiter(max_concurrency=1, interactive_reserve=0)
+    held = limiter.acquire(10, "batch")
+    order = []
+
+    def request(lane):
+        slot = limiter.acquire(10, lane)
+        order.append(lane)
+        limiter.release(slot)
+
+    threads = [threading.Thread(target=request, args=("batch",))]
+    threads[0].start()
+    while limiter.stats()["queued_batch"] < 1:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=request, args=("interactive",)))
+    threads[1].start()
+    while limiter.stats()["queued_interactive"] < 1:
+        time.sleep(0.001)
+    assert limiter.stats()["saturation"] == 1.0
+
+    limiter.release(held)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["interactive", "batch"]
+
+def test_aimd_concurrency_limit():
+    limiter = RateLimiter(max_concurrency=8, min_concurrency=2, cooldown=0)
+    for _ in range(3):
+        limiter.release(limiter.acquire(1), throttled=True, failed=True)
+    assert limiter.limit == 2
+
+    # A failure that isn't a 429 leaves the limit alone
+    limiter.release(limiter.acquire(1), failed=True)
+    assert limiter.limit == 2
+    for _ in range(10):
+        limiter.release(limiter.acquire(1))
+    assert 4 < limiter.limit < 5
+
+def test_buckets_follow_rate_limit_headers():
+    limiter = RateLimiter(interactive_reserve=0)
+    limiter.release(limiter.acquire(100), used_tokens=100, headers={
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-limit-tokens": "6000",
+        "x-ratelimit-remaining-tokens": "5900",
+        "x-ratelimit-reset-requests": "1s"
+    })
+    assert limiter.requests.capacity == 60
+    assert limiter.tokens.level == pytest.approx(5900, abs=1)
+
+    # One request per second: the next one waits for the bucket to refill
+    start = time.monotonic()
+    limiter.release(limiter.acquire(100))
+    assert time.monotonic() - start > 0.5
+    assert parse_reset("6m0s") == 360
+    assert parse_reset("20ms") == pytest.approx(0.02)
+
+def test_budget_share():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000, share=0.25)
+    assert (limiter.requests.capacity, limiter.tokens.capacity) == (15, 1500)
+    limiter.release(limiter.acquire(100), used_tokens=100, headers={
+        "x-ratelimit-limit-tokens": "8000",
+        "x-ratelimit-remaining-tokens": "4000"
+    })
+    assert limiter.tokens.capacity == 2000
+    assert limiter.tokens.level <= 1000
+
+def test_acquire_times_out():
+    limiter = RateLimiter(max_concurrency=1, interactive_reserve=0)
+    held = limiter.acquire(10, "batch")
+    with pytest.raises(TimeoutError):
+        limiter.acquire(10, "interactive", timeout=0.05)
+    assert limiter.stats()["queued_interactive"] == 0
+
+    # The abandoned ticket doesn't block the next waiter
+    limiter.release(held)
+    limiter.release(limiter.acquire(10, "batch", timeout=1))
+
+def test_cancelled_async_waiter_leaves_queue():
+    limiter = RateLimiter(max_concurrency=1, interactive_reserve=0)
+    held = limiter.acquire(10, "batch")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(limiter.acquire_async(10, "interactive"), 0.1))
+    assert limiter.stats()["queued_interactive"] == 0
+
+    limiter.release(held)
+    limiter.release(limiter.acquire(10, "batch", timeout=1))
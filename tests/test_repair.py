@@ -0,0 +1,79 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from src import agent as agent_module
+from src.agent import CampaignAgent
+from src.models.brief import CampaignBrief
+from src.models.campaign import Campaign
+from src.utils.llm import _get_mock_response
+from src.validators.checks import validate_campaign
+from src.validators.repair import fragment_path, repair_budget_breakdown, repair_campaign
+
+@pytest.fixture
+def example_brief():
+    with open(Path(__file__).parent.parent / "examples" / "brief1.json", "r") as f:
+        return json.load(f)
+
+def test_budget_breakdown_is_rescaled_and_completed():
+    breakdown = {"search": 2000, "social": 1000}
+    fixes = repair_budget_breakdown(breakdown, ["search", "social", "display"], 5000)
+
+    assert set(breakdown) == {"search", "social", "display"}
+    assert sum(breakdown.values()) == pytest.approx(5000, abs=0.01)
+    # Existing proportions are kept; the new channel gets the average share
+    assert breakdown["search"] == pytest.approx(2 * breakdown["social"], abs=0.02)
+    assert breakdown["display"] == pytest.approx(breakdown["social"] * 1.5, abs=0.02)
+    assert len(fixes) == 2
+
+def test_repair_campaign_fixes_deterministic_problems(example_brief):
+    brief = CampaignBrief(**example_brief)
+    campaign = _get_mock_response()
+    campaign["campaign_id"] = "cmp_wrong"
+    campaign["total_budget"] = 4000
+    campaign["budget_breakdown"] = {"search": 3000}
+    campaign["ad_groups"].append(copy.deepcopy(campaign["ad_groups"][0]))
+    campaign["ad_groups"][1]["creatives"].append(campaign["ad_groups"][1]["creatives"][0].copy())
+
+    fixes = repair_campaign(campaign, brief)
+
+    validate_campaign(Campaign(**campaign), brief)
+    assert [ag["id"] for ag in campaign["ad_groups"]] == ["ag_1", "ag_2"]
+    assert [c["id"] for c in campaign["ad_groups"][1]["creatives"]] == ["c_1a", "c_2a"]
+    assert repair_campaign(campaign, brief) == []
+    assert len(fixes) == 6
+
+def test_fragment_path_points_at_innermost_element():
+    assert fragment_path(("ad_groups", 0, "creatives", 1, "cta")) == ("ad_groups", 0, "creatives", 1)
+    assert fragment_path(("ad_groups", 2, "target")) == ("ad_groups", 2)
+    assert fragment_path(("campaign_name",)) == ()
+
+def test_invalid_fragment_is_patched_by_llm(example_brief, monkeypatch):
+    broken = _get_mock_response()
+    broken["budget_breakdown"]["search"] = 2500
+    del broken["ad_groups"][0]["creatives"][0]["cta"]
+    prompts = []
+
+    def fake_llm(system_prompt, user_prompt, mock=False, metrics=None, **kwargs):
+        prompts.append(user_prompt)
+        if len(prompts) == 1:
+            return json.dumps(broken)
+        return json.dumps({"cta": "Start Free Trial"})
+
+    monkeypatch.setattr(agent_module, "get_llm_response", fake_llm)
+    campaign = CampaignAgent().process_brief(example_brief)
+
+    # Only the broken creative was sent back, not the whole campaign
+    assert len(prompts) == 2
+    assert '"headline": "Get More Done' in prompts[1]
+    assert "campaign_name" not in prompts[1]
+    assert campaign["ad_groups"][0]["creatives"][0]["cta"] == "Start Free Trial"
+    assert sum(campaign["budget_breakdown"].values()) == pytest.approx(5000)
+    assert campaign["metrics"]["repair"]["path"] == "llm_patch"
+
+def test_repair_can_be_disabled(example_brief, monkeypatch):
+    monkeypatch.setenv("CAMPAIGN_REPAIR", "false")
+    with pytest.raises(ValueError, match="Campaign ID mismatch"):
+        CampaignAgent(mock=True).process_brief(dict(example_brief, campaign_id="cmp_2025_10_01"))
@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from src.utils.scorer import CreativeScorer
+
+KB_PATH = Path(__file__).parent.parent / "kb" / "product_data.json"
+
+@pytest.fixture
+def scorer():
+    return CreativeScorer(str(KB_PATH))
+
+def _creative(headline, body, cta="Start Free Trial", justification="Leads with the strongest feature."):
+    return {"headline": headline, "body": body, "cta": cta, "justification": justification}
+
+def test_score_creatives_matches_single_scoring(scorer):
+    creatives = [
+        _creative("Calendar integration that just works", "Plan your week with AI-assisted task prioritization and calendar integration."),
+        _creative("Work anywhere", "Offline mode keeps you moving.", cta="Go"),
+        _creative("A headline with no features at all, and far too long for search ads", "Nothing here.")
+    ]
+    batch = scorer.score_creatives(creatives, "FocusFlow")
+
+    assert batch["score"] == [scorer.score_creative(c, "FocusFlow") for c in creatives]
+    assert batch["feature"][0] == pytest.approx((0.85 + 0.92) / 2)
+    assert batch["feature"][1] == 0.78
+    assert batch["feature"][2] is None
+    assert batch["cta"] == [1.0, 0.6, 1.0]
+    assert batch["headline_length"] == [1.0, 0.7, 0.5]
+
+def test_feature_matching_ignores_case(scorer):
+    scores = scorer.score_creatives([_creative("OFFLINE MODE", "x")], "FocusFlow")
+    assert scores["feature"] == [0.78]
+
+def test_unknown_product_skips_feature_score(scorer):
+    scores = scorer.score_creatives([_creative("Offline mode", "x")], "Unknown")
+    assert scores["feature"] == [None]
+
+def test_knowledge_base_is_shared_and_reloads(tmp_path):
+    kb_path = tmp_path / "kb.json"
+    kb_path.write_text(KB_PATH.read_text())
+    first = CreativeScorer(str(kb_path))
+    second = CreativeScorer(str(kb_path))
+    assert first.kb is second.kb
+    assert "FocusFlow" in first.kb["products"]
+    assert (tmp_path / "kb.json.idx").exists()
+
+    creative = _creative("Dark mode", "x")
+    assert first.score_creatives([creative], "FocusFlow")["feature"] == [None]
+
+    data = json.loads(kb_path.read_text())
+    data["products"]["FocusFlow"]["features"]["dark mode"] = {"description": "", "effectiveness": 0.5}
+    data["products"]["Späti"] = {"features": {}}
+    kb_path.write_text(json.dumps(data, ensure_ascii=False))
+    first.kb.refresh()
+
+    assert second.score_creatives([creative], "FocusFlow")["feature"] == [0.5]
+    assert second.kb["products"]["Späti"] == {"features": {}}
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_knowledge_base_non_ascii_keys(tmp_path, ensure_ascii):
+    kb_path = tmp_path / "kb.json"
+    data = {"products": {"Späti": {"features": {"Kühlschrank": {"effectiveness": 0.5}}}}}
+    kb_path.write_text(json.dumps(data, ensure_ascii=ensure_ascii), encoding="utf-8")
+    scorer = CreativeScorer(str(kb_path))
+    assert list(scorer.kb["products"]) == ["Späti"]
+    assert scorer.kb["products"]["Späti"] == data["products"]["Späti"]
@@ -0,0 +1,66 @@
+import json
+import subprocess
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from benchmarks.stub_server import StubConfig, start_stub_server
+from src.service import start_service, submit_brief
+from src.utils.cache import set_response_cache
+from src.utils.llm import reset_clients
+
+@pytest.fixture
+def example_brief():
+    with open(Path(__file__).parent.parent / "examples" / "brief1.json", "r") as f:
+        return json.load(f)
+
+def test_identical_in_flight_briefs_are_coalesced(example_brief, monkeypatch):
+    config = StubConfig(latency=0.3, creatives_per_ad_group=1)
+    stub = start_stub_server(config)
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{stub.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("LLM_CACHE", "false")
+    reset_clients()
+    set_response_cache(None)
+    service = start_service(port=0)
+    url = f"http://127.0.0.1:{service.server_address[1]}"
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            campaigns = list(pool.map(lambda _: submit_brief(example_brief, url), range(4)))
+        with urllib.request.urlopen(url + "/health") as response:
+            health = json.loads(response.read())
+    finally:
+        service.shutdown()
+        stub.shutdown()
+        reset_clients()
+
+    assert config.requests == 1
+    assert all(campaign == campaigns[0] for campaign in campaigns)
+    assert campaigns[0]["campaign_id"] == example_brief["campaign_id"]
+    assert health["requests"] == 4
+    assert health["coalesced"] == 3
+    assert health["in_flight"] == 0
+
+def test_invalid_brief_is_rejected(example_brief):
+    service = start_service(port=0, mock=True)
+    url = f"http://127.0.0.1:{service.server_address[1]}"
+    try:
+        assert submit_brief(example_brief, url)["campaign_id"] == example_brief["campaign_id"]
+        with pytest.raises(ValueError, match="ValidationError"):
+            submit_brief({"campaign_id": "cmp_bad"}, url)
+    finally:
+        service.shutdown()
+
+def test_client_does_not_import_the_agent():
+    code = "import sys, src.service; print(sorted({'openai', 'pydantic', 'src.agent'} & set(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    assert output.strip() == "[]"
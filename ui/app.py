@@ -1,6 +1,11 @@
+import itertools
 import json
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Optional
 
 import pandas as pd
 import streamlit as st
@@ -21,6 +26,198 @@ def load_example_brief():
     with open(example_path, "r") as f:
         return json.load(f)
 
+@st.cache_resource
+def get_agent(mock: bool) -> CampaignAgent:
+    """Create the agent once per process.
+
+    The knowledge base, scorer and prompts are shared by every session;
+    each job runs on its own clone so their metrics stay separate.
+    """
+    return CampaignAgent(mock=mock)
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool running generation jobs for all sessions."""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("UI_MAX_JOBS", "4")),
+        thread_name_prefix="campaign-job"
+    )
+
+class GenerationJob:
+    """A brief being turned into a campaign plan on a background thread.
+
+    The worker thread only writes attributes of the job; the script reads
+    them on every re-render, so nothing blocks while a plan is generated.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, brief: Dict, mock: bool, previous: Optional["GenerationJob"] = None):
+        self.id = next(self._ids)
+        self.brief = brief
+        self.mock = mock
+        # Finished job whose plan is updated instead of generating from scratch
+        self.previous = previous
+        self.status = "queued"
+        self.ad_groups = 0
+        self.creatives = 0
+        self.campaign: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.metrics: Dict = {}
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        return f"#{self.id} {self.brief['campaign_id']} ({self.brief['product']['name']})"
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def run(self, agent: CampaignAgent) -> None:
+        self.started = time.time()
+        self.status = "running"
+        agent = agent.clone()
+        try:
+            if self.previous is not None:
+                self.campaign = agent.process_brief_incremental(
+                    self.brief, self.previous.brief, self.previous.campaign
+                )
+            else:
+                self.campaign = agent.process_brief_stream(self.brief, on_event=self._on_event)
+            self.status = "done"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.metrics = agent.metrics.get_metrics()
+            self.finished = time.time()
+
+    def _on_event(self, kind: str, payload: Dict) -> None:
+        if kind == "ad_group":
+            self.ad_groups += 1
+        elif kind == "creative":
+            self.creatives += 1
+
+_STATUS_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌"}
+
+# Fragments re-render the job list on their own; older Streamlit versions
+# get a refresh button instead.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+def _refreshing(func):
+    """Re-run func every second when this Streamlit version supports fragments."""
+    if _fragment is None:
+        return func
+    return _fragment(run_every=1.0)(func)
+
+@_refreshing
+def show_jobs():
+    """Show the job queue with per-job progress, and the selected plan."""
+    st.subheader("Generation Jobs")
+    jobs = st.session_state.jobs
+    if not jobs:
+        st.write("Queue a brief to generate a campaign plan.")
+        return
+    if _fragment is None:
+        st.button("Refresh job status")
+
+    for job in jobs:
+        line = f"{_STATUS_ICONS[job.status]} **{job.label}** - {job.status}"
+        if job.status == "running":
+            line += f", {job.ad_groups} ad groups / {job.creatives} creatives, {job.elapsed:.1f}s"
+        elif job.finished is not None:
+            line += f" in {job.elapsed:.1f}s"
+            incremental = job.metrics.get("incremental")
+            if incremental and not incremental["full"]:
+                line += (
+                    f" (updated: {len(incremental['regenerated'])} ad groups regenerated, "
+                    f"{incremental['reused']} reused)"
+                )
+        st.markdown(line)
+
+    finished = [job for job in jobs if job.status in ("done", "failed")]
+    if not finished:
+        return
+    by_id = {job.id: job for job in finished}
+    ids = list(by_id)
+    selected = st.session_state.get("selected_job")
+    job = by_id[st.selectbox(
+        "Show plan",
+        ids,
+        index=ids.index(selected) if selected in ids else 0,
+        format_func=lambda job_id: by_id[job_id].label
+    )]
+    st.session_state.selected_job = job.id
+    if job.status == "failed":
+        st.error(f"Error generating campaign plan: {job.error}")
+    else:
+        show_campaign(job.campaign)
+    show_timings(job)
+
+def show_timings(job: GenerationJob):
+    """Show where the job's time went, from its metrics."""
+    st.write("### Timing")
+    st.write(
+        f"Queued for {job.started - job.submitted:.1f}s, "
+        f"processed in {job.metrics.get('processing_time') or job.elapsed:.2f}s"
+    )
+    stages = job.metrics.get("stages", {})
+    if stages:
+        st.dataframe(
+            pd.DataFrame([
+                {"Stage": name, "Time (ms)": round(ms, 1)}
+                for name, ms in stages.items()
+            ]),
+            hide_index=True
+        )
+
+def show_campaign(campaign: Dict):
+    """Show a generated campaign plan."""
+    # Display campaign overview
+    st.write("### Campaign Overview")
+    st.write(f"**Name:** {campaign['campaign_name']}")
+    st.write(f"**Objective:** {campaign['objective']}")
+
+    # Display budget breakdown
+    st.write("### Budget Breakdown")
+    budget_df = pd.DataFrame([
+        {"Channel": k, "Budget": f"${v:,.2f}"}
+        for k, v in campaign["budget_breakdown"].items()
+    ])
+    st.dataframe(budget_df, hide_index=True)
+
+    # Display ad groups
+    st.write("### Ad Groups")
+    for i, ag in enumerate(campaign["ad_groups"], 1):
+        with st.expander(f"Ad Group {i}: {ag['target']['age']} - {', '.join(ag['target']['behaviors'])}"):
+            for j, creative in enumerate(ag["creatives"], 1):
+                st.write(f"**Creative {j}**")
+                st.write(f"Headline: {creative['headline']}")
+                st.write(f"Body: {creative['body']}")
+                st.write(f"CTA: {creative['cta']}")
+                st.write(f"*Justification: {creative['justification']}*")
+                st.divider()
+
+    # Display validation checks
+    st.write("### Validation Checks")
+    checks = campaign["checks"]
+    st.write("✅" if checks["budget_sum_ok"] else "❌", "Budget sum valid")
+    st.write("✅" if checks["required_fields_present"] else "❌", "Required fields present")
+
+    # Add export button
+    if st.download_button(
+        "Download Campaign Plan",
+        data=json.dumps(campaign, indent=2),
+        file_name="campaign_plan.json",
+        mime="application/json"
+    ):
+        st.success("Campaign plan downloaded!")
+
 def main():
     st.title("Ad Campaign Generator 🎯")
     st.write("Convert campaign briefs into structured ad campaign plans using AI.")
@@ -28,11 +225,18 @@ def main():
     # Initialize session state
     if "brief" not in st.session_state:
         st.session_state.brief = load_example_brief()
+    if "jobs" not in st.session_state:
+        st.session_state.jobs = []
 
     # Sidebar for configuration
     with st.sidebar:
         st.subheader("Configuration")
         mock_llm = st.checkbox("Use Mock LLM (for testing)", value=False)
+        incremental = st.checkbox(
+            "Update the last plan for edited briefs",
+            value=True,
+            help="Reuse the last generated plan and regenerate only what the edits affect"
+        )
         
         st.subheader("Load Example")
         if st.button("Load Example Brief"):
@@ -115,57 +319,19 @@ def main():
         }
 
         if st.button("Generate Campaign Plan"):
-            try:
-                agent = CampaignAgent(mock=mock_llm)
-                with st.spinner("Generating campaign plan..."):
-                    campaign = agent.process_brief(brief)
-                st.session_state.campaign = campaign
-                st.success("Campaign plan generated successfully!")
-            except Exception as e:
-                st.error(f"Error generating campaign plan: {str(e)}")
+            # Queue the brief and return immediately; the plan appears in
+            # the job list when it is ready.
+            previous = next(
+                (job for job in st.session_state.jobs if job.status == "done" and job.mock == mock_llm),
+                None
+            )
+            job = GenerationJob(brief, mock_llm, previous if incremental else None)
+            get_executor().submit(job.run, get_agent(mock_llm))
+            st.session_state.jobs.insert(0, job)
+            st.session_state.selected_job = job.id
 
     with col2:
-        st.subheader("Generated Campaign Plan")
-        if "campaign" in st.session_state:
-            # Display campaign overview
-            st.write("### Campaign Overview")
-            st.write(f"**Name:** {st.session_state.campaign['campaign_name']}")
-            st.write(f"**Objective:** {st.session_state.campaign['objective']}")
-            
-            # Display budget breakdown
-            st.write("### Budget Breakdown")
-            budget_df = pd.DataFrame([
-                {"Channel": k, "Budget": f"${v:,.2f}"}
-                for k, v in st.session_state.campaign["budget_breakdown"].items()
-            ])
-            st.dataframe(budget_df, hide_index=True)
-
-            # Display ad groups
-            st.write("### Ad Groups")
-            for i, ag in enumerate(st.session_state.campaign["ad_groups"], 1):
-                with st.expander(f"Ad Group {i}: {ag['target']['age']} - {', '.join(ag['target']['behaviors'])}"):
-                    for j, creative in enumerate(ag["creatives"], 1):
-                        st.write(f"**Creative {j}**")
-                        st.write(f"Headline: {creative['headline']}")
-                        st.write(f"Body: {creative['body']}")
-                        st.write(f"CTA: {creative['cta']}")
-                        st.write(f"*Justification: {creative['justification']}*")
-                        st.divider()
-
-            # Display validation checks
-            st.write("### Validation Checks")
-            checks = st.session_state.campaign["checks"]
-            st.write("✅" if checks["budget_sum_ok"] else "❌", "Budget sum valid")
-            st.write("✅" if checks["required_fields_present"] else "❌", "Required fields present")
-
-            # Add export button
-            if st.download_button(
-                "Download Campaign Plan",
-                data=json.dumps(st.session_state.campaign, indent=2),
-                file_name="campaign_plan.json",
-                mime="application/json"
-            ):
-                st.success("Campaign plan downloaded!")
+        show_jobs()
 
 if __name__ == "__main__":
     main()